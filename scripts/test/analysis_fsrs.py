@@ -1,23 +1,26 @@
+import argparse
 import torch
 import matplotlib.pyplot as plt
 import numpy as np
 from fsrs_trained_batch import (
     FSRSParameters,
-    retrievability,
-    initial_stability,
-    stability_success,
-    stability_fail,
-    update_difficulty,
     predict_interval
 )
+from fsrs_numpy import params_by_user
+from fsrs_report import (
+    FORMATS,
+    failure_effect,
+    forgetting_curves,
+    render_reports,
+    stability_trajectory
+)
 
 # ---------------------------------------------------------
 # 1️⃣ Forgetting curve
 # ---------------------------------------------------------
 def plot_forgetting_curve():
-    S = torch.tensor(5.0)
     days = torch.linspace(0, 40, 100)
-    R = [retrievability(d, S).item() for d in days]
+    R = forgetting_curves(5.0, days)
 
     plt.figure()
     plt.plot(days, R)
@@ -31,25 +34,8 @@ def plot_forgetting_curve():
 # 2️⃣ Stability growth across reviews
 # ---------------------------------------------------------
 def plot_stability_growth():
-    params = FSRSParameters()
-
-    reviews = [(0, 3), (1, 3), (3, 4), (10, 3), (30, 3)]
-
-    S = initial_stability(torch.tensor(3), params)
-    D = torch.tensor(5.0)
-
-    S_values = [S.item()]
-
-    for elapsed, grade in reviews[1:]:
-        R = retrievability(torch.tensor(elapsed), S)
-
-        if grade == 1:
-            S = stability_fail(S, D, R, params)
-        else:
-            S = stability_success(S, D, R, params)
-
-        D = update_difficulty(D, grade, params)
-        S_values.append(S.item())
+    # reviews (0, 3), (1, 3), (3, 4), (10, 3), (30, 3): fsrs_report.SCHEDULE
+    S_values = stability_trajectory(FSRSParameters())[0]
 
     plt.figure()
     plt.plot(range(len(S_values)), S_values, marker="o")
@@ -63,17 +49,11 @@ def plot_stability_growth():
 # 3️⃣ Effect of failure
 # ---------------------------------------------------------
 def plot_failure_effect():
-    params = FSRSParameters()
-
-    S = torch.tensor(5.0)
-    D = torch.tensor(5.0)
-
-    elapsed = torch.tensor(3.0)
-    R_before = retrievability(elapsed, S)
-    S_after_fail = stability_fail(S, D, R_before, params)
+    # S = 5, D = 5, lapse after 3 days
+    S_before_after = failure_effect(FSRSParameters())[0]
 
     plt.figure()
-    plt.bar(["Before failure", "After failure"], [S.item(), S_after_fail.item()])
+    plt.bar(["Before failure", "After failure"], S_before_after)
     plt.ylabel("Stability (S)")
     plt.title("Stability After Failure (Should Decrease)")
     plt.show()
@@ -85,7 +65,7 @@ def plot_failure_effect():
 def plot_interval_vs_stability():
     stabilities = torch.linspace(1, 100, 20)
     #intervals = [1 / retrievability(torch.tensor(1.0), S).item() for S in stabilities]
-    intervals = [predict_interval(S, target_retrievability=0.9).item() for S in stabilities]
+    intervals = predict_interval(stabilities, target_retrievability=0.9)
 
     plt.figure()
     plt.plot(stabilities, intervals)
@@ -164,9 +144,10 @@ def plot_forgetting_curves_multiple_S():
     days = torch.linspace(0, 60, 200)
     stabilities = [2.0, 5.0, 15.0, 40.0]
 
+    curves = forgetting_curves(stabilities, days)
+
     plt.figure()
-    for S in stabilities:
-        R = [retrievability(d, torch.tensor(S)).item() for d in days]
+    for S, R in zip(stabilities, curves):
         plt.plot(days, R, label=f"S={S}")
 
     plt.xlabel("Elapsed days")
@@ -179,8 +160,24 @@ def plot_forgetting_curves_multiple_S():
 
 # ---------------------------------------------------------
 # Run all analysis
+# (--report: headless per-user reports via fsrs_report, no windows)
 # ---------------------------------------------------------
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="FSRS analysis plots")
+    parser.add_argument("params", nargs="*",
+                        help="with --report: srs_params JSON / .pt files or a fit_users.py output directory")
+    parser.add_argument("--report", metavar="OUT_DIR", default=None,
+                        help="render headless per-user reports here instead of showing plots")
+    parser.add_argument("--format", choices=FORMATS, default="png")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.report:
+        index = render_reports(params_by_user(args.params) or {"default": None},
+                               args.report, args.format, args.workers)
+        print(f"Rendered {len(index)} reports to {args.report}")
+        raise SystemExit
+
     plot_forgetting_curve()
     plot_stability_growth()
     plot_failure_effect()
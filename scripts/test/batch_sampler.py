@@ -0,0 +1,82 @@
+import math
+
+import numpy as np
+import torch
+
+# =========================
+# LENGTH-BUCKETED BATCHING
+# =========================
+'''Review histories range from 2 reviews to thousands, and a padded batch
+    costs B * max_len steps no matter how short its other sequences are.
+
+    Sequences are put into geometric length buckets (each bucket spans
+    lengths within bucket_ratio of each other), shuffled inside their
+    bucket, cut into batches, and the batches are shuffled across buckets.
+    Padding per batch is then bounded by bucket_ratio.
+'''
+
+
+def padding_efficiency(lengths, batches):
+    """
+    Real review steps / padded steps over a list of index batches
+    """
+    lengths = np.asarray(lengths)
+    useful = 0
+    padded = 0
+    for idx in batches:
+        batch_lengths = lengths[idx]
+        useful += int(batch_lengths.sum())
+        padded += int(batch_lengths.max()) * len(idx)
+    return useful / max(padded, 1)
+
+
+class LengthBucketSampler:
+    """
+    Yields lists of sequence indices; usable directly in train_fsrs or as a
+    DataLoader batch_sampler.
+    """
+
+    def __init__(self, lengths, batch_size, bucket_ratio=1.25, shuffle=True, drop_last=False):
+        if bucket_ratio <= 1.0:
+            raise ValueError("bucket_ratio must be > 1")
+
+        self.lengths = np.asarray(lengths, dtype=np.int64)
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+
+        # bucket k holds lengths in [ratio^k, ratio^(k+1))
+        bucket_ids = np.floor(
+            np.log(np.maximum(self.lengths, 1)) / math.log(bucket_ratio)
+        ).astype(np.int64)
+
+        order = np.argsort(bucket_ids, kind="stable")
+        _, starts = np.unique(bucket_ids[order], return_index=True)
+        self.buckets = np.split(order, starts[1:])
+
+        self.last_efficiency = None
+
+    def _batches(self):
+        batches = []
+        for bucket in self.buckets:
+            if self.shuffle:
+                bucket = bucket[torch.randperm(len(bucket)).numpy()]
+            for i in range(0, len(bucket), self.batch_size):
+                batch = bucket[i:i + self.batch_size]
+                if self.drop_last and len(batch) < self.batch_size:
+                    continue
+                batches.append(batch.tolist())
+
+        if self.shuffle:
+            batches = [batches[j] for j in torch.randperm(len(batches)).tolist()]
+        return batches
+
+    def __iter__(self):
+        batches = self._batches()
+        self.last_efficiency = padding_efficiency(self.lengths, batches)
+        return iter(batches)
+
+    def __len__(self):
+        if self.drop_last:
+            return sum(len(b) // self.batch_size for b in self.buckets)
+        return sum(math.ceil(len(b) / self.batch_size) for b in self.buckets)
@@ -0,0 +1,294 @@
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing as mp
+import os
+import platform
+import resource
+import tempfile
+import time
+
+import numpy as np
+
+# =========================
+# FSRS TRAINER BENCHMARKS
+# =========================
+'''Throughput / memory benchmarks for the FSRS engines on synthetic data.
+
+    engines
+        scalar          fsrs_trained.train_fsrs, one sequence per optimizer step
+        batch           fsrs_trained_batch.train_fsrs, random padded batches
+        batch_bucketed  same, LengthBucketSampler batches
+        batch_compiled  batch_bucketed with backend="compile" (compiled during warmup)
+        numpy_replay    fsrs_numpy.replay, forward only (no training)
+
+    length distributions
+        fixed    every sequence has 10 reviews
+        uniform  2-50 reviews
+        heavy    2 + Pareto tail capped at 2000, like real card histories
+
+    Every case runs in a fresh spawned process, so peak RSS is per case.
+    Results are JSON; --baseline compares against a stored run and exits 1
+    on regressions.
+'''
+
+ENGINES = ("scalar", "batch", "batch_bucketed", "batch_compiled", "numpy_replay")
+LENGTH_DISTS = ("fixed", "uniform", "heavy")
+DEFAULT_SIZES = (1_000, 10_000, 100_000, 1_000_000)
+
+
+# =========================
+# SYNTHETIC DATA
+# =========================
+
+def sample_lengths(n, dist, rng):
+    if dist == "fixed":
+        return np.full(n, 10, dtype=np.int64)
+    if dist == "uniform":
+        return rng.integers(2, 51, n)
+    if dist == "heavy":
+        return np.minimum(2 + rng.pareto(1.2, n).astype(np.int64), 2000)
+    raise ValueError(f"unknown length distribution {dist!r}")
+
+
+def synthetic_arrays(n, dist, seed=0):
+    """
+    Flat (elapsed, grade, offsets) arrays in SequenceCache layout
+    """
+    rng = np.random.default_rng(seed)
+    lengths = sample_lengths(n, dist, rng)
+    offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+    n_reviews = int(offsets[-1])
+
+    grades = rng.choice([1, 2, 3, 4], size=n_reviews, p=[0.1, 0.15, 0.6, 0.15]).astype(np.uint8)
+    elapsed = rng.integers(0, 30, n_reviews).astype(np.float32)
+    elapsed[offsets[:-1]] = 0.0
+
+    return elapsed, grades, offsets
+
+
+def write_synthetic_cache(cache_dir, n, dist, seed=0):
+    from sequence_cache import write_array_cache
+
+    elapsed, grades, offsets = synthetic_arrays(n, dist, seed)
+    return write_array_cache(cache_dir, [(["synthetic"], elapsed, grades, np.diff(offsets), [n])])
+
+
+# =========================
+# CASES
+# =========================
+
+def _peak_rss_mb():
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if platform.system() == "Darwin" else peak / 1024
+
+
+def _time_epochs(run_epoch, epochs):
+    times = []
+    for _ in range(epochs):
+        start = time.perf_counter()
+        run_epoch()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def _epoch_runner(engine, dataset, batch_size, tmp):
+    """
+    Closure that runs one training epoch (or one replay) of engine over dataset
+    """
+    if engine == "scalar":
+        import fsrs_trained
+
+        sequences = list(dataset)
+
+        def run_epoch():
+            # fsrs_trained prints inside its loop; keep that out of the timing
+            with contextlib.redirect_stdout(io.StringIO()):
+                fsrs_trained.train_fsrs(sequences, epochs=1, save_path=os.path.join(tmp, "w.pt"))
+
+    elif engine in ("batch", "batch_bucketed", "batch_compiled"):
+        from fsrs_trained_batch import FSRSParameters, train_fsrs
+
+        params = FSRSParameters()
+
+        def run_epoch():
+            train_fsrs(
+                dataset,
+                epochs=1,
+                batch_size=batch_size,
+                save_path=None,
+                bucket_by_length=engine != "batch",
+                verbose=False,
+                params=params,
+                backend="compile" if engine == "batch_compiled" else "eager"
+            )
+
+    elif engine == "numpy_replay":
+        import fsrs_numpy
+
+        # run_case only benchmarks prefixes of the cache, so offsets can be sliced
+        cache = dataset.cache
+        offsets = cache.offsets[:len(dataset) + 1]
+
+        def run_epoch():
+            fsrs_numpy.replay(cache.elapsed, cache.grade, offsets)
+
+    else:
+        raise ValueError(f"unknown engine {engine!r}")
+
+    return run_epoch
+
+
+def run_case(engine, n, dist, epochs=1, batch_size=256, seed=0, threads=None, warmup=64):
+    """
+    Run one benchmark case in this process and return its result dict.
+    A first pass over `warmup` sequences absorbs one-off torch/allocator
+    start-up cost so it doesn't land in the timed epochs.
+    """
+    import torch
+
+    if threads:
+        torch.set_num_threads(threads)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = write_synthetic_cache(os.path.join(tmp, "cache"), n, dist, seed)
+
+        if warmup:
+            _epoch_runner(engine, cache.subset(range(min(warmup, n))), batch_size, tmp)()
+
+        run_epoch = _epoch_runner(engine, cache.subset(range(n)), batch_size, tmp)
+        epoch_seconds = _time_epochs(run_epoch, epochs)
+        n_reviews = cache.n_reviews
+
+    mean_epoch = sum(epoch_seconds) / len(epoch_seconds)
+    return {
+        "engine": engine,
+        "n_sequences": n,
+        "length_dist": dist,
+        "n_reviews": n_reviews,
+        "epochs": epochs,
+        "batch_size": batch_size,
+        "epoch_seconds": [round(t, 4) for t in epoch_seconds],
+        "sequences_per_sec": n / mean_epoch,
+        "reviews_per_sec": n_reviews / mean_epoch,
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+    }
+
+
+def _run_case_task(kwargs):
+    return run_case(**kwargs)
+
+
+def run_suite(engines=ENGINES, sizes=DEFAULT_SIZES, dists=LENGTH_DISTS, scalar_max=10_000, isolate=True, **case_kwargs):
+    """
+    Run every (engine, size, dist) case. The scalar trainer is skipped
+    above scalar_max sequences; it would take hours.
+    """
+    import torch
+
+    results = []
+    ctx = mp.get_context("spawn")
+
+    for engine in engines:
+        for n in sizes:
+            for dist in dists:
+                if engine == "scalar" and n > scalar_max:
+                    results.append({"engine": engine, "n_sequences": n, "length_dist": dist, "skipped": True})
+                    continue
+
+                task = dict(engine=engine, n=n, dist=dist, **case_kwargs)
+                if isolate:
+                    with ctx.Pool(1, maxtasksperchild=1) as pool:
+                        result = pool.apply(_run_case_task, (task,))
+                else:
+                    result = run_case(**task)
+
+                results.append(result)
+                print(
+                    f"{engine:>15} n={n:<9} {dist:<8} "
+                    f"{result['reviews_per_sec']:>12.0f} reviews/s  "
+                    f"{result['peak_rss_mb']:>8.1f} MB"
+                )
+
+    return {
+        "meta": {
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "torch": torch.__version__,
+            "numpy": np.__version__,
+            "cpu_count": os.cpu_count(),
+            "platform": platform.platform(),
+        },
+        "results": results,
+    }
+
+
+# =========================
+# BASELINE COMPARISON
+# =========================
+
+def _case_key(result):
+    return result["engine"], result["n_sequences"], result["length_dist"]
+
+
+def compare_to_baseline(report, baseline, threshold=0.15):
+    """
+    Regressions vs. a stored report: reviews/sec down by more than
+    threshold, or peak RSS up by more than threshold
+    """
+    previous = {_case_key(r): r for r in baseline["results"] if not r.get("skipped")}
+
+    regressions = []
+    for result in report["results"]:
+        old = previous.get(_case_key(result))
+        if result.get("skipped") or old is None:
+            continue
+
+        speed = result["reviews_per_sec"] / old["reviews_per_sec"]
+        memory = result["peak_rss_mb"] / max(old["peak_rss_mb"], 1e-9)
+
+        if speed < 1 - threshold:
+            regressions.append({"case": _case_key(result), "metric": "reviews_per_sec", "ratio": round(speed, 3)})
+        if memory > 1 + threshold:
+            regressions.append({"case": _case_key(result), "metric": "peak_rss_mb", "ratio": round(memory, 3)})
+
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the FSRS trainers")
+    parser.add_argument("--engines", nargs="+", default=list(ENGINES), choices=ENGINES)
+    parser.add_argument("--sizes", nargs="+", type=int, default=list(DEFAULT_SIZES))
+    parser.add_argument("--dists", nargs="+", default=list(LENGTH_DISTS), choices=LENGTH_DISTS)
+    parser.add_argument("--epochs", type=int, default=1)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--scalar-max", type=int, default=10_000)
+    parser.add_argument("--out", default="bench_fsrs.json")
+    parser.add_argument("--baseline", default=None, help="earlier --out file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.15)
+    args = parser.parse_args()
+
+    report = run_suite(
+        engines=args.engines,
+        sizes=args.sizes,
+        dists=args.dists,
+        scalar_max=args.scalar_max,
+        epochs=args.epochs,
+        batch_size=args.batch_size,
+        threads=args.threads
+    )
+
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Benchmark results written to {args.out}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare_to_baseline(report, json.load(f), args.threshold)
+        for r in regressions:
+            print(f"REGRESSION {r['case']}: {r['metric']} x{r['ratio']}")
+        if regressions:
+            raise SystemExit(1)
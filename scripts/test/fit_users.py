@@ -0,0 +1,134 @@
+import argparse
+import json
+import multiprocessing as mp
+import os
+import time
+
+import torch
+
+from fsrs_trained_batch import BACKENDS, train_fsrs, evaluate_loss
+from sequence_cache import SequenceCache
+
+# =========================
+# PER-USER PARAMETER FITTING
+# =========================
+'''Fits one FSRSParameters per user, sharding users across a process pool.
+
+    Each worker opens the memory-mapped SequenceCache once and runs
+    train_fsrs on its user's sequences with torch capped to
+    threads_per_worker intra-op threads, so workers don't oversubscribe cores.
+
+    Output, one file per user:
+        out_dir/<user_id>.json   {"w0": ..., "init_s_easy": ...}
+                                 -> node upload-fsrs-params.js out_dir/<user_id>.json <user_id>
+                                 -> POST /api/srs/params/upload with {"params": <file contents>}
+        out_dir/summary.json     per-user sequence/review counts, loss and fit time
+'''
+
+_worker_cache = None
+
+
+def _init_worker(cache_dir, threads_per_worker):
+    global _worker_cache
+    torch.set_num_threads(threads_per_worker)
+    _worker_cache = SequenceCache(cache_dir)
+
+
+def _fit_user(task):
+    user_id, train_kwargs = task
+    sequences = _worker_cache.user_sequences(user_id)
+
+    start = time.perf_counter()
+    params = train_fsrs(sequences, save_path=None, verbose=False, **train_kwargs)
+    elapsed = time.perf_counter() - start
+
+    return user_id, params.to_params_json(), {
+        "n_sequences": len(sequences),
+        "n_reviews": int(sequences.lengths.sum()),
+        "loss": evaluate_loss(sequences, params),
+        "fit_seconds": round(elapsed, 3),
+    }
+
+
+def select_users(cache, min_reviews=50, users=None):
+    """
+    Users with enough reviews to fit, largest first so the pool
+    doesn't finish on one long straggler
+    """
+    candidates = users if users is not None else cache.users
+
+    sizes = {}
+    for user_id in candidates:
+        n_reviews = int(cache.user_sequences(user_id).lengths.sum())
+        if n_reviews >= min_reviews:
+            sizes[user_id] = n_reviews
+
+    return sorted(sizes, key=sizes.get, reverse=True)
+
+
+def fit_users(
+    cache_dir,
+    out_dir,
+    workers=None,
+    threads_per_worker=1,
+    min_reviews=50,
+    users=None,
+    **train_kwargs
+):
+    """
+    Fit every selected user in cache_dir and write their params JSON to out_dir.
+    train_kwargs go to train_fsrs (epochs, lr, batch_size, bucket_by_length).
+    Returns {user_id: summary}.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    workers = workers or max(1, (os.cpu_count() or 1) // threads_per_worker)
+
+    cache = SequenceCache(cache_dir)
+    tasks = [(user_id, train_kwargs) for user_id in select_users(cache, min_reviews, users)]
+
+    summary = {}
+    ctx = mp.get_context("spawn")
+    with ctx.Pool(workers, initializer=_init_worker, initargs=(cache_dir, threads_per_worker)) as pool:
+        for user_id, params_json, stats in pool.imap_unordered(_fit_user, tasks):
+            with open(os.path.join(out_dir, f"{user_id}.json"), "w") as f:
+                json.dump(params_json, f, indent=2)
+            summary[user_id] = stats
+
+    with open(os.path.join(out_dir, "summary.json"), "w") as f:
+        json.dump(summary, f, indent=2)
+
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fit FSRS params for every user in a sequence cache")
+    parser.add_argument("cache_dir", help="directory written by sequence_cache.py")
+    parser.add_argument("out_dir")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--threads-per-worker", type=int, default=1)
+    parser.add_argument("--min-reviews", type=int, default=50)
+    parser.add_argument("--epochs", type=int, default=50)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--lr", type=float, default=0.01)
+    parser.add_argument("--backend", choices=BACKENDS, default="eager",
+                        help="compile: fused torch.compile scan (compiled once per worker); "
+                             "lean: custom-autograd scan for long histories")
+    parser.add_argument("--method", choices=("adam", "lbfgs"), default="adam",
+                        help="lbfgs: full-batch bounded L-BFGS (--epochs is ignored)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    summary = fit_users(
+        args.cache_dir,
+        args.out_dir,
+        workers=args.workers,
+        threads_per_worker=args.threads_per_worker,
+        min_reviews=args.min_reviews,
+        epochs=args.epochs,
+        batch_size=args.batch_size,
+        lr=args.lr,
+        bucket_by_length=True,
+        backend=args.backend,
+        method=args.method
+    )
+    print(f"Fitted {len(summary)} users in {time.perf_counter() - start:.1f}s -> {args.out_dir}")
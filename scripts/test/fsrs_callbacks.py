@@ -0,0 +1,237 @@
+import json
+import time
+
+# =========================
+# TRAINING CALLBACKS
+# =========================
+'''Instrumentation hooks for train_fsrs. Nothing is recorded unless
+    callbacks are passed in; verbose printing is separate.
+
+    Hooks (all no-ops on Callback):
+        on_train_start(info)        dataset size and run settings
+        on_epoch_start(epoch)
+        on_batch_end(epoch, stats)  loss, grad_norm, sequences, reviews and
+                                    the batch's timings
+        on_epoch_end(epoch, stats)  EpochStats.summary() plus val_loss
+        on_train_end(summary)       stop reason, best validation loss, wall time
+
+    Timings (seconds) split each batch into
+        data_s       waiting for the batch (gather / DataLoader)
+        forward_s    batch_loss
+        backward_s   loss.backward()
+        optimizer_s  gradient clipping + optimizer step
+'''
+
+TIMINGS = ("data_s", "forward_s", "backward_s", "optimizer_s")
+
+
+class Callback:
+    def on_train_start(self, info):
+        pass
+
+    def on_epoch_start(self, epoch):
+        pass
+
+    def on_batch_end(self, epoch, stats):
+        pass
+
+    def on_epoch_end(self, epoch, stats):
+        pass
+
+    def on_train_end(self, summary):
+        pass
+
+
+class CallbackList(Callback):
+    """
+    Fans every hook out to a list of callbacks (None = no callbacks)
+    """
+
+    def __init__(self, callbacks=None):
+        self.callbacks = list(callbacks or [])
+
+    def __bool__(self):
+        return bool(self.callbacks)
+
+    def on_train_start(self, info):
+        for callback in self.callbacks:
+            callback.on_train_start(info)
+
+    def on_epoch_start(self, epoch):
+        for callback in self.callbacks:
+            callback.on_epoch_start(epoch)
+
+    def on_batch_end(self, epoch, stats):
+        for callback in self.callbacks:
+            callback.on_batch_end(epoch, stats)
+
+    def on_epoch_end(self, epoch, stats):
+        for callback in self.callbacks:
+            callback.on_epoch_end(epoch, stats)
+
+    def on_train_end(self, summary):
+        for callback in self.callbacks:
+            callback.on_train_end(summary)
+
+
+# =========================
+# EPOCH STATISTICS
+# =========================
+
+class EpochStats:
+    """
+    Running totals for one epoch; train_fsrs adds every batch
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.batches = 0
+        self.sequences = 0
+        self.reviews = 0
+        self.loss = 0.0
+        self.grad_norm_sum = 0.0
+        self.grad_norm_max = 0.0
+        self.timings = dict.fromkeys(TIMINGS, 0.0)
+
+    def add_batch(self, loss, grad_norm, sequences, reviews, timings):
+        self.batches += 1
+        self.sequences += sequences
+        self.reviews += reviews
+        self.loss += loss
+        self.grad_norm_sum += grad_norm
+        self.grad_norm_max = max(self.grad_norm_max, grad_norm)
+        for name, seconds in timings.items():
+            self.timings[name] += seconds
+
+    def summary(self):
+        seconds = time.perf_counter() - self.start
+        return {
+            "loss": self.loss,
+            "mean_loss": self.loss / max(self.batches, 1),
+            "grad_norm_mean": self.grad_norm_sum / max(self.batches, 1),
+            "grad_norm_max": self.grad_norm_max,
+            "batches": self.batches,
+            "sequences": self.sequences,
+            "reviews": self.reviews,
+            "seconds": seconds,
+            **self.timings,
+            "reviews_per_sec": self.reviews / seconds if seconds > 0 else 0.0,
+        }
+
+
+# =========================
+# SINKS
+# =========================
+
+class MetricsHistory(Callback):
+    """
+    Keeps every epoch's stats in memory (.epochs, .summary)
+    """
+
+    def __init__(self):
+        self.info = None
+        self.epochs = []
+        self.summary = None
+
+    def on_train_start(self, info):
+        self.info = info
+
+    def on_epoch_end(self, epoch, stats):
+        self.epochs.append(stats)
+
+    def on_train_end(self, summary):
+        self.summary = summary
+
+
+class JSONLSink(Callback):
+    """
+    One JSON object per line, tagged by "event": train_start, epoch,
+    train_end, and batch when batches=True (one line per optimizer step).
+    The file is appended to, so resumed runs continue the same log.
+    """
+
+    def __init__(self, path, batches=False):
+        self.path = path
+        self.batches = batches
+        self.file = None
+
+    def _write(self, event, record):
+        self.file.write(json.dumps({"event": event, "time": time.time(), **record}) + "\n")
+
+    def on_train_start(self, info):
+        self.file = open(self.path, "a")
+        self._write("train_start", info)
+        self.file.flush()
+
+    def on_batch_end(self, epoch, stats):
+        if self.batches:
+            self._write("batch", {"epoch": epoch, **stats})
+
+    def on_epoch_end(self, epoch, stats):
+        self._write("epoch", {"epoch": epoch, **stats})
+        self.file.flush()
+
+    def on_train_end(self, summary):
+        self._write("train_end", summary)
+        self.file.close()
+        self.file = None
+
+
+def read_jsonl(path, event=None):
+    """
+    Records from a JSONLSink file, optionally only one event type
+    """
+    with open(path) as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    return [r for r in records if event is None or r["event"] == event]
+
+
+# =========================
+# PROFILING
+# =========================
+
+class TorchProfiler(Callback):
+    """
+    torch.profiler trace of one epoch (0-based), written as a Chrome trace
+    for chrome://tracing or Perfetto. table_path also saves the op table.
+    """
+
+    def __init__(self, trace_path, epoch=0, table_path=None, record_shapes=False, row_limit=30):
+        self.trace_path = trace_path
+        self.epoch = epoch
+        self.table_path = table_path
+        self.record_shapes = record_shapes
+        self.row_limit = row_limit
+        self.profiler = None
+
+    def on_epoch_start(self, epoch):
+        if epoch != self.epoch:
+            return
+
+        import torch  # only needed when profiling
+
+        self.profiler = torch.profiler.profile(
+            activities=[torch.profiler.ProfilerActivity.CPU],
+            record_shapes=self.record_shapes
+        )
+        self.profiler.start()
+
+    def _finish(self):
+        if self.profiler is None:
+            return
+
+        self.profiler.stop()
+        self.profiler.export_chrome_trace(self.trace_path)
+        if self.table_path:
+            table = self.profiler.key_averages().table(sort_by="self_cpu_time_total", row_limit=self.row_limit)
+            with open(self.table_path, "w") as f:
+                f.write(table)
+        self.profiler = None
+
+    def on_epoch_end(self, epoch, stats):
+        if epoch == self.epoch:
+            self._finish()
+
+    def on_train_end(self, summary):
+        # the profiled epoch was cut short (time budget)
+        self._finish()
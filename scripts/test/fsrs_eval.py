@@ -0,0 +1,276 @@
+import argparse
+import json
+import os
+
+import numpy as np
+
+import fsrs_numpy
+
+# =========================
+# EVALUATION HARNESS
+# =========================
+'''Scores parameter sets on held-out reviews with one no-grad vectorized
+    replay (fsrs_numpy) per set, so millions of reviews take seconds.
+
+    Every review after a card's first is a prediction: the model's R from the
+    history so far vs. whether the card was recalled (grade > 1).
+
+        log_loss        binary cross-entropy against recall
+        soft_log_loss   against the trainer's soft targets (train_fsrs objective)
+        rmse_bins       count-weighted RMSE between mean predicted R and recall
+                        rate over equal-width R bins (calibration error)
+        auc             ranking quality of R for recall
+        calibration     the per-bin table behind rmse_bins
+        per_grade       count, mean R and soft log loss for each grade
+'''
+
+N_BINS = 20
+
+# recall_targets() in fsrs_trained_batch, grades 1-4
+SOFT_TARGETS = np.array([0.0, 0.7, 0.9, 0.97])
+
+
+# =========================
+# TS SCHEDULER MODEL
+# =========================
+'''lib/srs.server.ts formulas, so the production defaults are scored as the
+    app actually applies them. TS weights map onto the Python layout by name
+    (w7 is unused here).
+'''
+
+TS_DEFAULT_FSRS_PARAMS = {
+    "w0": 0.4, "w1": 0.6, "w2": 0.9, "w3": 0.2, "w4": 1.2, "w5": 0.1, "w6": 1.4,
+    "init_s_again": 0.5, "init_s_hard": 1.0, "init_s_good": 2.5, "init_s_easy": 4.0,
+}
+TS_MAX_STABILITY = 20000
+
+
+def ts_retrievability(elapsed_days, stability):
+    return np.exp(np.asarray(elapsed_days) * fsrs_numpy.DECAY / np.maximum(stability, fsrs_numpy.EPS))
+
+
+def ts_next_state(S, D, elapsed_days, grade, w):
+    R = ts_retrievability(elapsed_days, S)
+    D_new = fsrs_numpy.update_difficulty(D, grade, w)
+
+    S_fail = np.clip(S * w.w1 * R ** w.w3, fsrs_numpy.EPS, 0.9 * S)
+    S_hard = np.clip(S * 1.05, fsrs_numpy.EPS, TS_MAX_STABILITY)
+    growth = np.exp(w.w4) * (11 - D_new) * S ** w.w5 * (np.exp((1 - R) * w.w6) - 1)
+    S_success = np.clip(S * (1 + growth), fsrs_numpy.EPS, TS_MAX_STABILITY)
+
+    S_new = np.where(grade == 1, S_fail, np.where(grade == 2, S_hard, S_success))
+    return S_new, D_new
+
+
+TS_MODEL = fsrs_numpy.Model(fsrs_numpy.initial_stability, ts_retrievability, ts_next_state)
+
+
+# =========================
+# DATA
+# =========================
+
+def flat_arrays(sequences):
+    """
+    (elapsed, grades, offsets) for a SequenceCache, a SequenceSubset
+    or a list of [(elapsed_days, grade), ...] sequences
+    """
+    if hasattr(sequences, "offsets"):
+        return sequences.elapsed, sequences.grade, sequences.offsets
+
+    if hasattr(sequences, "cache"):
+        cache = sequences.cache
+        starts = cache.offsets[sequences.indices]
+        lengths = cache.offsets[sequences.indices + 1] - starts
+        offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+        positions = np.repeat(starts - offsets[:-1], lengths) + np.arange(offsets[-1])
+        return cache.elapsed[positions], cache.grade[positions], offsets
+
+    lengths = [len(seq) for seq in sequences]
+    offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+    flat = [review for seq in sequences for review in seq]
+    elapsed = np.array([e for e, _ in flat], dtype=np.float64)
+    grades = np.array([g for _, g in flat], dtype=np.float64)
+    return elapsed, grades, offsets
+
+
+# =========================
+# METRICS
+# =========================
+
+def _bce(p, y):
+    p = np.clip(p, fsrs_numpy.EPS, 1 - fsrs_numpy.EPS)
+    return -(y * np.log(p) + (1 - y) * np.log(1 - p))
+
+
+def log_loss(p, y):
+    return float(np.mean(_bce(p, y)))
+
+
+def calibration_table(p, y, n_bins=N_BINS):
+    """
+    Per equal-width R bin: count, mean predicted R, observed recall rate
+    """
+    bins = np.minimum((p * n_bins).astype(np.int64), n_bins - 1)
+    count = np.bincount(bins, minlength=n_bins)
+    safe = np.maximum(count, 1)
+    return {
+        "bin_edges": np.linspace(0, 1, n_bins + 1).tolist(),
+        "count": count.tolist(),
+        "mean_predicted": (np.bincount(bins, p, n_bins) / safe).tolist(),
+        "recall_rate": (np.bincount(bins, y, n_bins) / safe).tolist(),
+    }
+
+
+def rmse_bins(table):
+    count = np.asarray(table["count"], dtype=np.float64)
+    gap = np.asarray(table["mean_predicted"]) - np.asarray(table["recall_rate"])
+    return float(np.sqrt(np.sum(count * gap ** 2) / max(count.sum(), 1)))
+
+
+def auc(p, y):
+    """
+    Mann-Whitney AUC with average ranks for tied predictions
+    """
+    n_pos = int(y.sum())
+    n_neg = len(y) - n_pos
+    if n_pos == 0 or n_neg == 0:
+        return float("nan")
+
+    order = np.argsort(p)
+    p_sorted = p[order]
+
+    # runs of tied predictions share their average 1-based rank
+    starts = np.flatnonzero(np.r_[True, p_sorted[1:] != p_sorted[:-1]])
+    ends = np.r_[starts[1:], len(p)]
+    avg_rank = (starts + 1 + ends) / 2.0
+    pos_per_run = np.add.reduceat(y[order], starts)
+
+    rank_sum = float(np.dot(avg_rank, pos_per_run))
+    return (rank_sum - n_pos * (n_pos + 1) / 2.0) / (n_pos * n_neg)
+
+
+def per_grade_metrics(p, grades, soft_loss):
+    """
+    grades: int [n]; soft_loss: per-review loss against the soft targets
+    """
+    count = np.bincount(grades, minlength=5)[1:5]
+    mean_predicted = np.bincount(grades, p, 5)[1:5]
+    soft = np.bincount(grades, soft_loss, 5)[1:5]
+
+    return {
+        str(g): {
+            "count": int(n),
+            "mean_predicted": float(mean_predicted[g - 1] / n) if n else None,
+            "soft_log_loss": float(soft[g - 1] / n) if n else None,
+        }
+        for g, n in zip(range(1, 5), count)
+    }
+
+
+def score_predictions(recall, grades, n_bins=N_BINS):
+    """
+    All metrics for predict_recall output (NaN first reviews are skipped)
+    """
+    scored = ~np.isnan(recall)
+    p = recall[scored]
+    g = np.asarray(grades)[scored].astype(np.int64)
+    y = (g > 1).astype(np.float64)
+    soft_loss = _bce(p, SOFT_TARGETS[g - 1])
+
+    table = calibration_table(p, y, n_bins)
+    return {
+        "n_reviews": int(len(p)),
+        "log_loss": log_loss(p, y),
+        "soft_log_loss": float(np.mean(soft_loss)),
+        "rmse_bins": rmse_bins(table),
+        "auc": auc(p, y),
+        "mean_predicted": float(p.mean()) if len(p) else None,
+        "recall_rate": float(y.mean()) if len(p) else None,
+        "calibration": table,
+        "per_grade": per_grade_metrics(p, g, soft_loss),
+    }
+
+
+# =========================
+# EVALUATION
+# =========================
+
+def evaluate(sequences, weights=None, model=fsrs_numpy.FSRS_MODEL, n_bins=N_BINS):
+    """
+    Metrics for one parameter set over a whole dataset
+    """
+    elapsed, grades, offsets = flat_arrays(sequences)
+    recall = fsrs_numpy.predict_recall(elapsed, grades, offsets, weights, model)
+    return score_predictions(recall, grades, n_bins)
+
+
+def default_param_sets():
+    return {
+        "default": (fsrs_numpy.FSRS_MODEL, fsrs_numpy.FSRSWeights()),
+        "ts_default": (TS_MODEL, fsrs_numpy.FSRSWeights.from_params_json(TS_DEFAULT_FSRS_PARAMS)),
+    }
+
+
+def compare(sequences, param_sets=None, n_bins=N_BINS):
+    """
+    param_sets: {name: (model, weights)}; defaults to the Python defaults
+                and the TS DEFAULT_FSRS_PARAMS under the TS formulas
+    The flat arrays are built once and shared by every set.
+    """
+    param_sets = param_sets or default_param_sets()
+    elapsed, grades, offsets = flat_arrays(sequences)
+
+    results = {}
+    for name, (model, weights) in param_sets.items():
+        recall = fsrs_numpy.predict_recall(elapsed, grades, offsets, weights, model)
+        results[name] = score_predictions(recall, grades, n_bins)
+    return results
+
+
+def format_comparison(results):
+    lines = [f"{'params':<20} {'reviews':>10} {'log_loss':>9} {'soft':>7} {'rmse_bins':>9} {'auc':>7}"]
+    for name, m in results.items():
+        lines.append(
+            f"{name:<20} {m['n_reviews']:>10} {m['log_loss']:>9.4f} "
+            f"{m['soft_log_loss']:>7.4f} {m['rmse_bins']:>9.4f} {m['auc']:>7.4f}"
+        )
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score FSRS parameter sets on review history")
+    parser.add_argument("data", help="sequence cache directory or card_reviews CSV / JSONL export")
+    parser.add_argument("--weights", nargs="*", default=[], help="trained weights (.pt / .json), Python formulas")
+    parser.add_argument("--ts-weights", nargs="*", default=[], help="srs_params JSON scored with the TS formulas")
+    parser.add_argument("--val-fraction", type=float, default=0.0,
+                        help="score only the validation split train_fsrs would hold out")
+    parser.add_argument("--split-seed", type=int, default=0)
+    parser.add_argument("--bins", type=int, default=N_BINS)
+    parser.add_argument("--out", default=None, help="write full metrics JSON here")
+    args = parser.parse_args()
+
+    if os.path.isdir(args.data):
+        from sequence_cache import SequenceCache
+        sequences = SequenceCache(args.data)
+    else:
+        from review_sequences import iter_sequences
+        sequences = list(iter_sequences(args.data))
+
+    if args.val_fraction:
+        from fsrs_trained_batch import split_sequences
+        _, val = split_sequences(sequences, args.val_fraction, args.split_seed)
+        sequences = [sequences[i] for i in val.indices] if isinstance(sequences, list) \
+            else sequences.subset(val.indices)
+
+    param_sets = default_param_sets()
+    for path in args.weights:
+        param_sets[os.path.basename(path)] = (fsrs_numpy.FSRS_MODEL, fsrs_numpy.load_weights(path))
+    for path in args.ts_weights:
+        param_sets[f"ts:{os.path.basename(path)}"] = (TS_MODEL, fsrs_numpy.load_weights(path))
+
+    results = compare(sequences, param_sets, args.bins)
+    print(format_comparison(results))
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
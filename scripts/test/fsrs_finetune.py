@@ -0,0 +1,222 @@
+import argparse
+import json
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import torch
+
+from fsrs_trained_batch import FSRSParameters, train_fsrs, evaluate_loss, pad_sequences
+from review_sequences import iter_user_card_reviews, build_card_sequence
+
+# =========================
+# INCREMENTAL FINE-TUNING
+# =========================
+'''Warm-starts from saved weights (fsrs_weights.pt or a srs_params JSON) and
+    trains only on reviews newer than a watermark.
+
+    Cards with new reviews are replayed from their first review so S/D are
+    right, but only the new steps are scored (fsrs_padded_loss loss_start).
+    A manifest next to the weights records the watermark and every run, so
+    the next refresh picks up where this one stopped:
+
+        <weights>.manifest.json
+            watermark          newest reviewed_at the weights have seen (unix s)
+            n_reviews_seen     reviews consumed across all runs
+            runs               one entry per fine-tuning run
+'''
+
+
+# =========================
+# WEIGHTS + MANIFEST
+# =========================
+
+def load_params(path):
+    if str(path).endswith(".json"):
+        with open(path) as f:
+            return FSRSParameters.from_params_json(json.load(f))
+    return FSRSParameters.from_state_dict(torch.load(path))
+
+
+def save_params(params, path):
+    if str(path).endswith(".json"):
+        with open(path, "w") as f:
+            json.dump(params.to_params_json(), f, indent=2)
+    else:
+        torch.save(params.state_dict(), path)
+
+
+def manifest_path(weights_path):
+    return f"{weights_path}.manifest.json"
+
+
+def load_manifest(weights_path):
+    try:
+        with open(manifest_path(weights_path)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"watermark": None, "n_reviews_seen": 0, "runs": []}
+
+
+def _iso(ts):
+    return datetime.fromtimestamp(ts, tz=timezone.utc).isoformat()
+
+
+# =========================
+# NEW-REVIEW DATASET
+# =========================
+
+class IncrementalDataset:
+    """
+    Full card histories, each scored from its first review after the watermark
+    """
+
+    def __init__(self):
+        self.sequences = []
+        self.loss_start = []
+
+    def add(self, sequence, loss_start):
+        self.sequences.append(sequence)
+        self.loss_start.append(loss_start)
+
+    def __len__(self):
+        return len(self.sequences)
+
+    def __getitem__(self, i):
+        return self.sequences[i]
+
+    @property
+    def lengths(self):
+        return np.array([len(seq) for seq in self.sequences], dtype=np.int64)
+
+    def padded_batch(self, idx):
+        elapsed, grades, lengths = pad_sequences([self.sequences[j] for j in idx])
+        loss_start = torch.tensor([self.loss_start[j] for j in idx], dtype=torch.long)
+        return elapsed, grades, lengths, loss_start
+
+
+def collect_new_reviews(export_path, watermark, user_id=None, whole_days=True, **read_kwargs):
+    """
+    returns (dataset, newest_reviewed_at, n_new_reviews) for reviews after watermark
+    """
+    dataset = IncrementalDataset()
+    newest = watermark
+    n_new = 0
+
+    for uid, card_reviews in iter_user_card_reviews(export_path, **read_kwargs):
+        if user_id is not None and uid != user_id:
+            continue
+
+        for reviews in card_reviews.values():
+            reviews = sorted(reviews)
+            first_new = next((i for i, (ts, _) in enumerate(reviews) if ts > watermark), None)
+            if first_new is None:
+                continue
+
+            newest = max(newest, reviews[-1][0])
+            n_new += len(reviews) - first_new
+
+            # A card whose only review is new has nothing to score yet
+            if len(reviews) >= 2:
+                dataset.add(build_card_sequence(reviews, whole_days), max(first_new, 1))
+
+    return dataset, newest, n_new
+
+
+# =========================
+# FINE-TUNING
+# =========================
+
+def finetune(
+    weights_path,
+    export_path,
+    out_path=None,
+    user_id=None,
+    watermark=None,
+    epochs=20,
+    lr=0.005,
+    batch_size=32,
+    tol=1e-4,
+    **read_kwargs
+):
+    """
+    Fine-tune weights_path on card_reviews newer than the watermark.
+
+    watermark: unix seconds; defaults to the manifest's, or all history
+    out_path:  where to write weights + manifest (default: overwrite weights_path)
+    user_id:   only use this user's reviews (per-user srs_params refresh)
+    tol:       convergence tolerance passed to train_fsrs
+    """
+    out_path = out_path or weights_path
+    manifest = load_manifest(weights_path)
+
+    if watermark is None:
+        watermark = manifest["watermark"] if manifest["watermark"] is not None else float("-inf")
+
+    params = load_params(weights_path)
+    dataset, newest, n_new = collect_new_reviews(
+        export_path, watermark, user_id=user_id, **read_kwargs
+    )
+
+    run = {
+        "trained_at": _iso(time.time()),
+        "export": str(export_path),
+        "user_id": user_id,
+        "from_watermark": None if watermark == float("-inf") else watermark,
+        "to_watermark": None if newest == float("-inf") else newest,
+        "n_new_reviews": n_new,
+        "n_sequences": len(dataset),
+    }
+
+    if len(dataset):
+        run["loss_before"] = evaluate_loss(dataset, params)
+        start = time.perf_counter()
+        train_fsrs(
+            dataset,
+            epochs=epochs,
+            lr=lr,
+            batch_size=batch_size,
+            save_path=None,
+            bucket_by_length=True,
+            verbose=False,
+            params=params,
+            tol=tol
+        )
+        run["seconds"] = round(time.perf_counter() - start, 3)
+        run["loss_after"] = evaluate_loss(dataset, params)
+
+    manifest["watermark"] = run["to_watermark"]
+    manifest["watermark_iso"] = None if run["to_watermark"] is None else _iso(run["to_watermark"])
+    manifest["n_reviews_seen"] += n_new
+    manifest["runs"].append(run)
+
+    save_params(params, out_path)
+    with open(manifest_path(out_path), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    return params, manifest
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fine-tune saved FSRS weights on new card_reviews")
+    parser.add_argument("weights", help="fsrs_weights.pt or a srs_params JSON")
+    parser.add_argument("export", help="card_reviews CSV / JSONL export")
+    parser.add_argument("--out", default=None)
+    parser.add_argument("--user-id", default=None)
+    parser.add_argument("--epochs", type=int, default=20)
+    parser.add_argument("--lr", type=float, default=0.005)
+    parser.add_argument("--sorted", action="store_true", help="export is ordered by user_id")
+    args = parser.parse_args()
+
+    _, manifest = finetune(
+        args.weights,
+        args.export,
+        out_path=args.out,
+        user_id=args.user_id,
+        epochs=args.epochs,
+        lr=args.lr,
+        assume_sorted=args.sorted
+    )
+    last = manifest["runs"][-1]
+    print(f"Fine-tuned on {last['n_new_reviews']} new reviews "
+          f"({last['n_sequences']} cards), watermark -> {manifest['watermark_iso']}")
@@ -0,0 +1,365 @@
+import json
+import os
+
+import numpy as np
+
+# =========================
+# NUMPY FSRS ENGINE
+# =========================
+'''Autograd-free mirror of the FSRS functions in fsrs_trained_batch.py,
+    for scheduling jobs that only need to *apply* trained weights.
+    Importing this module does not import torch.
+
+    Every function works column-wise on arrays of cards. Weights are either
+    one parameter set [n_weights] or one row per card [n_cards, n_weights].
+'''
+
+# Same order as fsrs_trained_batch.FSRSParameters.WEIGHT_NAMES
+WEIGHT_NAMES = (
+    "w0", "w1", "w2", "w3", "w4", "w5", "w6", "w7",
+    "init_s_again", "init_s_hard", "init_s_good", "init_s_easy",
+)
+DEFAULT_WEIGHTS = (
+    0.4, 0.6, 0.9, 0.2, 0.8, 0.1, 1.4, 0.2,
+    0.5, 1.0, 2.5, 4.0,
+)
+
+DECAY = -0.5
+EPS = 1e-6
+MAX_STABILITY = 200
+
+# Same as fsrs_trained_batch.SRS_TARGETS (mirrors lib/srs.server.ts)
+GRADES = ("again", "hard", "good", "easy")
+SRS_TARGETS = {"again": 0.5, "hard": 0.95, "good": 0.9, "easy": 0.85}
+
+
+# =========================
+# WEIGHTS
+# =========================
+
+class FSRSWeights:
+    """
+    Named read-only columns over a weight array (w.w4, w.init_s_good, ...)
+    """
+
+    def __init__(self, weights=DEFAULT_WEIGHTS):
+        self.weights = np.asarray(weights, dtype=np.float64)
+        if self.weights.shape[-1] != len(WEIGHT_NAMES):
+            raise ValueError(f"expected {len(WEIGHT_NAMES)} weights, got {self.weights.shape[-1]}")
+
+        for i, name in enumerate(WEIGHT_NAMES):
+            setattr(self, name, self.weights[..., i])
+
+    @property
+    def per_card(self):
+        return self.weights.ndim == 2
+
+    def take(self, idx):
+        """
+        Rows for a subset of cards (no-op for a shared parameter set)
+        """
+        return FSRSWeights(self.weights[idx]) if self.per_card else self
+
+    @classmethod
+    def from_params_json(cls, params):
+        """
+        {name: float} (srs_params.params shape); missing names keep defaults
+        """
+        return cls([
+            float(params.get(name, default))
+            for name, default in zip(WEIGHT_NAMES, DEFAULT_WEIGHTS)
+        ])
+
+
+def load_weights(source):
+    """
+    FSRSWeights from a weight array, a params dict, a params .json file,
+    or a torch checkpoint (.pt, packed or legacy layout). torch is only
+    imported for .pt files.
+    """
+    if isinstance(source, FSRSWeights):
+        return source
+    if isinstance(source, dict):
+        return FSRSWeights.from_params_json(source)
+    if isinstance(source, (np.ndarray, list, tuple)):
+        return FSRSWeights(source)
+
+    path = str(source)
+    if path.endswith(".json"):
+        with open(path) as f:
+            return FSRSWeights.from_params_json(json.load(f))
+
+    import torch
+
+    state_dict = torch.load(path, map_location="cpu")
+    if "weights" in state_dict:
+        return FSRSWeights(state_dict["weights"].numpy())
+    return FSRSWeights.from_params_json({k: float(v) for k, v in state_dict.items()})
+
+
+def params_by_user(paths):
+    """
+    {user_id: path} for srs_params JSON / .pt files (named after the user)
+    and fit_users.py output directories (one <user_id>.json per user)
+    """
+    weights_by_user = {}
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.endswith(".json") and name not in ("summary.json", "index.json"):
+                    weights_by_user[name[:-len(".json")]] = os.path.join(path, name)
+        else:
+            weights_by_user[os.path.splitext(os.path.basename(path))[0]] = path
+    return weights_by_user
+
+
+# =========================
+# FSRS CORE FUNCTIONS
+# =========================
+
+def retrievability(elapsed_days, stability):
+    R = np.exp(-np.asarray(elapsed_days) / np.maximum(stability, EPS))
+    return np.clip(R, EPS, 1.0)
+
+
+def initial_stability(grade, w):
+    return np.where(
+        grade == 1, w.init_s_again,
+        np.where(
+            grade == 2, w.init_s_hard,
+            np.where(grade == 3, w.init_s_good, w.init_s_easy)
+        )
+    )
+
+
+def update_difficulty(D, grade, w):
+    D_new = D + w.w0 * (3.0 - grade) + w.w1 * (5.0 - D)
+    return np.clip(D_new, 1.0, 10.0)
+
+
+def stability_fail(S, D, R, w):
+    S_new = S * np.exp(w.w1) * np.exp(w.w2 * (R - 1))
+    return np.clip(S_new, 0.3 * S, 0.9 * S)
+
+
+def stability_success(S, D, R, w):
+    growth = (
+        np.exp(w.w4)
+        * (11 - D)
+        * (S ** w.w5)
+        * (np.exp((1 - R) * w.w6) - 1)
+    )
+    saturation = 1.0 / (1.0 + S / MAX_STABILITY)
+    return np.clip(S * (1 + growth * saturation), EPS, MAX_STABILITY)
+
+
+def next_state(S, D, elapsed_days, grade, w):
+    """
+    One review step for many cards: (S, D) before -> (S, D) after
+    """
+    R = retrievability(elapsed_days, S)
+    D_new = update_difficulty(D, grade, w)
+    S_new = np.where(
+        grade == 1,
+        stability_fail(S, D_new, R, w),
+        stability_success(S, D_new, R, w)
+    )
+    return S_new, D_new
+
+
+def predict_interval(stability, target_retrievability=0.9):
+    target = np.clip(target_retrievability, EPS, 0.99)
+    return np.maximum(stability * np.log(target) / DECAY, 1.0)
+
+
+class Model:
+    """
+    The three functions a replay needs, so other formula sets
+    (e.g. the TS scheduler's, see fsrs_eval) can reuse the replay loop
+    """
+
+    def __init__(self, initial_stability, retrievability, next_state):
+        self.initial_stability = initial_stability
+        self.retrievability = retrievability
+        self.next_state = next_state
+
+
+FSRS_MODEL = Model(initial_stability, retrievability, next_state)
+
+
+# =========================
+# HISTORY REPLAY
+# =========================
+
+def _scan(elapsed, grades, offsets, weights, model, recall=None):
+    """
+    Step every card through its history; returns final (S, D) per card.
+    If recall is given ([n_reviews]), the predicted R before each
+    non-first review is written at that review's position.
+    """
+    w = load_weights(weights if weights is not None else FSRSWeights())
+    offsets = np.asarray(offsets, dtype=np.int64)
+    starts = offsets[:-1]
+    lengths = np.diff(offsets)
+    n_cards = len(lengths)
+
+    # Longest histories first: at step t the cards still replaying are a prefix
+    order = np.argsort(-lengths, kind="stable")
+    starts = starts[order]
+    lengths = lengths[order]
+    w = w.take(order)
+    n_nonempty = int(np.count_nonzero(lengths))
+
+    S = np.full(n_cards, np.nan)
+    D = np.full(n_cards, np.nan)
+
+    first = np.asarray(grades[starts[:n_nonempty]], dtype=np.float64)
+    S[:n_nonempty] = model.initial_stability(first, w.take(slice(0, n_nonempty)))
+    D[:n_nonempty] = 5.0
+
+    neg_lengths = -lengths
+    for t in range(1, int(lengths[0]) if n_cards else 0):
+        n = int(np.searchsorted(neg_lengths, -t, side="left"))
+        pos = starts[:n] + t
+        elapsed_t = np.asarray(elapsed[pos], dtype=np.float64)
+
+        if recall is not None:
+            recall[pos] = model.retrievability(elapsed_t, S[:n])
+
+        S[:n], D[:n] = model.next_state(
+            S[:n],
+            D[:n],
+            elapsed_t,
+            np.asarray(grades[pos], dtype=np.float64),
+            w.take(slice(0, n))
+        )
+
+    stability = np.empty(n_cards)
+    difficulty = np.empty(n_cards)
+    stability[order] = S
+    difficulty[order] = D
+    return stability, difficulty
+
+
+def replay(
+    elapsed,
+    grades,
+    offsets,
+    weights=None,
+    days_since_last=0.0,
+    target_retrievability=0.9,
+    model=FSRS_MODEL
+):
+    """
+    Replay many card histories at once.
+
+    elapsed, grades: flat per-review arrays, card i is [offsets[i]:offsets[i+1]]
+                     (the SequenceCache layout)
+    weights:         anything load_weights accepts; per-card rows allowed
+    days_since_last: scalar or [n_cards], time since each card's last review
+
+    returns dict of [n_cards] arrays: stability, difficulty,
+    retrievability (now) and interval (days, at target_retrievability).
+    Cards with no reviews come back as NaN.
+    """
+    stability, difficulty = _scan(elapsed, grades, offsets, weights, model)
+
+    return {
+        "stability": stability,
+        "difficulty": difficulty,
+        "retrievability": model.retrievability(days_since_last, stability),
+        "interval": predict_interval(stability, target_retrievability),
+    }
+
+
+def predict_recall(elapsed, grades, offsets, weights=None, model=FSRS_MODEL):
+    """
+    [n_reviews] predicted R at each review from the card's history so far;
+    NaN at first reviews, which have nothing to predict from
+    """
+    recall = np.full(len(grades), np.nan)
+    _scan(elapsed, grades, offsets, weights, model, recall)
+    return recall
+
+
+def replay_sequences(sequences, weights=None, **kwargs):
+    """
+    replay() for a list of [(elapsed_days, grade), ...] sequences
+    """
+    lengths = [len(seq) for seq in sequences]
+    offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+    flat = [review for seq in sequences for review in seq]
+    elapsed = np.array([e for e, _ in flat], dtype=np.float64)
+    grades = np.array([g for _, g in flat], dtype=np.float64)
+    return replay(elapsed, grades, offsets, weights, **kwargs)
+
+
+def replay_cache(cache, weights=None, **kwargs):
+    """
+    replay() straight from a SequenceCache's memory-mapped arrays
+    """
+    return replay(cache.elapsed, cache.grade, cache.offsets, weights, **kwargs)
+
+
+# =========================
+# SCHEDULING
+# =========================
+
+def target_array(targets):
+    """
+    targets dict -> [5] array indexed by grade 1-4
+    """
+    return np.array([np.nan] + [targets[g] for g in GRADES])
+
+
+def _start_state(stability, difficulty):
+    """
+    (S, D, is_new) with NaN stability marking new cards; new cards and
+    missing difficulties start at D = 5
+    """
+    S = np.asarray(stability, dtype=np.float64)
+    is_new = np.isnan(S)
+    D = np.where(np.isnan(difficulty) | is_new, 5.0, difficulty)
+    return np.where(is_new, 1.0, S), D, is_new
+
+
+def review_cards(stability, difficulty, elapsed_days, grade, weights=None, targets=SRS_TARGETS, model=FSRS_MODEL):
+    """
+    State after one review for many cards (the app's calculate step).
+
+    stability, difficulty, elapsed_days, grade: [N] (NaN stability = new card)
+    weights: anything load_weights accepts; per-card rows allowed
+    returns dict of [N] arrays: stability, difficulty, interval (whole days
+    at targets[grade], rounded up like the app; "again" is 0, relearn now)
+    """
+    w = load_weights(weights if weights is not None else FSRSWeights())
+    grade = np.asarray(grade, dtype=np.float64)
+    S, D, is_new = _start_state(stability, difficulty)
+
+    S_next, D_next = model.next_state(S, D, elapsed_days, grade, w)
+    # New cards start from the first-rating stability, difficulty stays neutral
+    S_next = np.where(is_new, model.initial_stability(grade, w), S_next)
+    D_next = np.where(is_new, D, D_next)
+
+    target = target_array(targets)[grade.astype(np.int64)]
+    interval = np.where(grade == 1, 0.0, np.ceil(predict_interval(S_next, target)))
+    return {"stability": S_next, "difficulty": D_next, "interval": interval}
+
+
+def preview_grades(stability, difficulty, elapsed_days, weights=None, targets=SRS_TARGETS, model=FSRS_MODEL):
+    """
+    review_cards under each of again/hard/good/easy in one pass (the app's
+    simulate step); same as fsrs_trained_batch.preview_grades.
+    returns dict of [4, N] arrays (rows in GRADES order); intervals are
+    unrounded days, "again" is 0
+    """
+    w = load_weights(weights if weights is not None else FSRSWeights())
+    grades = np.arange(1.0, 5.0)[:, None]
+    S, D, is_new = _start_state(stability, difficulty)
+
+    S_next, D_next = model.next_state(S, D, elapsed_days, grades, w)
+    S_next = np.where(is_new, model.initial_stability(grades, w), S_next)
+    D_next = np.where(is_new, D, D_next)
+
+    interval = np.where(grades == 1, 0.0, predict_interval(S_next, target_array(targets)[1:, None]))
+    return {"stability": S_next, "difficulty": D_next, "interval": interval}
@@ -0,0 +1,404 @@
+import argparse
+import csv
+import gzip
+import json
+import os
+import struct
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+import fsrs_numpy
+from review_sequences import parse_timestamp
+
+# =========================
+# PER-USER PARAMETER STORE
+# =========================
+'''Many users' trained weights in one memory-mapped file, so scheduling
+    jobs resolve parameters for 100k users with one open and a few array
+    ops instead of one srs_params read (or torch.load) per user.
+    Torch-free: nothing is unpickled.
+
+    File layout (little-endian, each section 64-byte aligned):
+        header    magic, format version, n_weights, n_users, id width, meta length
+        meta      JSON: weight_names, created_at
+        ids       S<id width> [n_users]       utf-8 user ids, sorted
+        versions  int64 [n_users]             version stamp per user
+        weights   float32 [n_users, n_weights]
+
+    Lookups binary-search the sorted ids (np.searchsorted), so a batch of
+    user ids is resolved in one call and opening the file reads only the
+    header. Version stamps are srs_params.updated_at in unix ms when built
+    from an export (file mtime for param files); callers compare them to
+    tell whether state derived from a user's params is stale.
+
+    Writes go to a temp file and replace the store atomically: open readers
+    keep their old mapping, CachedParamStore notices the new file and reopens.
+'''
+
+MAGIC = b"FSRSPRM\x00"
+STORE_VERSION = 1
+HEADER = struct.Struct("<8sIIQII")
+ALIGN = 64
+MISSING_VERSION = -1
+
+
+def _aligned(offset):
+    return (offset + ALIGN - 1) // ALIGN * ALIGN
+
+
+def _encode_ids(user_ids):
+    return np.array([str(u).encode("utf-8") for u in user_ids], dtype=bytes)
+
+
+# =========================
+# WRITING
+# =========================
+
+def write_param_store(path, user_ids, weights, versions=None):
+    """
+    Write a store for user_ids (unique) with weights [n_users, n_weights]
+    and optional int versions [n_users] (default 0)
+    """
+    ids = _encode_ids(user_ids)
+    weights = np.asarray(weights, dtype=np.float32).reshape(len(ids), len(fsrs_numpy.WEIGHT_NAMES))
+    versions = np.zeros(len(ids), dtype=np.int64) if versions is None else np.asarray(versions, dtype=np.int64)
+
+    order = np.argsort(ids, kind="stable")
+    ids, weights, versions = ids[order], weights[order], versions[order]
+    if len(ids) > 1 and np.any(ids[1:] == ids[:-1]):
+        raise ValueError(f"{path}: duplicate user ids {sorted(set(ids[1:][ids[1:] == ids[:-1]].tolist()))[:5]}")
+
+    id_width = max(ids.dtype.itemsize, 1)
+    meta = json.dumps({"weight_names": list(fsrs_numpy.WEIGHT_NAMES), "created_at": time.time()}).encode()
+
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, STORE_VERSION, weights.shape[1], len(ids), id_width, len(meta)))
+        f.write(meta)
+        for block in (ids.astype(f"S{id_width}"), versions.astype("<i8"), weights.astype("<f4")):
+            f.write(b"\0" * (_aligned(f.tell()) - f.tell()))
+            f.write(np.ascontiguousarray(block).tobytes())
+    os.replace(tmp_path, path)
+
+
+def upsert_param_store(path, user_ids, weights, versions=None):
+    """
+    Merge users into the store at path (created if missing). A user's row
+    is replaced unless the store already holds a newer version.
+    """
+    new = ParamStore.from_arrays(user_ids, weights, versions)
+    if not os.path.exists(path):
+        write_param_store(path, new.users, new.weights, new.versions)
+        return ParamStore(path)
+
+    old = ParamStore(path)
+    rows, found = old.index(new.ids)
+    keep_new = ~found | (new.versions >= np.where(found, old.versions[rows], MISSING_VERSION))
+
+    keep_old = np.ones(len(old), dtype=bool)
+    keep_old[rows[found & keep_new]] = False
+
+    write_param_store(
+        path,
+        old.users_at(np.flatnonzero(keep_old)) + new.users_at(np.flatnonzero(keep_new)),
+        np.concatenate([old.weights[keep_old], new.weights[keep_new]]),
+        np.concatenate([old.versions[keep_old], new.versions[keep_new]])
+    )
+    return ParamStore(path)
+
+
+# =========================
+# SOURCES
+# =========================
+
+def _open_text(path):
+    if str(path).endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", newline="")
+    return open(path, "rt", encoding="utf-8", newline="")
+
+
+def iter_srs_params_rows(path):
+    """
+    Stream (user_id, params dict, version) from a CSV / JSONL export of
+    srs_params (user_id, params, updated_at); version is updated_at in unix ms
+    """
+    with _open_text(path) as f:
+        name = str(path)[:-3] if str(path).endswith(".gz") else str(path)
+        if name.endswith(".jsonl") or name.endswith(".ndjson"):
+            records = (json.loads(line) for line in f if line.strip())
+        else:
+            records = csv.DictReader(f)
+
+        for rec in records:
+            params = rec["params"]
+            if isinstance(params, str):
+                params = json.loads(params) if params.strip() else {}
+            updated_at = rec.get("updated_at")
+            version = int(parse_timestamp(updated_at) * 1000) if updated_at not in (None, "") else 0
+            yield str(rec["user_id"]), params, version
+
+
+def store_from_export(path, export_path):
+    """
+    Build or update a store from a srs_params export. srs_params allows
+    several rows per user; the latest updated_at wins.
+    """
+    latest = {}
+    for user_id, params, version in iter_srs_params_rows(export_path):
+        if user_id not in latest or version >= latest[user_id][1]:
+            latest[user_id] = (fsrs_numpy.FSRSWeights.from_params_json(params).weights, version)
+
+    user_ids = list(latest)
+    return upsert_param_store(
+        path,
+        user_ids,
+        np.array([latest[u][0] for u in user_ids]).reshape(len(user_ids), len(fsrs_numpy.WEIGHT_NAMES)),
+        [latest[u][1] for u in user_ids]
+    )
+
+
+def store_from_files(path, weights_by_user):
+    """
+    Build or update a store from {user_id: srs_params JSON / .pt path}
+    (e.g. fsrs_numpy.params_by_user of a fit_users.py output directory);
+    versions are the files' mtimes in ms
+    """
+    user_ids = list(weights_by_user)
+    return upsert_param_store(
+        path,
+        user_ids,
+        np.array([fsrs_numpy.load_weights(weights_by_user[u]).weights for u in user_ids]).reshape(len(user_ids), len(fsrs_numpy.WEIGHT_NAMES)),
+        [int(os.path.getmtime(weights_by_user[u]) * 1000) for u in user_ids]
+    )
+
+
+# =========================
+# READING
+# =========================
+
+class ParamStore:
+    """
+    Read-only view of a store file (or of in-memory arrays, from_arrays)
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            magic, version, n_weights, n_users, id_width, meta_len = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC:
+                raise ValueError(f"{path}: not a parameter store")
+            if version != STORE_VERSION:
+                raise ValueError(f"{path}: unsupported store version {version}")
+            self.meta = json.loads(f.read(meta_len))
+
+        if tuple(self.meta["weight_names"]) != fsrs_numpy.WEIGHT_NAMES:
+            raise ValueError(f"{path}: weight names {self.meta['weight_names']} don't match fsrs_numpy")
+
+        self.path = path
+        offset = _aligned(HEADER.size + meta_len)
+        self.ids = self._map(offset, f"S{id_width}", (n_users,))
+        offset = _aligned(offset + id_width * n_users)
+        self.versions = self._map(offset, "<i8", (n_users,))
+        offset = _aligned(offset + 8 * n_users)
+        self.weights = self._map(offset, "<f4", (n_users, n_weights))
+
+    def _map(self, offset, dtype, shape):
+        if shape[0] == 0:
+            return np.zeros(shape, dtype=dtype)
+        return np.memmap(self.path, dtype=dtype, mode="r", offset=offset, shape=shape)
+
+    @classmethod
+    def from_arrays(cls, user_ids, weights, versions=None):
+        """
+        Unsaved store over arrays (same lookups, nothing mapped)
+        """
+        store = cls.__new__(cls)
+        ids = _encode_ids(user_ids)
+        order = np.argsort(ids, kind="stable")
+        store.path = None
+        store.meta = {"weight_names": list(fsrs_numpy.WEIGHT_NAMES)}
+        store.ids = ids[order]
+        store.weights = np.asarray(weights, dtype=np.float32).reshape(len(ids), len(fsrs_numpy.WEIGHT_NAMES))[order]
+        store.versions = (
+            np.zeros(len(ids), dtype=np.int64) if versions is None
+            else np.asarray(versions, dtype=np.int64)[order]
+        )
+        return store
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, user_id):
+        return bool(self.index([user_id])[1][0])
+
+    @property
+    def users(self):
+        return self.users_at(range(len(self)))
+
+    def users_at(self, rows):
+        return [self.ids[r].decode("utf-8") for r in rows]
+
+    def index(self, user_ids):
+        """
+        (rows, found) for a batch of user ids; rows of missing users are 0
+        """
+        query = user_ids if isinstance(user_ids, np.ndarray) and user_ids.dtype.kind == "S" else _encode_ids(user_ids)
+        if len(self) == 0:
+            return np.zeros(len(query), dtype=np.int64), np.zeros(len(query), dtype=bool)
+
+        rows = np.minimum(np.searchsorted(self.ids, query), len(self) - 1)
+        found = self.ids[rows] == query
+        return np.where(found, rows, 0), found
+
+    def lookup(self, user_ids, missing="default"):
+        """
+        (weights [n, n_weights] float64, versions [n], found [n]) for a batch.
+        missing="default": unknown users get DEFAULT_WEIGHTS and version -1;
+        missing="raise": KeyError
+        """
+        rows, found = self.index(user_ids)
+        if missing == "raise" and not found.all():
+            unknown = [u for u, ok in zip(user_ids, found) if not ok]
+            raise KeyError(f"no parameters for users {unknown[:5]}")
+
+        if len(self) == 0:
+            stored_weights, stored_versions = np.zeros((len(rows), len(fsrs_numpy.WEIGHT_NAMES))), rows
+        else:
+            stored_weights, stored_versions = self.weights[rows], self.versions[rows]
+
+        weights = np.where(found[:, None], stored_weights, np.asarray(fsrs_numpy.DEFAULT_WEIGHTS))
+        versions = np.where(found, stored_versions, MISSING_VERSION)
+        return weights, versions, found
+
+    def get(self, user_id, default=None):
+        """
+        FSRSWeights for one user (default if unknown)
+        """
+        weights, _, found = self.lookup([user_id])
+        return fsrs_numpy.FSRSWeights(weights[0]) if found[0] else default
+
+    def card_weights(self, card_user_ids):
+        """
+        Per-card FSRSWeights [n_cards, n_weights] for a batch of cards from
+        many users; each distinct user is looked up once
+        """
+        users, inverse = np.unique(_encode_ids(card_user_ids), return_inverse=True)
+        weights, _, _ = self.lookup(users)
+        return fsrs_numpy.FSRSWeights(weights[inverse.reshape(-1)])
+
+
+# =========================
+# IN-PROCESS CACHE
+# =========================
+
+class CachedParamStore:
+    """
+    ParamStore behind an LRU of per-user (weights, version) rows, for
+    callers that ask for a few users at a time (request handlers).
+
+    check_interval: seconds between checks for a replaced store file
+                    (None = only on refresh()); a new file clears the cache
+    """
+
+    def __init__(self, path, maxsize=10_000, check_interval=5.0):
+        self.path = path
+        self.maxsize = maxsize
+        self.check_interval = check_interval
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._open()
+
+    def _open(self):
+        stat = os.stat(self.path)
+        self.store = ParamStore(self.path)
+        self._file_id = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        self._checked = time.monotonic()
+        self._cache.clear()
+
+    def refresh(self):
+        """
+        Reopen if the store file was replaced; True if it was
+        """
+        stat = os.stat(self.path)
+        self._checked = time.monotonic()
+        if (stat.st_ino, stat.st_mtime_ns, stat.st_size) == self._file_id:
+            return False
+        self._open()
+        return True
+
+    def _maybe_refresh(self):
+        if self.check_interval is not None and time.monotonic() - self._checked >= self.check_interval:
+            self.refresh()
+
+    def lookup(self, user_ids):
+        """
+        Same as ParamStore.lookup (missing users get defaults), served from
+        the LRU where possible; all misses go to the store in one batch
+        """
+        self._maybe_refresh()
+        user_ids = [str(u) for u in user_ids]
+        n_weights = len(fsrs_numpy.WEIGHT_NAMES)
+        weights = np.empty((len(user_ids), n_weights))
+        versions = np.empty(len(user_ids), dtype=np.int64)
+        found = np.empty(len(user_ids), dtype=bool)
+
+        todo = []
+        for i, user_id in enumerate(user_ids):
+            row = self._cache.get(user_id)
+            if row is None:
+                todo.append(i)
+                continue
+            self._cache.move_to_end(user_id)
+            weights[i], versions[i], found[i] = row
+            self.hits += 1
+
+        if todo:
+            self.misses += len(todo)
+            missed = [user_ids[i] for i in todo]
+            w, v, f = self.store.lookup(missed)
+            weights[todo], versions[todo], found[todo] = w, v, f
+            for user_id, row in zip(missed, zip(w, v, f)):
+                self._cache[user_id] = row
+                self._cache.move_to_end(user_id)
+            while len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+
+        return weights, versions, found
+
+    def get(self, user_id):
+        """
+        (FSRSWeights, version) for one user; version -1 = defaults
+        """
+        weights, versions, _ = self.lookup([user_id])
+        return fsrs_numpy.FSRSWeights(weights[0]), int(versions[0])
+
+    def cache_info(self):
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._cache), "maxsize": self.maxsize}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build, update or query a per-user FSRS parameter store")
+    parser.add_argument("store", help="store file (created if missing)")
+    parser.add_argument("params", nargs="*", help="srs_params JSON / .pt files or fit_users.py output directories to upsert")
+    parser.add_argument("--export", default=None, help="srs_params CSV / JSONL export (user_id, params, updated_at) to upsert")
+    parser.add_argument("--get", nargs="*", default=[], metavar="USER_ID", help="print these users' weights")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.export:
+        store_from_export(args.store, args.export)
+    if args.params:
+        store_from_files(args.store, fsrs_numpy.params_by_user(args.params))
+    if args.export or args.params:
+        print(f"Updated {args.store} in {time.perf_counter() - start:.2f}s")
+
+    store = ParamStore(args.store)
+    print(f"{args.store}: {len(store)} users, {os.path.getsize(args.store)} bytes")
+
+    if args.get:
+        weights, versions, found = store.lookup(args.get)
+        for user_id, w, v, ok in zip(args.get, weights, versions, found):
+            values = dict(zip(fsrs_numpy.WEIGHT_NAMES, np.round(w, 4).tolist()))
+            print(f"{user_id}: version {v}{'' if ok else ' (not stored, defaults)'} {values}")
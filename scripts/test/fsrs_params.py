@@ -0,0 +1,152 @@
+import torch
+import torch.nn as nn
+
+# =========================
+# PACKED FSRS PARAMETERS
+# =========================
+'''All FSRS weights live in one trainable vector `weights`.
+    Each name in WEIGHT_NAMES becomes a read-only view into it
+    (p.w4 is p.weights[4]), so the core functions keep using p.w0, p.init_s_good, ...
+
+    weights [n_weights]     -> one parameter set, views are 0-d
+    weights [P, n_weights]  -> P parameter sets, views are [P, 1] columns
+                               that broadcast against per-set state [P, B]
+'''
+
+
+def _weight_view(weights, i):
+    if weights.dim() == 1:
+        return weights[i]
+    return weights[:, i:i + 1]
+
+
+class WeightView:
+    """
+    The same named views over a bare weights tensor, without the module.
+    Compiled code builds one of these from its tensor argument, so
+    torch.compile doesn't guard on (and recompile for) every module instance.
+    """
+
+    def __init__(self, weights):
+        self.weights = weights
+
+
+class PackedFSRSParameters(nn.Module):
+    WEIGHT_NAMES = ()
+    DEFAULT_WEIGHTS = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        views = {
+            name: property(lambda self, i=i: _weight_view(self.weights, i))
+            for i, name in enumerate(cls.WEIGHT_NAMES)
+        }
+        for name, view in views.items():
+            setattr(cls, name, view)
+
+        # cls.View(weights).w0 == cls(weights).w0
+        cls.View = type(f"{cls.__name__}View", (WeightView,), views)
+
+    def __init__(self, weights=None):
+        super().__init__()
+
+        if weights is None:
+            weights = self.DEFAULT_WEIGHTS
+
+        weights = torch.as_tensor(weights, dtype=torch.float32).detach().clone()
+        if weights.shape[-1] != len(self.WEIGHT_NAMES):
+            raise ValueError(
+                f"expected {len(self.WEIGHT_NAMES)} weights, got {weights.shape[-1]}"
+            )
+
+        self.weights = nn.Parameter(weights)
+
+    @property
+    def n_weights(self):
+        return len(self.WEIGHT_NAMES)
+
+    @property
+    def is_batched(self):
+        return self.weights.dim() == 2
+
+    # -------------------------
+    # batched form
+    # -------------------------
+
+    @classmethod
+    def stack(cls, param_sets):
+        """
+        Pack several single parameter sets into one [P, n_weights] module
+        """
+        return cls(torch.stack([p.weights.detach() for p in param_sets]))
+
+    @classmethod
+    def repeat(cls, n_sets, weights=None):
+        """
+        P copies of one parameter set (defaults if weights is None)
+        """
+        base = cls(weights).weights.detach()
+        return cls(base.unsqueeze(0).repeat(n_sets, 1))
+
+    def unbind(self):
+        """
+        Split a batched module back into single parameter sets
+        """
+        return [type(self)(w) for w in self.weights.detach()]
+
+    # -------------------------
+    # legacy / JSON conversion
+    # -------------------------
+
+    def legacy_state_dict(self):
+        """
+        state_dict in the old one-nn.Parameter-per-weight layout
+        """
+        return {
+            name: self.weights[..., i].detach().clone()
+            for i, name in enumerate(self.WEIGHT_NAMES)
+        }
+
+    def to_params_json(self):
+        """
+        {name: float} dict, the shape srs_params.params stores
+        """
+        if self.is_batched:
+            raise ValueError("to_params_json needs a single parameter set")
+        return dict(zip(self.WEIGHT_NAMES, self.weights.detach().tolist()))
+
+    @classmethod
+    def from_params_json(cls, params):
+        """
+        Build from a {name: float} dict; missing names keep their defaults
+        """
+        weights = [
+            float(params.get(name, default))
+            for name, default in zip(cls.WEIGHT_NAMES, cls.DEFAULT_WEIGHTS)
+        ]
+        return cls(weights)
+
+    @classmethod
+    def from_state_dict(cls, state_dict):
+        """
+        Build from either a packed or a legacy state_dict
+        """
+        if "weights" in state_dict:
+            return cls(state_dict["weights"])
+
+        params = cls()
+        params.load_state_dict(state_dict)
+        return params
+
+    def _load_from_state_dict(self, state_dict, prefix, *args, **kwargs):
+        # Accept legacy checkpoints saved with one parameter per weight
+        legacy_keys = [prefix + name for name in self.WEIGHT_NAMES]
+        if prefix + "weights" not in state_dict and all(
+            key in state_dict for key in legacy_keys
+        ):
+            state_dict[prefix + "weights"] = torch.stack(
+                [torch.as_tensor(state_dict.pop(key)) for key in legacy_keys],
+                dim=-1
+            )
+
+        super()._load_from_state_dict(state_dict, prefix, *args, **kwargs)
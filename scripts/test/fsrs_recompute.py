@@ -0,0 +1,336 @@
+import argparse
+import csv
+import json
+import os
+import time
+
+import numpy as np
+
+import fsrs_numpy
+from fsrs_param_store import ParamStore
+from review_sequences import build_card_sequence, iter_user_card_reviews
+
+# =========================
+# BULK CARD-STATE RECOMPUTE
+# =========================
+'''Recomputes the memory state stored on cards (stability, difficulty,
+    interval, due_date) from card_reviews after users' srs_params change.
+
+    Pipeline; memory is bounded by one chunk of users:
+        card_reviews export -> review_sequences.iter_user_card_reviews
+        -> chunks of whole users (about chunk_cards cards each)
+        -> flat elapsed/grade/offsets arrays + per-card weights from the
+           parameter store (ParamStore.card_weights)
+        -> one fsrs_numpy.replay over every card of the chunk
+        -> out_dir/part-00000.csv (or .ndjson), one row per card
+
+    Intervals follow the app: ceil(predict_interval(S, targets[last grade]))
+    whole days and due_date = last review + interval; a last "again" leaves
+    interval 0 and due_date one minute after that review.
+
+    Rows: id, user_id, stability, difficulty, interval, due_date (ISO, UTC).
+    Apply with COPY into a staging table, then
+        UPDATE cards c
+        SET stability = s.stability, difficulty = s.difficulty,
+            interval = s.interval, due_date = s.due_date
+        FROM staging s WHERE c.id = s.id AND c.user_id = s.user_id;
+
+    Resumable: each chunk's part file is written under a temp name and
+    renamed, then progress.json records how many users are done. A rerun
+    with the same input and settings skips those users (they are still
+    read, not replayed) and carries on; a finished run does nothing.
+'''
+
+COLUMNS = ("id", "user_id", "stability", "difficulty", "interval", "due_date")
+FORMATS = ("csv", "ndjson")
+RELEARN_SECONDS = 60.0
+PROGRESS_FILE = "progress.json"
+
+
+# =========================
+# REPLAY
+# =========================
+
+def recompute_chunk(users, store, model=fsrs_numpy.FSRS_MODEL, targets=fsrs_numpy.SRS_TARGETS, whole_days=False):
+    """
+    users: [(user_id, {card_id: [(reviewed_at_seconds, rating), ...]}), ...]
+    returns dict of [n_cards] arrays in COLUMNS order (due_date as unix seconds)
+    """
+    card_ids, card_users, lengths, last_reviewed, elapsed, grades = [], [], [], [], [], []
+    for user_id, card_reviews in users:
+        for card_id, reviews in card_reviews.items():
+            sequence = build_card_sequence(reviews, whole_days)
+            card_ids.append(card_id)
+            card_users.append(user_id)
+            lengths.append(len(sequence))
+            last_reviewed.append(max(ts for ts, _ in reviews))
+            for e, g in sequence:
+                elapsed.append(e)
+                grades.append(g)
+
+    offsets = np.concatenate([[0], np.cumsum(lengths, dtype=np.int64)])
+    grades = np.asarray(grades, dtype=np.float64)
+    weights = store.card_weights(card_users) if card_ids else None
+
+    out = fsrs_numpy.replay(np.asarray(elapsed, dtype=np.float64), grades, offsets, weights, model=model)
+    S = out["stability"]
+
+    last_grade = grades[offsets[1:] - 1].astype(np.int64)
+    target = fsrs_numpy.target_array(targets)[last_grade]
+    interval = np.where(last_grade == 1, 0, np.ceil(fsrs_numpy.predict_interval(S, target))).astype(np.int64)
+
+    last_reviewed = np.asarray(last_reviewed, dtype=np.float64)
+    due = np.where(interval > 0, last_reviewed + interval * 86400.0, last_reviewed + RELEARN_SECONDS)
+
+    return {
+        "id": card_ids,
+        "user_id": card_users,
+        "stability": S,
+        "difficulty": out["difficulty"],
+        "interval": interval,
+        "due_date": due,
+    }
+
+
+# =========================
+# OUTPUT
+# =========================
+
+def iso_utc(seconds):
+    """
+    unix seconds -> ISO 8601 UTC strings (Postgres timestamptz input)
+    """
+    ms = np.round(np.asarray(seconds, dtype=np.float64) * 1000).astype("datetime64[ms]")
+    return np.datetime_as_string(ms, unit="ms", timezone="UTC")
+
+
+def write_part(path, rows, fmt="csv"):
+    """
+    Write one chunk's rows atomically (temp file + rename)
+    """
+    columns = [
+        rows["id"],
+        rows["user_id"],
+        rows["stability"].tolist(),
+        rows["difficulty"].tolist(),
+        rows["interval"].tolist(),
+        iso_utc(rows["due_date"]).tolist(),
+    ]
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+        if fmt == "csv":
+            writer = csv.writer(f)
+            writer.writerow(COLUMNS)
+            writer.writerows(zip(*columns))
+        else:
+            for values in zip(*columns):
+                f.write(json.dumps(dict(zip(COLUMNS, values))) + "\n")
+    os.replace(tmp_path, path)
+
+
+# =========================
+# RESUMABLE JOB
+# =========================
+
+def _fingerprint(reviews_path, store, fmt, chunk_cards, users, model_name, targets, whole_days, review_kwargs):
+    stat = os.stat(reviews_path)
+    return {
+        "reviews": {"path": os.path.abspath(reviews_path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns},
+        "store": {"path": store.path and os.path.abspath(store.path), "users": len(store),
+                  "max_version": int(store.versions.max()) if len(store) else None},
+        "format": fmt,
+        "chunk_cards": chunk_cards,
+        "users": sorted(users) if users is not None else None,
+        "model": model_name,
+        "targets": dict(targets),
+        "whole_days": whole_days,
+        # user order depends on these (sorted vs partitioned reads)
+        "review_options": review_kwargs,
+    }
+
+
+def _load_progress(path, fingerprint, restart):
+    if restart or not os.path.exists(path):
+        return {"fingerprint": fingerprint, "users_done": 0, "users_replayed": 0,
+                "cards": 0, "parts": 0, "finished": False}
+
+    with open(path) as f:
+        progress = json.load(f)
+    if progress["fingerprint"] != fingerprint:
+        raise ValueError(f"{path} belongs to a run with different input or settings "
+                         f"(use restart=True / --restart or another out_dir)")
+    return progress
+
+
+def _save_progress(path, progress):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(progress, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _user_chunks(user_reviews, chunk_cards):
+    """
+    Group consecutive users into chunks of about chunk_cards cards;
+    yields (n_users_seen, [(user_id, card_reviews), ...]) where skipped
+    users (card_reviews None) count as seen but aren't replayed
+    """
+    chunk, n_seen, n_cards = [], 0, 0
+    for user_id, card_reviews in user_reviews:
+        n_seen += 1
+        if card_reviews is not None:
+            chunk.append((user_id, card_reviews))
+            n_cards += len(card_reviews)
+        if n_cards >= chunk_cards:
+            yield n_seen, chunk
+            chunk, n_seen, n_cards = [], 0, 0
+    if n_seen:
+        yield n_seen, chunk
+
+
+def recompute_cards(
+    reviews_path,
+    out_dir,
+    store=None,
+    fmt="csv",
+    chunk_cards=200_000,
+    users=None,
+    model=fsrs_numpy.FSRS_MODEL,
+    model_name="fsrs",
+    targets=fsrs_numpy.SRS_TARGETS,
+    whole_days=False,
+    restart=False,
+    max_chunks=None,
+    verbose=True,
+    **review_kwargs
+):
+    """
+    Replay every card in a card_reviews export under the users' current
+    params and write bulk-update part files to out_dir.
+
+    store:        ParamStore or store path (None: default weights for everyone)
+    users:        only recompute these user ids (e.g. users whose params changed)
+    model_name:   recorded in progress.json with the other settings
+    whole_days:   floor elapsed days like the trainers (the app uses fractional days)
+    max_chunks:   stop after this many chunks in this call (resume later)
+    review_kwargs: review_sequences.iter_user_card_reviews options
+                   (assume_sorted, n_partitions, ...)
+    returns progress.json's contents
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"fmt must be one of {FORMATS}, got {fmt!r}")
+    if store is None:
+        store = ParamStore.from_arrays([], np.zeros((0, len(fsrs_numpy.WEIGHT_NAMES))))
+    elif isinstance(store, str):
+        store = ParamStore(store)
+
+    os.makedirs(out_dir, exist_ok=True)
+    progress_path = os.path.join(out_dir, PROGRESS_FILE)
+    fingerprint = _fingerprint(reviews_path, store, fmt, chunk_cards, users, model_name, targets, whole_days, review_kwargs)
+    progress = _load_progress(progress_path, fingerprint, restart)
+    if progress["finished"]:
+        return progress
+
+    wanted = set(map(str, users)) if users is not None else None
+    skip = progress["users_done"]
+
+    def user_reviews():
+        for i, (user_id, card_reviews) in enumerate(iter_user_card_reviews(reviews_path, **review_kwargs)):
+            if i < skip:
+                continue
+            yield user_id, card_reviews if wanted is None or user_id in wanted else None
+
+    start = time.perf_counter()
+    chunks_run = 0
+    for n_seen, chunk in _user_chunks(user_reviews(), chunk_cards):
+        if chunk:
+            rows = recompute_chunk(chunk, store, model, targets, whole_days)
+            part = os.path.join(out_dir, f"part-{progress['parts']:05d}.{fmt}")
+            write_part(part, rows, fmt)
+            progress["parts"] += 1
+            progress["cards"] += len(rows["id"])
+            progress["users_replayed"] += len(chunk)
+
+        progress["users_done"] += n_seen
+        _save_progress(progress_path, progress)
+        chunks_run += 1
+
+        if verbose:
+            elapsed = time.perf_counter() - start
+            print(f"{progress['users_done']} users, {progress['cards']} cards | {elapsed:.1f}s")
+        if max_chunks is not None and chunks_run >= max_chunks:
+            break
+    else:
+        progress["finished"] = True
+        _save_progress(progress_path, progress)
+
+    return progress
+
+
+def read_parts(out_dir):
+    """
+    Every row written so far, in part order (for checks and small tenants)
+    """
+    with open(os.path.join(out_dir, PROGRESS_FILE)) as f:
+        progress = json.load(f)
+    fmt = progress["fingerprint"]["format"]
+
+    rows = []
+    for i in range(progress["parts"]):
+        with open(os.path.join(out_dir, f"part-{i:05d}.{fmt}"), encoding="utf-8", newline="") as f:
+            if fmt == "csv":
+                rows.extend(csv.DictReader(f))
+            else:
+                rows.extend(json.loads(line) for line in f if line.strip())
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recompute cards' stability/difficulty/interval/due_date from card_reviews")
+    parser.add_argument("reviews", help="card_reviews CSV / JSONL export (optionally .gz)")
+    parser.add_argument("--store", default=None, help="fsrs_param_store file (default weights if unset)")
+    parser.add_argument("--out", default="card_states")
+    parser.add_argument("--format", choices=FORMATS, default="csv")
+    parser.add_argument("--chunk-cards", type=int, default=200_000)
+    parser.add_argument("--users", nargs="*", default=None, help="only these user ids")
+    parser.add_argument("--since-version", type=int, default=None,
+                        help="only users whose stored params version is newer than this")
+    parser.add_argument("--ts-formulas", action="store_true", help="replay with lib/srs.server.ts formulas")
+    parser.add_argument("--whole-days", action="store_true")
+    parser.add_argument("--assume-sorted", action="store_true", help="export is ordered by user_id")
+    parser.add_argument("--restart", action="store_true", help="ignore existing progress in --out")
+    parser.add_argument("--max-chunks", type=int, default=None)
+    args = parser.parse_args()
+
+    model, model_name = fsrs_numpy.FSRS_MODEL, "fsrs"
+    if args.ts_formulas:
+        from fsrs_eval import TS_MODEL as model
+        model_name = "ts"
+
+    store = ParamStore(args.store) if args.store else None
+    users = args.users
+    if args.since_version is not None:
+        if store is None:
+            parser.error("--since-version needs --store")
+        changed = [u for u, v in zip(store.users, store.versions) if v > args.since_version]
+        users = changed if users is None else sorted(set(users) & set(changed))
+
+    start = time.perf_counter()
+    progress = recompute_cards(
+        args.reviews,
+        args.out,
+        store=store,
+        fmt=args.format,
+        chunk_cards=args.chunk_cards,
+        users=users,
+        model=model,
+        model_name=model_name,
+        whole_days=args.whole_days,
+        restart=args.restart,
+        max_chunks=args.max_chunks,
+        assume_sorted=args.assume_sorted
+    )
+    state = "finished" if progress["finished"] else "paused (rerun to resume)"
+    print(f"{state}: {progress['cards']} cards for {progress['users_replayed']} users "
+          f"in {progress['parts']} parts, {time.perf_counter() - start:.1f}s this run")
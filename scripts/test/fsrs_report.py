@@ -0,0 +1,267 @@
+import argparse
+import json
+import multiprocessing as mp
+import os
+import time
+
+import numpy as np
+import torch
+
+import fsrs_numpy
+from fsrs_trained_batch import (
+    GRADES,
+    SRS_TARGETS,
+    FSRSParameters,
+    initial_stability,
+    predict_interval,
+    retrievability,
+    stability_fail,
+    stability_success,
+    update_difficulty,
+)
+
+# =========================
+# PARAMETER REPORTS
+# =========================
+'''Headless per-user parameter reports: the analysis_fsrs curves for many
+    parameter sets at once, rendered to PNG/SVG without a display.
+
+    Curves are computed for a whole [P, n_weights] batch in one pass of
+    broadcast tensor ops (no per-point .item() calls). Rendering builds
+    matplotlib Figures directly (Agg canvas, no pyplot state), so worker
+    processes can draw in parallel and nothing blocks on plt.show().
+
+    Per parameter set (keys of report_curves):
+        initial_stability  [P, 4]          S after a first again/hard/good/easy
+        first_review       [P, 4, n_days]  R from each of those stabilities
+        stability          [P, n_reviews]  S along SCHEDULE
+        failure            [P, 2]          S before / after a lapse (S=5, D=5, 3 days)
+    Shared reference curves:
+        intervals          [4, n_S]        predict_interval per SRS_TARGETS target
+        reference          [4, n_days]     R for REFERENCE_STABILITIES
+
+    render_reports writes <out_dir>/<user_id>.<fmt> plus index.json with a
+    few headline numbers per user for dashboards.
+'''
+
+# (elapsed days, grade) per review, as in analysis_fsrs.plot_stability_growth
+SCHEDULE = ((0, 3), (1, 3), (3, 4), (10, 3), (30, 3))
+REFERENCE_STABILITIES = (2.0, 5.0, 15.0, 40.0)
+FORMATS = ("png", "svg")
+
+
+# =========================
+# CURVES
+# =========================
+
+def _batched(params):
+    if params.is_batched:
+        return params
+    return FSRSParameters(params.weights.detach().unsqueeze(0))
+
+
+def forgetting_curves(stability, days):
+    """
+    R for every stability x day: [..., n_days]
+    """
+    stability = torch.as_tensor(stability, dtype=torch.float32)
+    return retrievability(torch.as_tensor(days, dtype=torch.float32), stability.unsqueeze(-1))
+
+
+def interval_curves(stabilities, targets=SRS_TARGETS):
+    """
+    predict_interval for every target x stability: [len(targets), n_S]
+    """
+    target = torch.tensor([targets[g] for g in GRADES]).unsqueeze(1)
+    return predict_interval(torch.as_tensor(stabilities, dtype=torch.float32), target)
+
+
+@torch.no_grad()
+def first_review_curves(params, days):
+    """
+    [P, 4, n_days] forgetting curves starting from each first-rating stability
+    """
+    S0 = initial_stability(torch.arange(1.0, 5.0), _batched(params))
+    return forgetting_curves(S0, days)
+
+
+@torch.no_grad()
+def stability_trajectory(params, schedule=SCHEDULE):
+    """
+    [P, len(schedule)] stability after each review of schedule
+    """
+    params = _batched(params)
+    S = initial_stability(torch.tensor(float(schedule[0][1])), params)
+    D = torch.full_like(S, 5.0)
+
+    history = [S]
+    for elapsed, grade in schedule[1:]:
+        R = retrievability(torch.tensor(float(elapsed)), S)
+        update = stability_fail if grade == 1 else stability_success
+        S = update(S, D, R, params)
+        D = update_difficulty(D, float(grade), params)
+        history.append(S)
+    return torch.cat(history, dim=1)
+
+
+@torch.no_grad()
+def failure_effect(params, S=5.0, D=5.0, elapsed=3.0):
+    """
+    [P, 2] stability before and after a lapse
+    """
+    params = _batched(params)
+    S = torch.full((params.weights.shape[0], 1), S)
+    R = retrievability(torch.tensor(elapsed), S)
+    return torch.cat([S, stability_fail(S, torch.tensor(D), R, params)], dim=1)
+
+
+@torch.no_grad()
+def report_curves(params, days=60.0, n_days=200, n_stabilities=20):
+    """
+    Every report curve for a (batched) parameter set, as numpy arrays
+    """
+    params = _batched(params)
+    day_axis = torch.linspace(0, days, n_days)
+    stabilities = torch.linspace(1, 100, n_stabilities)
+
+    return {
+        "weights": params.weights.detach().numpy(),
+        "days": day_axis.numpy(),
+        "initial_stability": initial_stability(torch.arange(1.0, 5.0), params).numpy(),
+        "first_review": first_review_curves(params, day_axis).numpy(),
+        "stability": stability_trajectory(params).numpy(),
+        "failure": failure_effect(params).numpy(),
+        "stabilities": stabilities.numpy(),
+        "intervals": interval_curves(stabilities).numpy(),
+        "reference": forgetting_curves(torch.tensor(REFERENCE_STABILITIES), day_axis).numpy(),
+    }
+
+
+def headline(curves, i):
+    """
+    Dashboard numbers for parameter set i
+    """
+    before, after = curves["failure"][i]
+    return {
+        "initial_stability": dict(zip(GRADES, curves["initial_stability"][i].tolist())),
+        "final_stability": float(curves["stability"][i, -1]),
+        "fail_ratio": float(after / before),
+    }
+
+
+# =========================
+# RENDERING
+# =========================
+
+def render_report(curves, i, path, title=None):
+    """
+    One 2x3 figure for parameter set i of report_curves; the format
+    follows path's extension
+    """
+    from matplotlib.figure import Figure  # only needed when rendering
+
+    fig = Figure(figsize=(15, 8), layout="constrained")
+    axes = fig.subplots(2, 3)
+    days = curves["days"]
+
+    ax = axes[0, 0]
+    for g, name in enumerate(GRADES):
+        ax.plot(days, curves["first_review"][i, g], label=name)
+    ax.set(xlabel="Elapsed days", ylabel="Retrievability (R)", title="Forgetting After First Rating")
+    ax.legend()
+
+    ax = axes[0, 1]
+    ax.plot(range(len(SCHEDULE)), curves["stability"][i], marker="o")
+    ax.set(xlabel="Review number", ylabel="Stability (S)", title="Stability Growth")
+
+    ax = axes[0, 2]
+    ax.bar(["Before failure", "After failure"], curves["failure"][i])
+    ax.set(ylabel="Stability (S)", title="Stability After Failure")
+
+    ax = axes[1, 0]
+    for g, name in enumerate(GRADES):
+        ax.plot(curves["stabilities"], curves["intervals"][g], label=f"{name} (R={SRS_TARGETS[name]})")
+    ax.set(xlabel="Stability (S)", ylabel="Next interval (days)", title="Interval vs Stability")
+    ax.legend()
+
+    ax = axes[1, 1]
+    for S, R in zip(REFERENCE_STABILITIES, curves["reference"]):
+        ax.plot(days, R, label=f"S={S}")
+    ax.set(xlabel="Elapsed days", ylabel="Retrievability (R)", title="Forgetting Curves for Different Stabilities")
+    ax.legend()
+
+    ax = axes[1, 2]
+    ax.axis("off")
+    rows = [f"{name:<13} {w:8.4f}" for name, w in zip(FSRSParameters.WEIGHT_NAMES, curves["weights"][i])]
+    ax.text(0.0, 1.0, "\n".join(rows), family="monospace", va="top")
+    ax.set_title("Weights")
+
+    if title is not None:
+        fig.suptitle(title)
+    fig.savefig(path)
+
+
+def _render_chunk(task):
+    user_ids, weights, out_dir, fmt = task
+    torch.set_num_threads(1)
+
+    curves = report_curves(FSRSParameters(weights))
+    rows = []
+    for i, user_id in enumerate(user_ids):
+        path = os.path.join(out_dir, f"{user_id}.{fmt}")
+        render_report(curves, i, path, title=str(user_id))
+        rows.append((user_id, {"file": os.path.basename(path), **headline(curves, i)}))
+    return rows
+
+
+def render_reports(weights_by_user, out_dir, fmt="png", workers=None, chunk_size=64):
+    """
+    Render one report per user on a process pool.
+
+    weights_by_user: {user_id: anything fsrs_numpy.load_weights accepts, None = defaults}
+    chunk_size:      users per task; each task computes its curves in one batch
+    returns the index ({user_id: headline + file}), also written to index.json
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"fmt must be one of {FORMATS}, got {fmt!r}")
+    os.makedirs(out_dir, exist_ok=True)
+
+    user_ids = list(weights_by_user)
+    weights = np.array([
+        fsrs_numpy.load_weights(w if w is not None else fsrs_numpy.FSRSWeights()).weights
+        for w in weights_by_user.values()
+    ], dtype=np.float32)
+
+    tasks = [
+        (user_ids[i:i + chunk_size], weights[i:i + chunk_size], out_dir, fmt)
+        for i in range(0, len(user_ids), chunk_size)
+    ]
+
+    index = {}
+    ctx = mp.get_context("spawn")
+    with ctx.Pool(workers or os.cpu_count() or 1) as pool:
+        for rows in pool.imap_unordered(_render_chunk, tasks):
+            index.update(rows)
+
+    index = {user_id: index[user_id] for user_id in user_ids}
+    with open(os.path.join(out_dir, "index.json"), "w") as f:
+        json.dump(index, f, indent=2)
+    return index
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render headless FSRS parameter reports per user")
+    parser.add_argument("params", nargs="*",
+                        help="srs_params JSON / .pt files, or a fit_users.py output directory "
+                             "(default weights if none)")
+    parser.add_argument("--out", default="fsrs_reports")
+    parser.add_argument("--format", choices=FORMATS, default="png")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunk-size", type=int, default=64)
+    args = parser.parse_args()
+
+    weights_by_user = fsrs_numpy.params_by_user(args.params) or {"default": None}
+
+    start = time.perf_counter()
+    index = render_reports(weights_by_user, args.out, args.format, args.workers, args.chunk_size)
+    print(f"Rendered {len(index)} reports to {args.out} in {time.perf_counter() - start:.1f}s")
@@ -0,0 +1,181 @@
+import argparse
+import itertools
+import json
+import multiprocessing as mp
+import os
+import time
+
+import fsrs_numpy
+from fsrs_workload import simulate_workload
+
+# =========================
+# OPTIMAL-RETENTION SEARCH
+# =========================
+'''Sweeps per-grade target retrievability (the SRS_TARGETS values) for one
+    or more users' parameters with fsrs_workload simulations spread over a
+    process pool, and picks a target set from the retention/workload trade-off.
+
+    Every candidate for a user shares the same simulation seed, so
+    candidates differ only by their targets, not by sampling noise.
+
+    For each user:
+        results      one summary per candidate target set
+        frontier     Pareto-optimal candidates: no other candidate has both
+                     fewer review hours and more cards memorized
+        recommended  the frontier point with the least review time per
+                     memorized card (optionally above a memorized floor)
+'''
+
+DEFAULT_GRID = {
+    "again": (0.5,),
+    "hard": (0.85, 0.9, 0.95),
+    "good": (0.8, 0.85, 0.9, 0.95),
+    "easy": (0.75, 0.8, 0.85, 0.9),
+}
+
+DEFAULT_SIMULATION = {
+    "n_cards": 5000,
+    "days": 730,
+    "new_per_day": 20,
+    "memory_every": 7,
+}
+
+
+# =========================
+# CANDIDATES
+# =========================
+
+def target_grid(grid=DEFAULT_GRID, monotone=True):
+    """
+    Every combination of per-grade targets. monotone keeps only
+    hard >= good >= easy, the ordering SRS_TARGETS uses (a harder
+    answer schedules sooner).
+    """
+    candidates = []
+    for values in itertools.product(*(grid[g] for g in fsrs_numpy.GRADES)):
+        targets = dict(zip(fsrs_numpy.GRADES, values))
+        if monotone and not targets["hard"] >= targets["good"] >= targets["easy"]:
+            continue
+        candidates.append(targets)
+    return candidates
+
+
+# =========================
+# PARALLEL SWEEP
+# =========================
+
+def _simulate_task(task):
+    user_id, weights, targets, sim_kwargs = task
+
+    start = time.perf_counter()
+    summary = simulate_workload(weights=weights, targets=targets, **sim_kwargs)["summary"]
+    summary["seconds"] = round(time.perf_counter() - start, 3)
+
+    return user_id, targets, summary
+
+
+def sweep_users(weights_by_user, grid=DEFAULT_GRID, workers=None, monotone=True, seed=0, **sim_kwargs):
+    """
+    Simulate every candidate target set for every user on one pool.
+
+    weights_by_user: {user_id: anything fsrs_numpy.load_weights accepts, None = defaults}
+    sim_kwargs:      simulate_workload arguments (defaults: DEFAULT_SIMULATION)
+    returns {user_id: [{"targets": ..., **summary}, ...]}
+    """
+    sim_kwargs = {**DEFAULT_SIMULATION, **sim_kwargs, "seed": seed}
+    candidates = target_grid(grid, monotone)
+
+    tasks = []
+    for user_id, weights in weights_by_user.items():
+        w = fsrs_numpy.load_weights(weights if weights is not None else fsrs_numpy.FSRSWeights())
+        tasks.extend((user_id, w.weights, targets, sim_kwargs) for targets in candidates)
+
+    results = {user_id: [] for user_id in weights_by_user}
+    ctx = mp.get_context("spawn")
+    with ctx.Pool(workers or os.cpu_count() or 1) as pool:
+        for user_id, targets, summary in pool.imap(_simulate_task, tasks):
+            results[user_id].append({"targets": targets, **summary})
+
+    return results
+
+
+# =========================
+# FRONTIER + RECOMMENDATION
+# =========================
+
+def pareto_frontier(results, cost="total_hours", value="mean_memorized"):
+    """
+    Candidates not dominated on (lower cost, higher value), cheapest first
+    """
+    frontier = []
+    best_value = float("-inf")
+    for r in sorted(results, key=lambda r: (r[cost], -r[value])):
+        if r[value] > best_value:
+            frontier.append(r)
+            best_value = r[value]
+    return frontier
+
+
+def recommend(frontier, min_memorized=None, cost="total_hours", value="mean_memorized"):
+    """
+    Frontier point with the lowest cost per unit of value; with
+    min_memorized, only points memorizing at least that many cards count
+    (falls back to the most-memorized point if none do)
+    """
+    eligible = [r for r in frontier if min_memorized is None or r[value] >= min_memorized]
+    if not eligible:
+        return max(frontier, key=lambda r: r[value])
+    return min(eligible, key=lambda r: r[cost] / max(r[value], 1e-9))
+
+
+def search_user_targets(weights_by_user, min_memorized=None, **sweep_kwargs):
+    """
+    sweep_users + frontier + recommendation per user
+    """
+    out = {}
+    for user_id, results in sweep_users(weights_by_user, **sweep_kwargs).items():
+        frontier = pareto_frontier(results)
+        out[user_id] = {
+            "recommended": recommend(frontier, min_memorized)["targets"],
+            "frontier": frontier,
+            "results": results,
+        }
+    return out
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Search per-grade target retrievability for users' FSRS params")
+    parser.add_argument("params", nargs="+",
+                        help="srs_params JSON / .pt files, or a fit_users.py output directory")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--cards", type=int, default=DEFAULT_SIMULATION["n_cards"])
+    parser.add_argument("--days", type=int, default=DEFAULT_SIMULATION["days"])
+    parser.add_argument("--new-per-day", type=int, default=DEFAULT_SIMULATION["new_per_day"])
+    parser.add_argument("--min-memorized", type=float, default=None)
+    parser.add_argument("--grid", default=None, help='JSON like {"again": [0.5], "hard": [0.9, 0.95], ...}')
+    parser.add_argument("--all-combinations", action="store_true", help="don't require hard >= good >= easy")
+    parser.add_argument("--out", default="retention_search.json")
+    args = parser.parse_args()
+
+    weights_by_user = fsrs_numpy.params_by_user(args.params)
+
+    start = time.perf_counter()
+    report = search_user_targets(
+        weights_by_user,
+        min_memorized=args.min_memorized,
+        grid=json.loads(args.grid) if args.grid else DEFAULT_GRID,
+        workers=args.workers,
+        monotone=not args.all_combinations,
+        n_cards=args.cards,
+        days=args.days,
+        new_per_day=args.new_per_day
+    )
+    elapsed = time.perf_counter() - start
+
+    for user_id, user_report in report.items():
+        print(f"{user_id}: {len(user_report['frontier'])}/{len(user_report['results'])} "
+              f"candidates on the frontier, recommended {user_report['recommended']}")
+    print(f"Searched {len(report)} users in {elapsed:.1f}s")
+
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
@@ -0,0 +1,543 @@
+import argparse
+import asyncio
+import json
+import time
+from collections import Counter, defaultdict, deque
+from http import HTTPStatus
+
+import numpy as np
+
+import fsrs_numpy
+from fsrs_param_store import CachedParamStore, ParamStore
+
+# =========================
+# BATCH SCHEDULING SERVICE
+# =========================
+'''Local HTTP service for the app's calculate / simulate steps, on the
+    NumPy FSRS functions. Stdlib asyncio + NumPy only.
+
+    POST /calculate  {"user_id": ..., "now": unix ms (optional),
+                      "cards": [{"stability", "difficulty", "grade",
+                                 "elapsed_days" | "last_reviewed" (unix ms)}, ...]}
+                     -> {"cards": [{"stability", "difficulty", "interval", "due"}, ...],
+                         "params_version": ...}
+    POST /simulate   same cards without grades
+                     -> {"cards": [{"again": {"days", "stability", "difficulty"},
+                                    "hard": ..., "good": ..., "easy": ...}, ...],
+                         "params_version": ...}
+    GET  /stats      per-route request counts and p50/p99 latency (ms),
+                     batching and param cache counters
+    GET  /health
+
+    Cards without a stability are new (first rating). grade is
+    "again"/"hard"/"good"/"easy" or 1-4; lastReviewed is accepted for
+    last_reviewed, as the app's cards spell it. params_version is the
+    store's version stamp for the user (-1 = default weights).
+
+    Requests that arrive while a pass is running are coalesced: the next
+    pass covers every pending request, across users, with per-card weight
+    rows, so load grows the batch instead of the queue.
+
+    Params come from any object with lookup(user_ids) -> (weights,
+    versions, found), e.g. fsrs_param_store.CachedParamStore; tests use an
+    in-memory ParamStore.from_arrays.
+'''
+
+DAY_MS = 86_400_000
+RELEARN_MS = 60_000
+MAX_BODY_BYTES = 8 * 1024 * 1024
+GRADE_NUMBERS = {name: i + 1 for i, name in enumerate(fsrs_numpy.GRADES)}
+
+
+class RequestError(ValueError):
+    """
+    Bad request payload (answered with 400)
+    """
+
+
+# =========================
+# REQUEST PARSING
+# =========================
+
+def _number(value, name):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise RequestError(f"{name} must be a number, got {value!r}") from None
+    if not np.isfinite(number):
+        raise RequestError(f"{name} must be finite, got {value!r}")
+    return number
+
+
+def _grade_number(value):
+    grade = GRADE_NUMBERS.get(value, value)
+    if grade not in (1, 2, 3, 4):
+        raise RequestError(f"invalid grade {value!r}")
+    return grade
+
+
+def parse_cards(cards, now_ms, graded):
+    """
+    Card dicts -> (stability, difficulty, elapsed_days, grade) [N] arrays
+    (grade is None when not graded)
+    """
+    if not isinstance(cards, list) or not cards:
+        raise RequestError("cards must be a non-empty list")
+
+    n = len(cards)
+    S = np.full(n, np.nan)
+    D = np.full(n, np.nan)
+    elapsed = np.zeros(n)
+    grade = np.zeros(n) if graded else None
+
+    try:
+        for i, card in enumerate(cards):
+            if card.get("stability") is not None:
+                S[i] = _number(card["stability"], "stability")
+                if S[i] <= 0:
+                    raise RequestError(f"stability must be positive, got {S[i]}")
+            if card.get("difficulty") is not None:
+                D[i] = _number(card["difficulty"], "difficulty")
+                if not 1 <= D[i] <= 10:
+                    raise RequestError(f"difficulty must be in [1, 10], got {D[i]}")
+
+            last_reviewed = card.get("last_reviewed", card.get("lastReviewed"))
+            if card.get("elapsed_days") is not None:
+                elapsed[i] = max(_number(card["elapsed_days"], "elapsed_days"), 0.0)
+            elif last_reviewed is not None:
+                elapsed[i] = max((now_ms - _number(last_reviewed, "last_reviewed")) / DAY_MS, 0.0)
+
+            if graded:
+                grade[i] = _grade_number(card.get("grade"))
+    except (AttributeError, TypeError, ValueError) as e:
+        raise RequestError(f"card {i}: {e}") from None
+
+    return S, D, elapsed, grade
+
+
+# =========================
+# BATCHED COMPUTATION
+# =========================
+
+class BatchScheduler:
+    """
+    Collects calculate/simulate requests and answers every pending one with
+    a single vectorized pass per kind
+    """
+
+    def __init__(self, params, model=fsrs_numpy.FSRS_MODEL, targets=fsrs_numpy.SRS_TARGETS):
+        self.params = params
+        self.model = model
+        self.targets = targets
+        self.pending = []
+        self.passes = 0
+        self.requests = 0
+        self.cards = 0
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def submit(self, kind, user_id, cards, now_ms):
+        """
+        Result dict for one request (kind: "calculate" or "simulate")
+        """
+        state = parse_cards(cards, now_ms, graded=kind == "calculate")
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((kind, str(user_id), state, now_ms, future))
+        self._wakeup.set()
+        return await future
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            batch, self.pending = self.pending, []
+
+            for kind in ("calculate", "simulate"):
+                requests = [r for r in batch if r[0] == kind]
+                if not requests:
+                    continue
+                try:
+                    results = self._compute(kind, requests)
+                except Exception as e:
+                    for *_, future in requests:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+                for (*_, future), result in zip(requests, results):
+                    if not future.done():
+                        future.set_result(result)
+
+            # let the answered handlers write before the next pass
+            await asyncio.sleep(0)
+
+    def _compute(self, kind, requests):
+        user_ids = [r[1] for r in requests]
+        counts = [len(r[2][0]) for r in requests]
+        S, D, elapsed, grade = (
+            np.concatenate([r[2][j] for r in requests]) if requests[0][2][j] is not None else None
+            for j in range(4)
+        )
+
+        users = list(dict.fromkeys(user_ids))
+        weights, versions, _ = self.params.lookup(users)
+        row = {user_id: i for i, user_id in enumerate(users)}
+        request_rows = np.array([row[u] for u in user_ids])
+        w = fsrs_numpy.FSRSWeights(weights[np.repeat(request_rows, counts)])
+
+        self.passes += 1
+        self.requests += len(requests)
+        self.cards += len(S)
+
+        if kind == "calculate":
+            out = fsrs_numpy.review_cards(S, D, elapsed, grade, w, self.targets, self.model)
+        else:
+            out = fsrs_numpy.preview_grades(S, D, elapsed, w, self.targets, self.model)
+
+        results = []
+        start = 0
+        for (_, _, _, now_ms, _), r, n in zip(requests, request_rows, counts):
+            part = slice(start, start + n)
+            start += n
+            if kind == "calculate":
+                cards = self._calculate_cards(out, part, now_ms)
+            else:
+                cards = self._simulate_cards(out, part)
+            results.append({"cards": cards, "params_version": int(versions[r])})
+        return results
+
+    @staticmethod
+    def _calculate_cards(out, part, now_ms):
+        S, D, interval = (out[k][part].tolist() for k in ("stability", "difficulty", "interval"))
+        return [
+            {
+                "stability": s,
+                "difficulty": d,
+                "interval": int(days),
+                "due": int(now_ms) + (int(days) * DAY_MS if days >= 1 else RELEARN_MS),
+            }
+            for s, d, days in zip(S, D, interval)
+        ]
+
+    @staticmethod
+    def _simulate_cards(out, part):
+        S, D, interval = (out[k][:, part].T.tolist() for k in ("stability", "difficulty", "interval"))
+        return [
+            {
+                name: {"days": days[g], "stability": s[g], "difficulty": d[g]}
+                for g, name in enumerate(fsrs_numpy.GRADES)
+            }
+            for s, d, days in zip(S, D, interval)
+        ]
+
+
+# =========================
+# LATENCY
+# =========================
+
+def latency_summary(seconds):
+    """
+    {requests, p50_ms, p99_ms, max_ms} for a list of latencies in seconds
+    """
+    if not len(seconds):
+        return {"requests": 0, "p50_ms": None, "p99_ms": None, "max_ms": None}
+    ms = np.asarray(seconds) * 1000
+    p50, p99 = np.percentile(ms, [50, 99])
+    return {"requests": len(ms), "p50_ms": round(float(p50), 3), "p99_ms": round(float(p99), 3),
+            "max_ms": round(float(ms.max()), 3)}
+
+
+class LatencyStats:
+    """
+    Server-side time per route (request parsed -> response written),
+    percentiles over the last `window` requests
+    """
+
+    def __init__(self, window=10_000):
+        self.samples = defaultdict(lambda: deque(maxlen=window))
+        self.counts = Counter()
+
+    def add(self, route, seconds):
+        self.samples[route].append(seconds)
+        self.counts[route] += 1
+
+    def summary(self):
+        return {
+            route: {**latency_summary(samples), "requests": self.counts[route]}
+            for route, samples in self.samples.items()
+        }
+
+
+# =========================
+# HTTP SERVER
+# =========================
+
+class SchedulingService:
+    def __init__(self, params, model=fsrs_numpy.FSRS_MODEL, targets=fsrs_numpy.SRS_TARGETS):
+        self.params = params
+        self.model = model
+        self.targets = targets
+        self.latency = LatencyStats()
+        self.scheduler = None
+        self.server = None
+
+    async def start(self, host="127.0.0.1", port=8765):
+        """
+        Start listening (port 0 = any free port, see .port)
+        """
+        self.scheduler = BatchScheduler(self.params, self.model, self.targets)
+        self.scheduler.start()
+        self.server = await asyncio.start_server(self._handle_connection, host, port)
+        return self
+
+    @property
+    def port(self):
+        return self.server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        self.server.close()
+        await self.server.wait_closed()
+        await self.scheduler.stop()
+
+    def stats(self):
+        stats = {
+            "latency": self.latency.summary(),
+            "batching": {
+                "passes": self.scheduler.passes,
+                "requests": self.scheduler.requests,
+                "cards": self.scheduler.cards,
+            },
+        }
+        if hasattr(self.params, "cache_info"):
+            stats["param_cache"] = self.params.cache_info()
+        return stats
+
+    async def _dispatch(self, method, path, body):
+        if path == "/health":
+            return HTTPStatus.OK, {"ok": True}
+        if path == "/stats":
+            return HTTPStatus.OK, self.stats()
+        if path not in ("/calculate", "/simulate"):
+            return HTTPStatus.NOT_FOUND, {"error": f"unknown route {path}"}
+        if method != "POST":
+            return HTTPStatus.METHOD_NOT_ALLOWED, {"error": f"{path} needs POST"}
+
+        try:
+            payload = json.loads(body)
+            if not isinstance(payload, dict) or payload.get("user_id") is None:
+                raise RequestError("user_id is required")
+            now_ms = _number(payload.get("now", time.time() * 1000), "now")
+            result = await self.scheduler.submit(path[1:], payload["user_id"], payload.get("cards"), now_ms)
+        except (json.JSONDecodeError, UnicodeDecodeError, RequestError) as e:
+            return HTTPStatus.BAD_REQUEST, {"error": str(e)}
+        except Exception as e:
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {"error": str(e)}
+        return HTTPStatus.OK, result
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                start = time.perf_counter()
+                method, target, version = request_line.decode("latin-1").split()
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get("content-length", 0))
+                if length > MAX_BODY_BYTES:
+                    await self._respond(writer, HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                                        {"error": f"body over {MAX_BODY_BYTES} bytes"}, keep_alive=False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+
+                path = target.split("?", 1)[0]
+                status, payload = await self._dispatch(method, path, body)
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                await self._respond(writer, status, payload, keep_alive)
+                self.latency.add(path if status != HTTPStatus.NOT_FOUND else "other", time.perf_counter() - start)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _respond(writer, status, payload, keep_alive=True):
+        body = json.dumps(payload).encode()
+        writer.write(
+            f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + body
+        )
+        await writer.drain()
+
+
+# =========================
+# CLIENT + LOAD TEST
+# =========================
+
+class Client:
+    """
+    Minimal keep-alive JSON client for one connection
+    """
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def request(self, method, path, payload=None):
+        """
+        (status code, decoded JSON body)
+        """
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+        body = b"" if payload is None else json.dumps(payload).encode()
+        self.writer.write(
+            f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\n"
+            f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n".encode("latin-1") + body
+        )
+        await self.writer.drain()
+
+        status = int((await self.reader.readline()).split()[1])
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        data = await self.reader.readexactly(int(headers.get("content-length", 0)))
+        if headers.get("connection", "").lower() == "close":
+            await self.close()
+        return status, json.loads(data)
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.reader = self.writer = None
+
+
+def random_cards(n, rng, graded=True):
+    """
+    Card payloads with a mix of new and reviewed cards (for load tests)
+    """
+    cards = []
+    for _ in range(n):
+        card = {"elapsed_days": float(rng.integers(0, 60))}
+        if rng.random() > 0.2:
+            card["stability"] = float(rng.uniform(0.5, 100))
+            card["difficulty"] = float(rng.uniform(1, 10))
+        if graded:
+            card["grade"] = fsrs_numpy.GRADES[rng.integers(0, 4)]
+        cards.append(card)
+    return cards
+
+
+async def run_load(host, port, user_ids, n_requests=2000, concurrency=32, cards_per_request=20,
+                   route="/simulate", seed=0):
+    """
+    Fire n_requests over `concurrency` keep-alive connections; client-side
+    latency summary plus requests per second
+    """
+    rng = np.random.default_rng(seed)
+    payloads = [
+        {
+            "user_id": user_ids[i % len(user_ids)],
+            "cards": random_cards(cards_per_request, rng, graded=route == "/calculate"),
+        }
+        for i in range(n_requests)
+    ]
+    queue = deque(payloads)
+    latencies = []
+    errors = Counter()
+
+    async def worker():
+        client = Client(host, port)
+        try:
+            while queue:
+                payload = queue.popleft()
+                start = time.perf_counter()
+                status, _ = await client.request("POST", route, payload)
+                latencies.append(time.perf_counter() - start)
+                if status != 200:
+                    errors[status] += 1
+        finally:
+            await client.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    return {**latency_summary(latencies), "requests_per_sec": round(len(latencies) / elapsed, 1),
+            "errors": dict(errors)}
+
+
+async def _serve(args, params, model):
+    service = await SchedulingService(params, model).start(args.host, args.port)
+    print(f"Serving on http://{args.host}:{service.port}")
+
+    if args.bench:
+        users = [f"bench-{i}" for i in range(100)]
+        for route in ("/calculate", "/simulate"):
+            result = await run_load(args.host, service.port, users, args.bench, args.concurrency,
+                                    args.cards_per_request, route)
+            print(f"{route}: {result}")
+        print(json.dumps(service.stats(), indent=2))
+        await service.close()
+        return
+
+    try:
+        await service.server.serve_forever()
+    finally:
+        print(json.dumps(service.stats(), indent=2))
+        await service.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Batch FSRS scheduling service (calculate / simulate)")
+    parser.add_argument("--store", default=None,
+                        help="fsrs_param_store file (default weights for every user if unset)")
+    parser.add_argument("--cache-size", type=int, default=100_000)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--ts-formulas", action="store_true", help="schedule with lib/srs.server.ts formulas")
+    parser.add_argument("--bench", type=int, default=0, metavar="N",
+                        help="fire N requests per route at the server, print p50/p99 and exit")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--cards-per-request", type=int, default=20)
+    args = parser.parse_args()
+
+    model = fsrs_numpy.FSRS_MODEL
+    if args.ts_formulas:
+        from fsrs_eval import TS_MODEL as model
+
+    if args.store:
+        params = CachedParamStore(args.store, maxsize=args.cache_size)
+    else:
+        params = ParamStore.from_arrays([], np.zeros((0, len(fsrs_numpy.WEIGHT_NAMES))))
+
+    try:
+        asyncio.run(_serve(args, params, model))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,372 @@
+import argparse
+import csv
+import json
+import os
+from datetime import datetime, timezone
+
+import numpy as np
+
+import fsrs_numpy
+from sequence_cache import write_array_cache
+
+# =========================
+# SYNTHETIC REVIEW LOGS
+# =========================
+'''Simulated learners reviewing cards under a known parameter set, so
+    training can be load-tested at production scale and checked for
+    recovering the weights that generated the data.
+
+    Each card:
+        first review    grade ~ FIRST_GRADE_PROBS, S = init_s_<grade>, D = 5
+        next review     predict_interval(S, target) days later, times a
+                        log-normal scheduling fuzz, rounded to whole days
+        each review     grading="bernoulli": recalled ~ Bernoulli(retrievability);
+                        a lapse is grade 1, a recall is 2/3/4 ~ RECALL_GRADE_PROBS
+                        grading="calibrated": grade drawn so its expected soft
+                        target (fsrs_trained_batch.recall_targets) equals R
+        stop            after `days` days or max_reviews reviews
+
+    The maths is fsrs_numpy's (the NumPy mirror of fsrs_trained_batch), so
+    all cards step forward together and generation stays torch-free.
+
+    train_fsrs scores grades against soft targets (0 / 0.7 / 0.9 / 0.97), not
+    recall, so Bernoulli logs fit to systematically low stability. Use
+    calibrated grading when checking that fitting recovers the true weights.
+'''
+
+FIRST_GRADE_PROBS = (0.2, 0.15, 0.5, 0.15)
+RECALL_GRADE_PROBS = (0.15, 0.7, 0.15)
+
+# recall_targets() in fsrs_trained_batch, grades 1-4
+SOFT_TARGETS = np.array([0.0, 0.7, 0.9, 0.97])
+GRADINGS = ("bernoulli", "calibrated")
+
+EPOCH = datetime(2024, 1, 1, 12, tzinfo=timezone.utc).timestamp()
+SECONDS_PER_DAY = 86400
+
+
+# =========================
+# TRUE WEIGHTS
+# =========================
+
+def true_weights(params=None):
+    """
+    fsrs_numpy.FSRSWeights for an FSRSParameters module or anything
+    fsrs_numpy.load_weights accepts (defaults when None)
+    """
+    if params is None:
+        return fsrs_numpy.FSRSWeights()
+    if hasattr(params, "to_params_json"):
+        params = params.to_params_json()
+    return fsrs_numpy.load_weights(params)
+
+
+def learner_weights(weights, n_learners, spread, rng):
+    """
+    [n_learners, n_weights]: the true set with per-learner log-normal noise
+    """
+    base = np.broadcast_to(weights.weights, (n_learners, len(fsrs_numpy.WEIGHT_NAMES)))
+    if not spread:
+        return base.copy()
+    return base * np.exp(rng.normal(0.0, spread, base.shape))
+
+
+# =========================
+# GRADING
+# =========================
+
+def bernoulli_grades(R, rng):
+    recalled = rng.random(len(R)) < R
+    return np.where(
+        recalled,
+        rng.choice(np.arange(2, 5), size=len(R), p=RECALL_GRADE_PROBS),
+        1
+    )
+
+
+def calibrated_grades(R, rng):
+    """
+    Mix the two grades whose soft targets bracket R, so E[target] = R
+    (R above the easy target always grades easy)
+    """
+    hi = np.clip(np.searchsorted(SOFT_TARGETS, R), 1, len(SOFT_TARGETS) - 1)
+    lo_target, hi_target = SOFT_TARGETS[hi - 1], SOFT_TARGETS[hi]
+    p_hi = np.clip((R - lo_target) / (hi_target - lo_target), 0.0, 1.0)
+    return np.where(rng.random(len(R)) < p_hi, hi + 1, hi)
+
+
+# =========================
+# SIMULATION
+# =========================
+
+def simulate_learners(
+    n_learners,
+    cards_per_learner=50,
+    params=None,
+    days=365,
+    max_reviews=32,
+    target_retrievability=0.9,
+    interval_fuzz=0.2,
+    learner_spread=0.0,
+    grading="bernoulli",
+    min_length=2,
+    seed=0
+):
+    """
+    Simulate n_learners x cards_per_learner cards. New cards are introduced
+    uniformly over the first half of the `days` window.
+
+    returns dict:
+        elapsed, grade       flat per-review arrays (SequenceCache layout)
+        day                  day of each review since the start of the window
+        lengths              reviews per kept card
+        learner              learner index of each kept card
+        card                 card index (within its learner) of each kept card
+        weights              [n_learners, n_weights] true weights per learner
+    Cards with fewer than min_length reviews are dropped.
+    """
+    if grading not in GRADINGS:
+        raise ValueError(f"unknown grading {grading!r}")
+    draw_grades = bernoulli_grades if grading == "bernoulli" else calibrated_grades
+
+    rng = np.random.default_rng(seed)
+    w_true = true_weights(params)
+    per_learner = learner_weights(w_true, n_learners, learner_spread, rng)
+
+    n_cards = n_learners * cards_per_learner
+    learner = np.repeat(np.arange(n_learners), cards_per_learner)
+    w = fsrs_numpy.FSRSWeights(per_learner[learner]) if learner_spread else w_true
+
+    elapsed = np.zeros((n_cards, max_reviews), dtype=np.float32)
+    grade = np.zeros((n_cards, max_reviews), dtype=np.uint8)
+    day = np.zeros((n_cards, max_reviews), dtype=np.int32)
+    lengths = np.ones(n_cards, dtype=np.int64)
+
+    # First review
+    first = rng.choice(np.arange(1, 5), size=n_cards, p=FIRST_GRADE_PROBS)
+    grade[:, 0] = first
+    day[:, 0] = rng.integers(0, max(days // 2, 1), n_cards)
+    S = fsrs_numpy.initial_stability(first, w)
+    D = np.full(n_cards, 5.0)
+
+    # Cards still being reviewed; shrinks as they run past the window
+    active = np.arange(n_cards)
+    for t in range(1, max_reviews):
+        interval = fsrs_numpy.predict_interval(S, target_retrievability)
+        if interval_fuzz:
+            interval = interval * rng.lognormal(0.0, interval_fuzz, len(active))
+        interval = np.maximum(np.rint(interval), 1)
+
+        next_day = day[active, t - 1] + interval
+        keep = next_day < days
+        active, interval, next_day = active[keep], interval[keep], next_day[keep]
+        S, D = S[keep], D[keep]
+        if not len(active):
+            break
+
+        R = fsrs_numpy.retrievability(interval, S)
+        g = draw_grades(R, rng)
+
+        S, D = fsrs_numpy.next_state(S, D, interval, g, w.take(active))
+
+        elapsed[active, t] = interval
+        grade[active, t] = g
+        day[active, t] = next_day
+        lengths[active] = t + 1
+
+    kept = np.flatnonzero(lengths >= min_length)
+    mask = np.arange(max_reviews) < lengths[kept, None]
+
+    return {
+        "elapsed": elapsed[kept][mask],
+        "grade": grade[kept][mask],
+        "day": day[kept][mask],
+        "lengths": lengths[kept],
+        "learner": learner[kept],
+        "card": kept % cards_per_learner,
+        "weights": per_learner,
+    }
+
+
+def iter_learner_chunks(n_learners, chunk_learners=10_000, seed=0, **sim_kwargs):
+    """
+    simulate_learners in blocks of chunk_learners, so memory stays bounded
+    for millions of learners. Yields (first_learner_index, simulation).
+    """
+    seeds = np.random.SeedSequence(seed).spawn((n_learners + chunk_learners - 1) // chunk_learners)
+    for i, chunk_seed in enumerate(seeds):
+        first = i * chunk_learners
+        n = min(chunk_learners, n_learners - first)
+        yield first, simulate_learners(n, seed=chunk_seed, **sim_kwargs)
+
+
+# =========================
+# WRITING
+# =========================
+
+def _user_id(i):
+    return f"synthetic-{i:08d}"
+
+
+def _cache_chunks(chunks):
+    for first, sim in chunks:
+        n_learners = len(sim["weights"])
+        per_user = np.bincount(sim["learner"], minlength=n_learners)
+        has_cards = np.flatnonzero(per_user)
+        yield (
+            [_user_id(first + u) for u in has_cards],
+            sim["elapsed"],
+            sim["grade"],
+            sim["lengths"],
+            per_user[has_cards],
+        )
+
+
+def _export_rows(chunks):
+    """
+    card_reviews rows; reviews fall at the same time of day, so
+    review_sequences recovers the whole-day elapsed values exactly
+    """
+    for first, sim in chunks:
+        card_of_review = np.repeat(np.arange(len(sim["lengths"])), sim["lengths"])
+        users = sim["learner"][card_of_review] + first
+        cards = sim["card"][card_of_review]
+        timestamps = EPOCH + sim["day"].astype(np.int64) * SECONDS_PER_DAY
+
+        for user, card, ts, rating in zip(users.tolist(), cards.tolist(), timestamps.tolist(), sim["grade"].tolist()):
+            yield {
+                "card_id": f"{_user_id(user)}-{card:06d}",
+                "user_id": _user_id(user),
+                "rating": rating,
+                "reviewed_at": datetime.fromtimestamp(ts, tz=timezone.utc).isoformat(),
+            }
+
+
+def write_synthetic_log(out, n_learners, fmt="cache", chunk_learners=10_000, seed=0, **sim_kwargs):
+    """
+    Simulate and write in the trainer's input formats:
+
+        fmt="cache"   SequenceCache directory (train_fsrs / fit_users)
+        fmt="csv"     card_reviews CSV export (review_sequences / fsrs_finetune)
+        fmt="jsonl"   card_reviews JSONL export
+
+    The true weights go next to it as <out>.truth.json (srs_params shape,
+    plus the per-learner sets when learner_spread > 0).
+    Returns the written path.
+    """
+    # Per-learner weights are needed for the truth file, so keep them per chunk
+    learner_sets = []
+
+    def chunks():
+        for first, sim in iter_learner_chunks(n_learners, chunk_learners, seed, **sim_kwargs):
+            learner_sets.append(sim["weights"])
+            yield first, sim
+
+    if fmt == "cache":
+        write_array_cache(out, _cache_chunks(chunks()))
+    elif fmt in ("csv", "jsonl"):
+        with open(out, "w", encoding="utf-8", newline="") as f:
+            if fmt == "csv":
+                writer = csv.DictWriter(f, fieldnames=["card_id", "user_id", "rating", "reviewed_at"])
+                writer.writeheader()
+                writer.writerows(_export_rows(chunks()))
+            else:
+                for row in _export_rows(chunks()):
+                    f.write(json.dumps(row) + "\n")
+    else:
+        raise ValueError(f"unknown format {fmt!r}")
+
+    w = true_weights(sim_kwargs.get("params"))
+    truth = {
+        "params": dict(zip(fsrs_numpy.WEIGHT_NAMES, w.weights.tolist())),
+        "n_learners": n_learners,
+        "seed": seed,
+        "simulation": {k: v for k, v in sim_kwargs.items() if k != "params"},
+    }
+    if sim_kwargs.get("learner_spread"):
+        truth["learner_params"] = np.concatenate(learner_sets).tolist()
+
+    with open(f"{os.path.normpath(out)}.truth.json", "w") as f:
+        json.dump(truth, f, indent=2)
+
+    return out
+
+
+# =========================
+# RECOVERY CHECK
+# =========================
+
+def weight_recovery(true_params, fitted_params, start_params=None):
+    """
+    Per-weight {true, fitted, abs_error} and, given the starting weights,
+    whether fitting moved each weight towards the truth
+    """
+    true_w = true_weights(true_params).weights
+    fitted_w = true_weights(fitted_params).weights
+    start_w = None if start_params is None else true_weights(start_params).weights
+
+    report = {}
+    for i, name in enumerate(fsrs_numpy.WEIGHT_NAMES):
+        entry = {
+            "true": float(true_w[i]),
+            "fitted": float(fitted_w[i]),
+            "abs_error": float(abs(fitted_w[i] - true_w[i])),
+        }
+        if start_w is not None:
+            entry["start_error"] = float(abs(start_w[i] - true_w[i]))
+        report[name] = entry
+
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic card_reviews from known FSRS weights")
+    parser.add_argument("out", help="cache directory, or .csv / .jsonl export path")
+    parser.add_argument("--learners", type=int, default=1000)
+    parser.add_argument("--cards", type=int, default=50, help="cards per learner")
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--max-reviews", type=int, default=32)
+    parser.add_argument("--params", default=None, help="true weights: srs_params JSON or .pt (default weights if unset)")
+    parser.add_argument("--learner-spread", type=float, default=0.0)
+    parser.add_argument("--grading", choices=GRADINGS, default="bernoulli")
+    parser.add_argument("--format", choices=["cache", "csv", "jsonl"], default="cache")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--fit-epochs", type=int, default=0, help="train from default weights and report recovery")
+    args = parser.parse_args()
+
+    write_synthetic_log(
+        args.out,
+        args.learners,
+        fmt=args.format,
+        seed=args.seed,
+        cards_per_learner=args.cards,
+        days=args.days,
+        max_reviews=args.max_reviews,
+        params=args.params,
+        learner_spread=args.learner_spread,
+        grading=args.grading
+    )
+    print(f"Wrote synthetic reviews for {args.learners} learners to {args.out}")
+
+    if args.fit_epochs:
+        from fsrs_trained_batch import FSRSParameters, train_fsrs
+        from review_sequences import iter_sequences
+        from sequence_cache import SequenceCache
+
+        if args.format == "cache":
+            sequences = SequenceCache(args.out)
+        else:
+            sequences = list(iter_sequences(args.out))
+
+        start = FSRSParameters()
+        fitted = train_fsrs(
+            sequences,
+            epochs=args.fit_epochs,
+            batch_size=512,
+            save_path=None,
+            bucket_by_length=True,
+            params=FSRSParameters()
+        )
+        for name, entry in weight_recovery(args.params, fitted, start).items():
+            print(f"{name:>13}: true {entry['true']:.3f}  fitted {entry['fitted']:.3f}  "
+                  f"(error {entry['start_error']:.3f} -> {entry['abs_error']:.3f})")
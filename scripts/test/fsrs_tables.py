@@ -0,0 +1,340 @@
+import argparse
+import base64
+import json
+import math
+
+import numpy as np
+import torch
+
+from fsrs_trained_batch import (
+    EPS,
+    DECAY,
+    MAX_STABILITY,
+    FAIL_MIN_RATIO,
+    FAIL_MAX_RATIO,
+    SRS_TARGETS,
+    FSRSParameters,
+    stability_fail,
+    stability_fail_raw,
+    stability_success,
+    stability_success_raw,
+)
+
+# =========================
+# INTERVAL LOOKUP TABLES
+# =========================
+'''Precomputed next-stability tables for one trained parameter set, so the
+    TS scheduler can replace the exp/pow chains of stabilityFail /
+    stabilitySuccess with a trilinear lookup.
+
+    Each table holds the *unclamped* ratio S_next / S (stability_*_raw) on
+    a grid over
+        log S         S_MIN .. S_MAX, evenly spaced in log space
+        D_next        1 .. 10, the difficulty *after* updateDifficulty
+        R             0 .. 1, retrievability at review time; elapsed only
+                      enters the updates through R
+    and is looked up with grade 1 -> "fail", grades 2-4 -> "success".
+    The clamps are re-applied after interpolating (fail: ratio within
+    clamp.fail_ratio, success: S_next within clamp.success_stability), so
+    their kinks cost no accuracy.
+
+    Intervals need no table: interval = max(S_next * interval_factor[target], 1)
+    with interval_factor = ln(target) / DECAY, exactly as predict_interval.
+
+    The export bounds the relative error of S_next (and so the interval
+    error) analytically, from per-cell second-derivative bounds of the
+    ratios (see ERROR BOUNDS), refines the grid until it is within
+    max_rel_error, and stores the bound in the file. Outside [S_MIN, S_MAX]
+    the bound doesn't hold and the scheduler should fall back to the formulas.
+'''
+
+TABLE_VERSION = 1
+TABLE_KINDS = ("fail", "success")
+
+S_MIN = 0.01
+S_MAX = 200.0
+D_MIN, D_MAX = 1.0, 10.0
+
+
+# =========================
+# BUILDING
+# =========================
+
+def grid_axes(n_s=64, n_d=10, n_r=65, s_range=(S_MIN, S_MAX)):
+    return {
+        "log_s": np.linspace(math.log(s_range[0]), math.log(s_range[1]), n_s),
+        "d": np.linspace(D_MIN, D_MAX, n_d),
+        "r": np.linspace(0.0, 1.0, n_r),
+    }
+
+
+@torch.no_grad()
+def next_stability(kind, S, D_next, R, params, raw=False):
+    """
+    torch reference: S_next for state S, updated difficulty D_next, recall R
+    (raw: without the final clamp)
+    """
+    S = torch.as_tensor(S, dtype=torch.float32)
+    D_next = torch.as_tensor(D_next, dtype=torch.float32)
+    R = torch.clamp(torch.as_tensor(R, dtype=torch.float32), min=EPS, max=1.0)
+
+    if kind == "fail":
+        update = stability_fail_raw if raw else stability_fail
+    else:
+        update = stability_success_raw if raw else stability_success
+    return update(S, D_next, R, params)
+
+
+def build_tables(params, axes):
+    """
+    {kind: float32 [n_s, n_d, n_r]} of unclamped S_next / S over the grid
+    """
+    S = torch.exp(torch.as_tensor(axes["log_s"], dtype=torch.float32))[:, None, None]
+    D = torch.as_tensor(axes["d"], dtype=torch.float32)[None, :, None]
+    R = torch.as_tensor(axes["r"], dtype=torch.float32)[None, None, :]
+
+    shape = (len(axes["log_s"]), len(axes["d"]), len(axes["r"]))
+    # stability_fail ignores D, so broadcast back to the full grid
+    return {
+        kind: np.broadcast_to(
+            (next_stability(kind, S, D, R, params, raw=True) / S).numpy(), shape
+        ).astype(np.float32)
+        for kind in TABLE_KINDS
+    }
+
+
+# =========================
+# LOOKUP
+# =========================
+
+def _axis_position(x, axis):
+    """
+    (lower index, fraction) of x on an evenly spaced axis, clamped to its ends
+    """
+    step = (axis[-1] - axis[0]) / (len(axis) - 1)
+    f = np.clip((np.asarray(x, dtype=np.float64) - axis[0]) / step, 0, len(axis) - 1)
+    i = np.minimum(f.astype(np.int64), len(axis) - 2)
+    return i, f - i
+
+
+def lookup(kind, table, axes, S, D_next, R):
+    """
+    Trilinear S_next from one table, clamped like the torch functions;
+    the same arithmetic the TS side runs
+    """
+    S = np.asarray(S, dtype=np.float64)
+    i, fi = _axis_position(np.log(np.maximum(S, EPS)), axes["log_s"])
+    j, fj = _axis_position(D_next, axes["d"])
+    k, fk = _axis_position(R, axes["r"])
+
+    ratio = 0.0
+    for di, wi in ((0, 1 - fi), (1, fi)):
+        for dj, wj in ((0, 1 - fj), (1, fj)):
+            for dk, wk in ((0, 1 - fk), (1, fk)):
+                ratio = ratio + wi * wj * wk * table[i + di, j + dj, k + dk]
+
+    if kind == "fail":
+        return S * np.clip(ratio, FAIL_MIN_RATIO, FAIL_MAX_RATIO)
+    return np.clip(S * ratio, EPS, MAX_STABILITY)
+
+
+def interval_factors(targets=SRS_TARGETS):
+    return {
+        name: math.log(min(max(target, EPS), 0.99)) / DECAY
+        for name, target in targets.items()
+    }
+
+
+# =========================
+# ERROR BOUNDS
+# =========================
+'''Trilinear interpolation is I = I_s I_d I_r (one linear interpolation
+    per axis, each a convex combination), so on a cell with steps h_i
+        |f - I f| <= sum_i h_i^2 / 8 * max_cell |d^2 f / dx_i^2|
+    The per-cell maxima below come from closed-form second derivatives of
+    stability_fail_raw / stability_success_raw (divided by S) in the grid
+    coordinates (log S, D_next, R), bounding each factor by its extreme over
+    the cell. Two small terms are added: R is clamped to EPS before the
+    update, which bends the first R cell, and float32 table values and
+    reference arithmetic cost a few ulps (FLOAT_REL).
+'''
+
+FLOAT_REL = 2.0 ** -20
+
+
+def _cell_edges(axis):
+    axis = np.asarray(axis, dtype=np.float64)
+    return axis[:-1], axis[1:], (axis[-1] - axis[0]) / (len(axis) - 1)
+
+
+def _fail_cells(w, r_lo, r_hi):
+    """
+    (d2/dR2, d/dR bounds, min ratio, max ratio) per cell of the fail
+    table: ratio = e^w1 e^(w2 (R - 1)), monotone in R
+    """
+    g_lo = math.exp(w["w1"]) * np.exp(w["w2"] * (np.maximum(r_lo, EPS) - 1))
+    g_hi = math.exp(w["w1"]) * np.exp(w["w2"] * (np.maximum(r_hi, EPS) - 1))
+    g_min, g_max = np.minimum(g_lo, g_hi), np.maximum(g_lo, g_hi)
+    return w["w2"] ** 2 * g_max, abs(w["w2"]) * g_max, g_min, g_max
+
+
+def _success_cells(w, x_lo, x_hi, d_lo, d_hi, r_lo, r_hi):
+    """
+    (d2/dR2, d2/dlogS2, d/dR bounds, min ratio, max ratio) per cell of the
+    success table: ratio = 1 + e^w4 (11 - D) phi(log S) psi(R) with
+    phi = S^w5 / (1 + S / MAX_STABILITY), psi = e^((1 - R) w6) - 1
+    """
+    scale = math.exp(w["w4"]) * (11 - d_lo)
+    scale_min = math.exp(w["w4"]) * (11 - d_hi)
+
+    # phi = e^(w5 x) * sigma(u), u = e^x / MAX_STABILITY, sigma = 1 / (1 + u)
+    u_lo, u_hi = np.exp(x_lo) / MAX_STABILITY, np.exp(x_hi) / MAX_STABILITY
+    power = np.maximum(np.exp(w["w5"] * x_lo), np.exp(w["w5"] * x_hi))
+    power_min = np.minimum(np.exp(w["w5"] * x_lo), np.exp(w["w5"] * x_hi))
+    sigma = 1 / (1 + u_lo)
+    sigma_1 = u_hi / (1 + u_lo) ** 2
+    sigma_2 = u_hi * np.maximum(np.abs(1 - u_lo), np.abs(1 - u_hi)) / (1 + u_lo) ** 3
+    phi = power * sigma
+    phi_min = power_min / (1 + u_hi)
+    phi_2 = power * (w["w5"] ** 2 * sigma + 2 * abs(w["w5"]) * sigma_1 + sigma_2)
+
+    e_lo = np.exp((1 - np.maximum(r_hi, EPS)) * w["w6"])
+    e_hi = np.exp((1 - np.maximum(r_lo, EPS)) * w["w6"])
+    e_min, e_max = np.minimum(e_lo, e_hi), np.maximum(e_lo, e_hi)
+    psi = np.maximum(np.abs(e_min - 1), np.abs(e_max - 1))
+
+    d2_r = scale * phi * w["w6"] ** 2 * e_max
+    d2_x = scale * phi_2 * psi
+    d1_r = scale * phi * abs(w["w6"]) * e_max
+    g_min = 1 + np.where(e_min >= 1, scale_min * phi_min, scale * phi) * (e_min - 1)
+    g_max = 1 + scale * phi * np.maximum(e_max - 1, 0)
+    return d2_r, d2_x, d1_r, g_min, g_max
+
+
+def error_bounds(axes, params):
+    """
+    Guaranteed max relative error of S_next per table, and of the interval
+    in days per SRS_TARGETS target, for S in [S_MIN, S_MAX]
+    """
+    w = params.to_params_json()
+    x_lo, x_hi, h_x = _cell_edges(axes["log_s"])
+    d_lo, d_hi, _ = _cell_edges(axes["d"])
+    r_lo, r_hi, h_r = _cell_edges(axes["r"])
+    x_lo, x_hi = x_lo[:, None, None], x_hi[:, None, None]
+    d_lo, d_hi = d_lo[None, :, None], d_hi[None, :, None]
+    r_lo, r_hi = r_lo[None, None, :], r_hi[None, None, :]
+    s_lo, s_hi = np.exp(x_lo), np.exp(x_hi)
+
+    d2_r, d1_r, g_min, g_max = _fail_cells(w, r_lo, r_hi)
+    interp = h_r ** 2 / 8 * d2_r + 2 * EPS * d1_r
+    fail_rel = interp / np.clip(g_min, FAIL_MIN_RATIO, FAIL_MAX_RATIO)
+    fail_s_next = FAIL_MAX_RATIO * s_hi
+
+    d2_r, d2_x, d1_r, g_min, g_max = _success_cells(w, x_lo, x_hi, d_lo, d_hi, r_lo, r_hi)
+    interp = h_x ** 2 / 8 * d2_x + h_r ** 2 / 8 * d2_r + 2 * EPS * d1_r
+    # S_next / S is clamped only at EPS / S and MAX_STABILITY / S, so the
+    # relative error is at most interp * max(1 / ratio, S / MAX_STABILITY),
+    # and zero where both the exact and interpolated S_next hit MAX_STABILITY
+    success_rel = np.where(
+        g_min > 0, interp * np.maximum(1 / np.maximum(g_min, EPS), s_hi / MAX_STABILITY), np.inf
+    )
+    success_rel = np.where(s_lo * (g_min - interp) >= MAX_STABILITY, 0.0, success_rel)
+    success_s_next = np.minimum(s_hi * g_max, MAX_STABILITY)
+
+    bounds = {}
+    for kind, rel, s_next in (("fail", fail_rel, fail_s_next), ("success", success_rel, success_s_next)):
+        rel = rel + FLOAT_REL
+        # max(x, 1) is 1-Lipschitz, so interval error <= factor * |S_next error|
+        s_next_abs = float(np.max(rel * s_next))
+        bounds[kind] = {
+            "stability_rel": float(np.max(rel)),
+            "interval_abs_days": {name: factor * s_next_abs for name, factor in interval_factors().items()},
+        }
+    return bounds
+
+
+# =========================
+# EXPORT
+# =========================
+
+def _encode(table):
+    return base64.b64encode(np.ascontiguousarray(table, dtype="<f4").tobytes()).decode("ascii")
+
+
+def decode_table(payload, shape):
+    return np.frombuffer(base64.b64decode(payload), dtype="<f4").reshape(shape)
+
+
+def export_tables(params, path=None, max_rel_error=0.005, n_s=64, n_d=10, n_r=65, max_rounds=4):
+    """
+    Build tables, doubling the S and R resolution until every table's
+    stability_rel bound is within max_rel_error (at most max_rounds times).
+    Writes JSON to path if given; returns the document either way.
+    """
+    for _ in range(max_rounds):
+        axes = grid_axes(n_s, n_d, n_r)
+        bounds = error_bounds(axes, params)
+        if max(b["stability_rel"] for b in bounds.values()) <= max_rel_error:
+            break
+        n_s, n_r = 2 * n_s - 1, 2 * n_r - 1
+    else:
+        raise ValueError(
+            f"tables still exceed max_rel_error={max_rel_error} after {max_rounds} rounds: {bounds}"
+        )
+    tables = build_tables(params, axes)
+
+    doc = {
+        "version": TABLE_VERSION,
+        "params": params.to_params_json(),
+        "axes": {
+            "log_s": [float(axes["log_s"][0]), float(axes["log_s"][-1]), n_s],
+            "d": [D_MIN, D_MAX, n_d],
+            "r": [0.0, 1.0, n_r],
+        },
+        "targets": dict(SRS_TARGETS),
+        "interval_factor": interval_factors(),
+        "clamp": {
+            "fail_ratio": [FAIL_MIN_RATIO, FAIL_MAX_RATIO],
+            "success_stability": [EPS, MAX_STABILITY],
+        },
+        "dtype": "float32-le",
+        "tables": {kind: _encode(tables[kind]) for kind in TABLE_KINDS},
+        "error_bounds": bounds,
+    }
+
+    if path:
+        with open(path, "w") as f:
+            json.dump(doc, f)
+    return doc
+
+
+def load_tables(doc):
+    """
+    (axes, {kind: table}) from an exported document (or its path)
+    """
+    if isinstance(doc, str):
+        with open(doc) as f:
+            doc = json.load(f)
+
+    axes = {name: np.linspace(lo, hi, n) for name, (lo, hi, n) in doc["axes"].items()}
+    shape = tuple(len(axes[name]) for name in ("log_s", "d", "r"))
+    return axes, {kind: decode_table(doc["tables"][kind], shape) for kind in TABLE_KINDS}
+
+
+if __name__ == "__main__":
+    from fsrs_finetune import load_params
+
+    parser = argparse.ArgumentParser(description="Export FSRS interval lookup tables for the TS scheduler")
+    parser.add_argument("weights", nargs="?", default=None, help="fsrs_weights.pt or srs_params JSON (default weights if unset)")
+    parser.add_argument("--out", default="fsrs_tables.json")
+    parser.add_argument("--max-rel-error", type=float, default=0.005)
+    args = parser.parse_args()
+
+    params = load_params(args.weights) if args.weights else FSRSParameters()
+    doc = export_tables(params, args.out, args.max_rel_error)
+
+    n_s, n_d, n_r = (doc["axes"][name][2] for name in ("log_s", "d", "r"))
+    print(f"Wrote {args.out}: {n_s}x{n_d}x{n_r} grid")
+    for kind, bound in doc["error_bounds"].items():
+        days = ", ".join(f"{k} {v:.2f}d" for k, v in bound["interval_abs_days"].items())
+        print(f"  {kind:<8} S rel error <= {bound['stability_rel']:.4%} | interval error {days}")
@@ -1,5 +1,6 @@
 import torch
-import torch.nn as nn
+
+from fsrs_params import PackedFSRSParameters
 
 
 # FSRS PARAMETERS
@@ -14,25 +15,28 @@ import torch.nn as nn
     S gives next interval
 '''
 
-#consists of parameters shared by all cards
-class FSRSParameters(nn.Module):
-    def __init__(self):
-        super().__init__()
-
+#consists of parameters shared by all cards, packed into one weight vector
+class FSRSParameters(PackedFSRSParameters):
+    WEIGHT_NAMES = (
         # Core FSRS weights (trainable)
-        self.w0 = nn.Parameter(torch.tensor(0.4))   # difficulty shift- controls how much user feedback changes difficulty
-        self.w1 = nn.Parameter(torch.tensor(0.6))   # difficulty mean reversion / failure scale essential for stability prevents too easy/too hard forever
-        self.w2 = nn.Parameter(torch.tensor(0.9))   # difficulty exponent, Penalizes hard cards more
-        self.w3 = nn.Parameter(torch.tensor(0.2))   # retrievability exponent, Failure hurts more if recall probability was high
-        self.w4 = nn.Parameter(torch.tensor(1.2))   # success growth bias
-        self.w5 = nn.Parameter(torch.tensor(0.1))   # stability exponent, diminishing returns as S grows
-        self.w6 = nn.Parameter(torch.tensor(1.4))   # forgetting sensitivity, extra rewards for recalling close to forgetting
+        "w0",   # difficulty shift- controls how much user feedback changes difficulty
+        "w1",   # difficulty mean reversion / failure scale essential for stability prevents too easy/too hard forever
+        "w2",   # difficulty exponent, Penalizes hard cards more
+        "w3",   # retrievability exponent, Failure hurts more if recall probability was high
+        "w4",   # success growth bias
+        "w5",   # stability exponent, diminishing returns as S grows
+        "w6",   # forgetting sensitivity, extra rewards for recalling close to forgetting
 
         # Initial stability per first rating
-        self.init_s_again = nn.Parameter(torch.tensor(0.5))
-        self.init_s_hard  = nn.Parameter(torch.tensor(1.0))
-        self.init_s_good  = nn.Parameter(torch.tensor(2.5))
-        self.init_s_easy  = nn.Parameter(torch.tensor(4.0))
+        "init_s_again",
+        "init_s_hard",
+        "init_s_good",
+        "init_s_easy",
+    )
+    DEFAULT_WEIGHTS = (
+        0.4, 0.6, 0.9, 0.2, 1.2, 0.1, 1.4,
+        0.5, 1.0, 2.5, 4.0,
+    )
 
 
 
@@ -96,10 +100,10 @@ def stability_fail(S, D, R, p):
     D^w2- Hard cards suffer more
     R^w3-Forgetting hurts more if recall was expected
     """
-    return torch.clamp(
-        S * p.w1 * (D ** p.w2) * (R ** p.w3),
-        min=EPS,
-        max=S,
+    # clamp() can't mix a float min with a tensor max, so bound above with minimum()
+    return torch.minimum(
+        torch.clamp(S * p.w1 * (D ** p.w2) * (R ** p.w3), min=EPS),
+        S,
     )
 
 
@@ -158,8 +162,6 @@ def fsrs_sequence_loss(reviews, params):
             S = stability_fail(S, D, R, params)
         else:
             S = stability_success(S, D, R, params)
-            interval = predict_interval(S)# not necessary
-            print(f"Next review in {interval.item():.1f} days")
 
     # Normalize to avoid long-sequence dominating and bias towards heavy users
     return loss / len(reviews)
@@ -1,29 +1,48 @@
+import math
+import os
+import time
+import warnings
+
+import numpy as np
 import torch
-import torch.nn as nn
+
+from batch_sampler import LengthBucketSampler, padding_efficiency
+from fsrs_callbacks import CallbackList, EpochStats
+from fsrs_eval import flat_arrays
+from fsrs_params import PackedFSRSParameters
 
 # =========================
 # FSRS PARAMETERS
 # =========================
 
-class FSRSParameters(nn.Module):
-    def __init__(self):
-        super().__init__()
-
+class FSRSParameters(PackedFSRSParameters):
+    WEIGHT_NAMES = (
         # Core FSRS weights (trainable)
-        self.w0 = nn.Parameter(torch.tensor(0.4))   # difficulty feedback
-        self.w1 = nn.Parameter(torch.tensor(0.6))   # mean reversion / failure scale
-        self.w2 = nn.Parameter(torch.tensor(0.9))   # difficulty exponent
-        self.w3 = nn.Parameter(torch.tensor(0.2))   # retrievability exponent
-        self.w4 = nn.Parameter(torch.tensor(0.8))   # success growth bias
-        self.w5 = nn.Parameter(torch.tensor(0.1))   # stability exponent
-        self.w6 = nn.Parameter(torch.tensor(1.4))   # forgetting sensitivity
-        self.w7 = nn.Parameter(torch.tensor(0.2))
+        "w0",   # difficulty feedback
+        "w1",   # mean reversion / failure scale
+        "w2",   # difficulty exponent
+        "w3",   # retrievability exponent
+        "w4",   # success growth bias
+        "w5",   # stability exponent
+        "w6",   # forgetting sensitivity
+        "w7",
 
         # Initial stability per first rating
-        self.init_s_again = nn.Parameter(torch.tensor(0.5))
-        self.init_s_hard  = nn.Parameter(torch.tensor(1.0))
-        self.init_s_good  = nn.Parameter(torch.tensor(2.5))
-        self.init_s_easy  = nn.Parameter(torch.tensor(4.0))
+        "init_s_again",
+        "init_s_hard",
+        "init_s_good",
+        "init_s_easy",
+    )
+    DEFAULT_WEIGHTS = (
+        0.4, 0.6, 0.9, 0.2, 0.8, 0.1, 1.4, 0.2,
+        0.5, 1.0, 2.5, 4.0,
+    )
+    # (low, high) per weight for bounded fits (fit_lbfgs)
+    WEIGHT_BOUNDS = (
+        (0.0, 2.0), (0.0, 1.0), (0.0, 5.0), (0.0, 2.0),
+        (-3.0, 3.0), (-1.0, 1.0), (0.0, 5.0), (0.0, 2.0),
+        (0.01, 100.0), (0.01, 100.0), (0.01, 100.0), (0.01, 100.0),
+    )
 
 
 # =========================
@@ -33,6 +52,7 @@ class FSRSParameters(nn.Module):
 DECAY = -0.5
 EPS = 1e-6
 MAX_STABILITY = 200
+FAIL_MIN_RATIO, FAIL_MAX_RATIO = 0.3, 0.9
 FAILURE_R_PENALTY = 0.6
 
 
@@ -92,11 +112,9 @@ def stability_fail(S, D, R, p):
     S_new = S * p.w1 * (D ** -p.w2) * (torch.exp(p.w3 * (1 - R)))
     return torch.clamp(S_new, min=0.1, max=S * 0.8)
 '''
-def stability_fail(S, D, R, p):
+def stability_fail_raw(S, D, R, p):
     """
-    Failure reduces stability proportionally
-    Stronger reduction when retrievability was high
-    Difficulty does NOT exponentially crush S
+    stability_fail before its clamp (smooth; fsrs_tables interpolates this)
     """
 
     # Base decay factor (learned)
@@ -105,12 +123,19 @@ def stability_fail(S, D, R, p):
     # Forgetting penalty increases when R was high
     retrievability_penalty = torch.exp(p.w2 * (R - 1))
 
-    S_new = S * decay * retrievability_penalty
+    return S * decay * retrievability_penalty
 
+
+def stability_fail(S, D, R, p):
+    """
+    Failure reduces stability proportionally
+    Stronger reduction when retrievability was high
+    Difficulty does NOT exponentially crush S
+    """
     return torch.clamp(
-        S_new,
-        min=0.3 * S,   # 🔑 no collapse
-        max=0.9 * S
+        stability_fail_raw(S, D, R, p),
+        min=FAIL_MIN_RATIO * S,   # 🔑 no collapse
+        max=FAIL_MAX_RATIO * S
     )
 
 '''
@@ -132,7 +157,10 @@ def stability_success(S, D, R, p):
         max=MAX_STABILITY
     )
 '''
-def stability_success(S, D, R, p):
+def stability_success_raw(S, D, R, p):
+    """
+    stability_success before its clamp (smooth; fsrs_tables interpolates this)
+    """
     growth = (
         torch.exp(p.w4)
         * (11 - D)
@@ -143,10 +171,12 @@ def stability_success(S, D, R, p):
     # Soft saturation: growth slows as S increases
     saturation = 1.0 / (1.0 + S / MAX_STABILITY)
 
-    S_new = S * (1 + growth * saturation)
+    return S * (1 + growth * saturation)
+
 
+def stability_success(S, D, R, p):
     return torch.clamp(
-        S_new,
+        stability_success_raw(S, D, R, p),
         min=EPS,
         max=MAX_STABILITY
     )
@@ -197,14 +227,572 @@ def fsrs_sequence_loss(reviews, params):
     return loss / len(reviews)
 
 
+# =========================
+# PADDED BATCH ENGINE
+# =========================
+
+def recall_targets(grade):
+    """
+    Soft recall targets, same values as fsrs_sequence_loss
+    """
+    return torch.where(
+        grade == 1, 0.0,
+        torch.where(
+            grade == 2, 0.7,
+            torch.where(grade == 3, 0.9, 0.97)
+        )
+    )
+
+
+def pad_sequences(batch_sequences):
+    """
+    Pack [(elapsed_days, grade), ...] sequences into padded tensors.
+
+    returns:
+        elapsed [B, T] float, grades [B, T] float, lengths [B] long
+
+    Padding uses elapsed=0 / grade=3 so masked steps stay finite.
+    """
+    lengths = [len(seq) for seq in batch_sequences]
+    T = max(lengths)
+
+    elapsed = torch.tensor([
+        [float(e) for e, _ in seq] + [0.0] * (T - len(seq))
+        for seq in batch_sequences
+    ])
+    grades = torch.tensor([
+        [float(g) for _, g in seq] + [3.0] * (T - len(seq))
+        for seq in batch_sequences
+    ])
+
+    return elapsed, grades, torch.tensor(lengths, dtype=torch.long)
+
+
+def scan_steps(S, D, loss, elapsed, grades, targets, active, scored, params):
+    """
+    The recurrence over [B, K] step columns: score R against the soft
+    target, then update D and S for active steps
+    """
+    for k in range(grades.shape[1]):
+        grade_t = grades[:, k]
+
+        R = retrievability(elapsed[:, k], S)
+        y = targets[:, k]
+
+        step_loss = -(y * torch.log(R + EPS) + (1 - y) * torch.log(1 - R + EPS))
+        loss = loss + torch.where(scored[:, k], step_loss, 0.0)
+
+        D_new = update_difficulty(D, grade_t, params)
+        S_new = torch.where(
+            grade_t == 1,
+            stability_fail(S, D_new, R, params),
+            stability_success(S, D_new, R, params)
+        )
+
+        D = torch.where(active[:, k], D_new, D)
+        S = torch.where(active[:, k], S_new, S)
+
+    return S, D, loss
+
+
+def fsrs_padded_loss(elapsed, grades, lengths, params, loss_start=None, targets=None, mask=None, backend="eager"):
+    """
+    Vectorized fsrs_batch_loss over padded [B, T] tensors.
+
+    Runs the S/D recurrence once per time step across all B
+    sequences; steps past each sequence's length are masked out.
+    With batched params ([P, n_weights]) the state is [P, B] and
+    one loss per parameter set is returned.
+
+    loss_start [B]: optional first step that is scored; earlier steps
+    only replay memory state (fine-tuning on new reviews). Each sequence
+    is normalised like fsrs_sequence_loss: scored steps + the first review.
+    targets / mask [B, T]: precomputed recall_targets(grades) and length
+    mask (FSRSDataset batches); derived here when not given.
+    backend: "eager", "compile" for the fused scan (compiled_scan) or
+             "lean" for the hand-derived backward (LeanScan)
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"unknown backend {backend!r}, expected one of {BACKENDS}")
+
+    B, T = grades.shape
+    if mask is None:
+        mask = torch.arange(T) < lengths.unsqueeze(1)
+    if targets is None:
+        targets = recall_targets(grades)
+
+    if loss_start is None:
+        scored = mask
+        n_scored = lengths
+    else:
+        scored = mask & (torch.arange(T) >= loss_start.unsqueeze(1))
+        n_scored = (lengths - loss_start + 1).clamp(min=1)
+
+    S = initial_stability(grades[:, 0], params)
+    D = torch.full((B,), 5.0)
+    loss = torch.zeros(B)
+    steps = (elapsed[:, 1:], grades[:, 1:], targets[:, 1:], mask[:, 1:], scored[:, 1:])
+
+    if backend == "lean":
+        return (LeanScan.apply(S, params.weights, *steps) / n_scored).mean(dim=-1)
+
+    scan = compiled_scan() if backend == "compile" else None
+    if scan is None:
+        S, D, loss = scan_steps(S, D, loss, *steps, params)
+    else:
+        S, D, loss = _chunked_scan(scan, S, steps, params.weights)
+
+    return (loss / n_scored).mean(dim=-1)
+
+
+# =========================
+# COMPILED SCAN
+# =========================
+'''torch.compile backend for the padded scan. The recurrence is dozens of
+    tiny elementwise ops per step, so eager time goes to dispatch and
+    autograd bookkeeping rather than arithmetic. Compiling scan_steps over
+    SCAN_CHUNK-step slices fuses each slice into one kernel forward and
+    one backward.
+
+    Every call has the same [B, SCAN_CHUNK] shape. The last slice is padded
+    with inactive, unscored steps, so one graph serves all batch lengths.
+    Losses match eager to float32 rounding. Where compiling fails (no
+    inductor / C++ toolchain) compiled_scan warns once and the loss runs
+    eagerly.
+'''
+
+BACKENDS = ("eager", "compile", "lean")
+SCAN_CHUNK = 8
+
+_COMPILED = {}
+
+
+def _weights_scan(S, D, loss, elapsed, grades, targets, active, scored, weights):
+    return scan_steps(S, D, loss, elapsed, grades, targets, active, scored, FSRSParameters.View(weights))
+
+
+def _probe(scan):
+    """
+    Compile forward and backward on a tiny input now, so failures surface
+    here rather than mid-training
+    """
+    weights = FSRSParameters().weights
+    S = torch.ones(2, requires_grad=True)
+    steps = (
+        torch.ones(2, SCAN_CHUNK),
+        torch.full((2, SCAN_CHUNK), 3.0),
+        torch.full((2, SCAN_CHUNK), 0.9),
+        torch.ones(2, SCAN_CHUNK, dtype=torch.bool),
+        torch.ones(2, SCAN_CHUNK, dtype=torch.bool),
+    )
+    _, _, loss = scan(S, torch.full((2,), 5.0), torch.zeros(2), *steps, weights)
+    loss.sum().backward()
+
+
+def compiled_scan():
+    """
+    The compiled _weights_scan, or None when this torch build can't compile it
+    """
+    if "scan" not in _COMPILED:
+        try:
+            scan = torch.compile(_weights_scan, dynamic=True)
+            _probe(scan)
+        except Exception as err:
+            warnings.warn(f"compiled FSRS scan unavailable, falling back to eager: {err}")
+            scan = None
+        _COMPILED["scan"] = scan
+    return _COMPILED["scan"]
+
+
+def _pad_steps(x, n, value):
+    return torch.cat([x, x.new_full((x.shape[0], n), value)], dim=1)
+
+
+def _chunked_scan(scan, S, steps, weights):
+    """
+    scan over SCAN_CHUNK columns at a time, with state already at its
+    final ([B] or [P, B]) shape so every call hits the same graph
+    """
+    n_steps = steps[0].shape[1]
+    pad = -n_steps % SCAN_CHUNK
+    steps = [
+        _pad_steps(x, pad, value)
+        for x, value in zip(steps, (0.0, 3.0, 0.9, False, False))
+    ]
+
+    D = torch.full_like(S, 5.0)
+    loss = torch.zeros_like(S)
+    for k in range(0, n_steps + pad, SCAN_CHUNK):
+        S, D, loss = scan(S, D, loss, *(x[:, k:k + SCAN_CHUNK] for x in steps), weights)
+    return S, D, loss
+
+
+# =========================
+# MEMORY-LEAN SCAN
+# =========================
+'''The scan as one autograd.Function. Autograd keeps dozens of saved tensors
+    per step, so its memory grows with history length x batch size
+    x graph size. LeanScan runs the forward pass without a graph and saves
+    only the state entering each step: S and D, 8 bytes per review, the
+    same as the padded batch itself. The backward pass walks the steps in
+    reverse, recomputes R and the updates from the saved state, and applies
+    the hand-derived gradients below.
+
+    Clamps pass gradient inside their bounds (inclusive) like torch.clamp,
+    and the fail clamp's bounds carry 0.3 / 0.9 of dS when they bind.
+    Gradients match autograd to float32 rounding.
+'''
+
+
+class LeanScan(torch.autograd.Function):
+    """
+    apply(S0, weights, elapsed, grades, targets, active, scored) -> summed
+    scored loss per sequence ([B], or [P, B] for batched weights); the
+    step tensors are [B, T - 1] like scan_steps'
+    """
+
+    @staticmethod
+    def forward(ctx, S0, weights, elapsed, grades, targets, active, scored):
+        p = FSRSParameters.View(weights)
+        S = S0
+        D = torch.full_like(S0, 5.0)
+        loss = torch.zeros_like(S0)
+
+        n_steps = grades.shape[1]
+        S_hist = S0.new_empty((n_steps,) + S0.shape)
+        D_hist = S0.new_empty((n_steps,) + S0.shape)
+
+        for k in range(n_steps):
+            S_hist[k] = S
+            D_hist[k] = D
+            S, D, loss = scan_steps(
+                S, D, loss,
+                elapsed[:, k:k + 1], grades[:, k:k + 1], targets[:, k:k + 1],
+                active[:, k:k + 1], scored[:, k:k + 1], p
+            )
+
+        ctx.save_for_backward(weights, elapsed, grades, targets, active, scored, S_hist, D_hist)
+        return loss
+
+    @staticmethod
+    def backward(ctx, grad_loss):
+        weights, elapsed, grades, targets, active, scored, S_hist, D_hist = ctx.saved_tensors
+        p = FSRSParameters.View(weights)
+
+        g_S = torch.zeros_like(S_hist[0])
+        g_D = torch.zeros_like(S_hist[0])
+        g_w = {name: torch.zeros_like(S_hist[0]) for name in ("w0", "w1", "w2", "w4", "w5", "w6")}
+
+        for k in reversed(range(grades.shape[1])):
+            S, D = S_hist[k], D_hist[k]
+            e, g, y = elapsed[:, k], grades[:, k], targets[:, k]
+            a, sc = active[:, k], scored[:, k]
+            fail = g == 1
+
+            # Forward recompute
+            S_c = torch.clamp(S, min=EPS)
+            R_raw = torch.exp(-e / S_c)
+            R = torch.clamp(R_raw, min=EPS, max=1.0)
+
+            D_pre = D + p.w0 * (3.0 - g) + p.w1 * (5.0 - D)
+            D_new = torch.clamp(D_pre, 1.0, 10.0)
+
+            fail_raw = stability_fail_raw(S, D_new, R, p)
+            exp_term = torch.exp((1 - R) * p.w6)
+            A = torch.exp(p.w4) * (11 - D_new) * (S ** p.w5)
+            growth = A * (exp_term - 1)
+            saturation = 1.0 / (1.0 + S / MAX_STABILITY)
+            success_raw = S * (1 + growth * saturation)
+
+            # S_next / D_next = where(active, new, old)
+            g_S_new = torch.where(a, g_S, 0.0)
+            g_D_new = torch.where(a, g_D, 0.0)
+            g_S = torch.where(a, 0.0, g_S)
+            g_D = torch.where(a, 0.0, g_D)
+
+            # Soft-target log loss
+            g_R = torch.where(sc, grad_loss * -(y / (R + EPS) - (1 - y) / (1 - R + EPS)), 0.0)
+
+            # Fail branch: clamp(raw, 0.3 S, 0.9 S)
+            g_fail = torch.where(fail, g_S_new, 0.0)
+            lo, hi = FAIL_MIN_RATIO * S, FAIL_MAX_RATIO * S
+            g_fail_raw = torch.where((fail_raw >= lo) & (fail_raw <= hi), g_fail, 0.0)
+            g_S = g_S + torch.where(fail_raw < lo, FAIL_MIN_RATIO * g_fail, 0.0)
+            g_S = g_S + torch.where(fail_raw > hi, FAIL_MAX_RATIO * g_fail, 0.0)
+
+            g_S = g_S + g_fail_raw * fail_raw / S
+            g_R = g_R + g_fail_raw * fail_raw * p.w2
+            g_w["w1"] = g_w["w1"] + g_fail_raw * fail_raw
+            g_w["w2"] = g_w["w2"] + g_fail_raw * fail_raw * (R - 1)
+
+            # Success branch: clamp(S * (1 + growth * saturation), EPS, MAX_STABILITY)
+            g_success = torch.where(fail, 0.0, g_S_new)
+            g_success_raw = torch.where(
+                (success_raw >= EPS) & (success_raw <= MAX_STABILITY), g_success, 0.0
+            )
+            g_S = g_S + g_success_raw * (
+                1 + growth * saturation - S * growth * saturation ** 2 / MAX_STABILITY
+            )
+
+            g_growth = g_success_raw * S * saturation
+            g_S = g_S + g_growth * growth * p.w5 / S
+            g_D_new = g_D_new - g_growth * torch.exp(p.w4) * (S ** p.w5) * (exp_term - 1)
+            g_R = g_R - g_growth * A * exp_term * p.w6
+            g_w["w4"] = g_w["w4"] + g_growth * growth
+            g_w["w5"] = g_w["w5"] + g_growth * growth * torch.log(S)
+            g_w["w6"] = g_w["w6"] + g_growth * A * exp_term * (1 - R)
+
+            # Difficulty: clamp(D + w0 (3 - g) + w1 (5 - D), 1, 10)
+            g_D_pre = torch.where((D_pre >= 1.0) & (D_pre <= 10.0), g_D_new, 0.0)
+            g_D = g_D + g_D_pre * (1 - p.w1)
+            g_w["w0"] = g_w["w0"] + g_D_pre * (3.0 - g)
+            g_w["w1"] = g_w["w1"] + g_D_pre * (5.0 - D)
+
+            # Retrievability: clamp(exp(-t / clamp(S, EPS)), EPS, 1)
+            g_R_raw = torch.where((R_raw >= EPS) & (R_raw <= 1.0), g_R, 0.0)
+            g_S = g_S + torch.where(S >= EPS, g_R_raw * R_raw * e / S_c ** 2, 0.0)
+
+        grad_weights = torch.zeros_like(weights)
+        for name, grad in g_w.items():
+            grad_weights[..., FSRSParameters.WEIGHT_NAMES.index(name)] = grad.sum(dim=-1)
+
+        return g_S, grad_weights, None, None, None, None, None
+
+
 # =========================
 # BATCH LOSS
 # =========================
 
 def fsrs_batch_loss(batch_sequences, params):
-    return sum(
-        fsrs_sequence_loss(seq, params) for seq in batch_sequences
-    ) / len(batch_sequences)
+    return fsrs_padded_loss(*pad_sequences(batch_sequences), params)
+
+
+def make_batch(sequences, idx):
+    """
+    Padded (elapsed, grades, lengths[, loss_start]) for sequences[idx].
+    Datasets with padded_batch (SequenceCache) gather straight from
+    their arrays; plain lists of sequences go through pad_sequences.
+    """
+    if hasattr(sequences, "padded_batch"):
+        return sequences.padded_batch(idx)
+    return pad_sequences([sequences[j] for j in idx])
+
+
+def batch_loss(batch, params, backend="eager"):
+    """
+    fsrs_padded_loss for a make_batch result (or an FSRSDataset batch)
+    """
+    elapsed, grades, lengths, *extra = batch
+    return fsrs_padded_loss(elapsed, grades, lengths, params, *extra, backend=backend)
+
+
+@torch.no_grad()
+def evaluate_loss(sequences, params, batch_size=256, backend="eager"):
+    """
+    Mean per-sequence loss over a whole dataset, no gradients
+    """
+    n = len(sequences)
+    total = 0.0
+    for i in range(0, n, batch_size):
+        idx = list(range(i, min(i + batch_size, n)))
+        total += batch_loss(make_batch(sequences, idx), params, backend).item() * len(idx)
+    return total / n
+
+
+# =========================
+# TRAINING LOOP
+# =========================
+
+def sequence_lengths(sequences):
+    if hasattr(sequences, "lengths"):
+        return sequences.lengths
+    return [len(seq) for seq in sequences]
+
+
+def random_batches(n, batch_size):
+    perm = torch.randperm(n)
+    return [perm[i:i + batch_size].tolist() for i in range(0, n, batch_size)]
+
+
+class IndexedSequences:
+    """
+    View of sequences[indices] that keeps the dataset's fast batching
+    """
+
+    def __init__(self, sequences, indices):
+        self.sequences = sequences
+        self.indices = list(indices)
+        self.lengths = np.asarray(sequence_lengths(sequences))[self.indices]
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __getitem__(self, i):
+        return self.sequences[self.indices[i]]
+
+    def padded_batch(self, idx):
+        return make_batch(self.sequences, [self.indices[j] for j in idx])
+
+
+def split_sequences(sequences, val_fraction, seed=0):
+    """
+    Deterministic (train, validation) split; the seed is independent of
+    the global RNG so resuming doesn't change the split
+    """
+    n = len(sequences)
+    n_val = int(round(n * val_fraction))
+    perm = torch.randperm(n, generator=torch.Generator().manual_seed(seed)).tolist()
+    return IndexedSequences(sequences, perm[n_val:]), IndexedSequences(sequences, perm[:n_val])
+
+
+# =========================
+# PRE-TENSORIZED DATASET
+# =========================
+
+def _gather_sequences(elapsed, grades, offsets, indices):
+    """
+    Flat (elapsed, grades, offsets) of the sequences at indices, in that order
+    """
+    starts = offsets[indices]
+    lengths = offsets[indices + 1] - starts
+    new_offsets = torch.cat([torch.zeros(1, dtype=torch.long), torch.cumsum(lengths, 0)])
+    positions = torch.repeat_interleave(starts - new_offsets[:-1], lengths) + torch.arange(int(new_offsets[-1]))
+    return elapsed[positions], grades[positions], new_offsets
+
+
+def flat_tensors(sequences):
+    """
+    (elapsed, grades, offsets) tensors for a list of sequences, a
+    SequenceCache / SequenceSubset, an IndexedSequences view or an FSRSDataset
+    """
+    if isinstance(sequences, FSRSDataset):
+        return sequences.elapsed, sequences.grades, sequences.offsets
+
+    if isinstance(sequences, IndexedSequences):
+        indices = torch.as_tensor(sequences.indices, dtype=torch.long)
+        return _gather_sequences(*flat_tensors(sequences.sequences), indices)
+
+    elapsed, grades, offsets = flat_arrays(sequences)
+    return (
+        torch.from_numpy(np.array(elapsed, dtype=np.float32)),
+        torch.from_numpy(np.array(grades, dtype=np.float32)),
+        torch.from_numpy(np.array(offsets, dtype=np.int64))
+    )
+
+
+def _loss_start(sequences):
+    if isinstance(sequences, IndexedSequences):
+        loss_start = _loss_start(sequences.sequences)
+        return None if loss_start is None else loss_start[sequences.indices]
+
+    loss_start = getattr(sequences, "loss_start", None)
+    return None if loss_start is None else torch.as_tensor(loss_start, dtype=torch.long)
+
+
+class FSRSDataset(torch.utils.data.Dataset):
+    """
+    Sequences converted to flat tensors once: elapsed, grades, soft
+    recall targets and offsets (plus loss_start for IncrementalDataset).
+
+    dataset[idx] with a list of indices is one padded batch, gathered by
+    indexing only, so a DataLoader over index lists (batch_loader) can build
+    batches in worker processes without any per-review Python work.
+    """
+
+    def __init__(self, sequences):
+        self.elapsed, self.grades, self.offsets = flat_tensors(sequences)
+        self.targets = recall_targets(self.grades)
+        self.loss_start = _loss_start(sequences)
+        self.lengths = (self.offsets[1:] - self.offsets[:-1]).numpy()
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def __getitem__(self, idx):
+        return self.padded_batch(idx)
+
+    def padded_batch(self, idx):
+        """
+        (elapsed, grades, lengths, loss_start, targets, mask) for batch_loss;
+        padding matches pad_sequences (elapsed=0, grade=3)
+        """
+        idx = torch.as_tensor(idx, dtype=torch.long)
+        starts = self.offsets[idx]
+        lengths = self.offsets[idx + 1] - starts
+
+        steps = torch.arange(int(lengths.max()))
+        mask = steps < lengths.unsqueeze(1)
+        positions = torch.where(mask, starts.unsqueeze(1) + steps, 0)
+
+        elapsed = torch.where(mask, self.elapsed[positions], 0.0)
+        grades = torch.where(mask, self.grades[positions], 3.0)
+        targets = torch.where(mask, self.targets[positions], 0.9)
+        loss_start = None if self.loss_start is None else self.loss_start[idx]
+
+        return elapsed, grades, lengths, loss_start, targets, mask
+
+
+class EpochBatches(torch.utils.data.Sampler):
+    """
+    The current epoch's batches (lists of indices); set .batches before each
+    pass so one persistent DataLoader follows a new order every epoch
+    """
+
+    def __init__(self, batches=()):
+        self.batches = list(batches)
+
+    def __iter__(self):
+        return iter(self.batches)
+
+    def __len__(self):
+        return len(self.batches)
+
+
+def batch_loader(dataset, batches, num_workers=0, prefetch_factor=2):
+    """
+    DataLoader yielding dataset[idx] for every idx in batches (an EpochBatches
+    or any iterable of index lists), in order.
+
+    With num_workers > 0 batches are gathered in worker processes, up to
+    prefetch_factor per worker ahead of the optimizer step. The loader has
+    its own generator, so the global RNG (random_batches, checkpoints) is
+    left exactly as the plain loop leaves it.
+    """
+    return torch.utils.data.DataLoader(
+        dataset,
+        sampler=batches,
+        batch_size=None,
+        num_workers=num_workers,
+        prefetch_factor=prefetch_factor if num_workers else None,
+        persistent_workers=num_workers > 0,
+        generator=torch.Generator()
+    )
+
+
+# =========================
+# CHECKPOINTS
+# =========================
+
+def save_checkpoint(path, params, optimizer, state):
+    """
+    params + Adam state + RNG state + loop state, written atomically
+    """
+    tmp_path = f"{path}.tmp"
+    torch.save({
+        "params": params.state_dict(),
+        "optimizer": optimizer.state_dict(),
+        "rng_state": torch.get_rng_state(),
+        "state": state,
+    }, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def load_checkpoint(path, params, optimizer):
+    checkpoint = torch.load(path, weights_only=False)
+    params.load_state_dict(checkpoint["params"])
+    optimizer.load_state_dict(checkpoint["optimizer"])
+    torch.set_rng_state(checkpoint["rng_state"])
+    return checkpoint["state"]
 
 
 # =========================
@@ -216,37 +804,368 @@ def train_fsrs(
     epochs=50,
     lr=0.01,
     batch_size=32,
-    save_path="fsrs_weights.pt"
+    save_path="fsrs_weights.pt",
+    bucket_by_length=False,
+    verbose=True,
+    params=None,
+    tol=None,
+    val_fraction=0.0,
+    patience=None,
+    time_budget=None,
+    checkpoint_path=None,
+    checkpoint_every=1,
+    resume=False,
+    split_seed=0,
+    pretensorize=True,
+    num_workers=0,
+    prefetch_factor=2,
+    backend="eager",
+    method="adam",
+    max_evals=100,
+    grad_tol=1e-3,
+    callbacks=None
 ):
-    params = FSRSParameters()
+    """
+    sequences: list of [(elapsed_days, grade), ...] or a SequenceCache
+    save_path: where to torch.save the weights (None = don't save)
+    bucket_by_length: batch sequences of similar length (LengthBucketSampler)
+                      instead of uniformly at random, to cut padding
+    params: FSRSParameters to warm-start from (trained in place)
+    tol: stop once an epoch improves the mean batch loss by less than
+         this fraction of the previous epoch's
+
+    val_fraction: hold out this share of sequences; the weights with the
+                  best validation loss are the ones returned
+    patience: stop after this many epochs without a validation improvement
+    time_budget: wall-clock seconds; training stops after the batch that
+                 crosses it and returns the best validation weights so far
+                 (without val_fraction, the last weights)
+    checkpoint_path / checkpoint_every: save params, Adam and RNG state
+                 every N epochs; resume=True continues exactly from it
+    pretensorize: convert the data to an FSRSDataset once up front (False
+                  gathers every batch from sequences, e.g. a SequenceCache
+                  larger than memory)
+    num_workers / prefetch_factor: DataLoader workers building batches
+                  while the optimizer steps (pretensorize only)
+    backend: "compile" runs the loss through the fused compiled scan,
+             "lean" through LeanScan (long histories, flat memory)
+    method: "adam" (minibatch epochs) or "lbfgs" (fit_lbfgs on the training
+            set: full batch, bounded, max_evals / grad_tol; the epoch,
+            patience and checkpoint options don't apply)
+    callbacks: fsrs_callbacks.Callback instances (JSONLSink, MetricsHistory,
+               TorchProfiler, ...); none by default
+    """
+    if num_workers and not pretensorize:
+        raise ValueError("num_workers needs pretensorize=True")
+    if method not in ("adam", "lbfgs"):
+        raise ValueError(f"unknown method {method!r}")
+
+    params = params if params is not None else FSRSParameters()
     optimizer = torch.optim.Adam(params.parameters(), lr=lr)
 
-    n = len(sequences)
+    if val_fraction:
+        train_set, val_set = split_sequences(sequences, val_fraction, split_seed)
+    else:
+        train_set, val_set = sequences, None
+
+    if pretensorize:
+        train_set = FSRSDataset(train_set)
+        val_set = FSRSDataset(val_set) if val_set is not None else None
+
+    n = len(train_set)
+    lengths = sequence_lengths(train_set)
+    train_start = time.perf_counter()
+
+    callbacks = CallbackList(callbacks)
+    callbacks.on_train_start({
+        "method": method,
+        "backend": backend,
+        "sequences": n,
+        "reviews": int(np.sum(lengths)),
+        "val_sequences": len(val_set) if val_set is not None else 0,
+        "epochs": epochs,
+        "batch_size": batch_size,
+        "lr": lr,
+    })
+
+    if method == "lbfgs":
+        params, info = fit_lbfgs(
+            train_set, params, max_evals=max_evals, grad_tol=grad_tol, backend=backend, verbose=verbose
+        )
+        if val_set is not None:
+            info["val_loss"] = evaluate_loss(val_set, params, backend=backend)
+            if verbose:
+                print(f"Validation loss = {info['val_loss']:.4f}")
+
+        callbacks.on_train_end({**info, "seconds": time.perf_counter() - train_start})
+        _save_weights(params, save_path, verbose)
+        return params
+
+    sampler = LengthBucketSampler(lengths, batch_size) if bucket_by_length else None
 
-    for epoch in range(epochs):
-        total_loss = 0.0
-        perm = torch.randperm(n)
+    state = {
+        "epoch": 0,
+        "prev_loss": None,
+        "best_val": math.inf,
+        "best_weights": None,
+        "bad_epochs": 0,
+    }
+    if resume and checkpoint_path and os.path.exists(checkpoint_path):
+        state = load_checkpoint(checkpoint_path, params, optimizer)
+        if verbose:
+            print(f"Resumed from {checkpoint_path} at epoch {state['epoch']}")
+    elif val_set is not None:
+        # The starting weights are a candidate too (matters when warm-starting)
+        state["best_val"] = evaluate_loss(val_set, params, backend=backend)
+        state["best_weights"] = params.weights.detach().clone()
 
-        for i in range(0, n, batch_size):
-            idx = perm[i:i + batch_size]
-            batch = [sequences[j] for j in idx]
+    deadline = None if time_budget is None else time.monotonic() + time_budget
 
+    epoch_batches = EpochBatches()
+    loader = batch_loader(train_set, epoch_batches, num_workers, prefetch_factor) if pretensorize else None
+
+    stop_reason = None
+    for epoch in range(state["epoch"], epochs):
+        batches = list(sampler) if sampler else random_batches(n, batch_size)
+        out_of_time = False
+
+        epoch_batches.batches = batches
+        batch_iter = loader if loader is not None else (make_batch(train_set, idx) for idx in batches)
+
+        callbacks.on_epoch_start(epoch)
+        stats = EpochStats()
+        t_data = time.perf_counter()
+
+        for batch in batch_iter:
+            t_forward = time.perf_counter()
             optimizer.zero_grad()
-            loss = fsrs_batch_loss(batch, params)
+            loss = batch_loss(batch, params, backend)
+
+            t_backward = time.perf_counter()
             loss.backward()
 
-            torch.nn.utils.clip_grad_norm_(params.parameters(), 5.0)
+            t_optimizer = time.perf_counter()
+            grad_norm = torch.nn.utils.clip_grad_norm_(params.parameters(), 5.0)
             optimizer.step()
+            t_done = time.perf_counter()
+
+            batch_stats = {
+                "loss": loss.item(),
+                "grad_norm": grad_norm.item(),
+                "sequences": len(batch[2]),
+                "reviews": int(batch[2].sum()),
+                "timings": {
+                    "data_s": t_forward - t_data,
+                    "forward_s": t_backward - t_forward,
+                    "backward_s": t_optimizer - t_backward,
+                    "optimizer_s": t_done - t_optimizer,
+                },
+            }
+            stats.add_batch(**batch_stats)
+            if callbacks:
+                callbacks.on_batch_end(epoch, batch_stats)
+
+            if deadline is not None and time.monotonic() > deadline:
+                out_of_time = True
+                break
+            t_data = time.perf_counter()
+
+        total_loss = stats.loss
+        epoch_stats = stats.summary()
+        stop_reason = "time budget reached" if out_of_time else None
+        message = f"Epoch {epoch + 1}: Loss = {total_loss:.4f}"
+
+        if val_set is not None:
+            val_loss = evaluate_loss(val_set, params, backend=backend)
+            epoch_stats["val_loss"] = val_loss
+            message += f" | val = {val_loss:.4f}"
 
-            total_loss += loss.item()
+            if val_loss < state["best_val"]:
+                state["best_val"] = val_loss
+                state["best_weights"] = params.weights.detach().clone()
+                state["bad_epochs"] = 0
+            else:
+                state["bad_epochs"] += 1
+                if patience is not None and state["bad_epochs"] >= patience:
+                    stop_reason = stop_reason or f"no validation improvement for {patience} epochs"
 
-        print(f"Epoch {epoch + 1}: Loss = {total_loss:.4f}")
+        if verbose or callbacks:
+            efficiency = padding_efficiency(lengths, batches)
+            epoch_stats["padding_efficiency"] = efficiency
+            callbacks.on_epoch_end(epoch, epoch_stats)
+        if verbose:
+            print(f"{message} | padding efficiency = {efficiency:.1%}")
 
-    torch.save(params.state_dict(), save_path)
-    print(f"FSRS weights saved to {save_path}")
+        mean_loss = total_loss / len(batches)
+        prev_loss = state["prev_loss"]
+        if tol is not None and prev_loss is not None and prev_loss - mean_loss < tol * abs(prev_loss):
+            stop_reason = stop_reason or "converged"
+        state["prev_loss"] = mean_loss
+
+        # Checkpoints mark whole epochs only, so resuming replays nothing twice
+        if not out_of_time:
+            state["epoch"] = epoch + 1
+            if checkpoint_path and (state["epoch"] % checkpoint_every == 0 or stop_reason):
+                save_checkpoint(checkpoint_path, params, optimizer, state)
+
+        if stop_reason:
+            if verbose:
+                print(f"Stopping after epoch {epoch + 1}: {stop_reason}")
+            break
+
+    if state["best_weights"] is not None:
+        with torch.no_grad():
+            params.weights.copy_(state["best_weights"])
+
+    callbacks.on_train_end({
+        "epochs_run": state["epoch"],
+        "stop_reason": stop_reason or "max epochs",
+        "best_val": state["best_val"] if val_set is not None else None,
+        "seconds": time.perf_counter() - train_start,
+    })
+    _save_weights(params, save_path, verbose)
     return params
 
 
+def _save_weights(params, save_path, verbose):
+    if save_path:
+        torch.save(params.state_dict(), save_path)
+        if verbose:
+            print(f"FSRS weights saved to {save_path}")
+
+
+# =========================
+# FULL-BATCH L-BFGS
+# =========================
+'''With about a dozen weights the whole objective is cheap to evaluate
+    exactly, so fit_lbfgs skips the minibatch noise: every evaluation is
+    the mean per-sequence loss over the full dataset (evaluate_loss's
+    objective), accumulated over length-sorted chunks, and torch's L-BFGS
+    with a strong-Wolfe line search walks it.
+
+    Bounds are a reparameterization, weight = low + (high - low) * sigmoid(z),
+    so the line search never leaves WEIGHT_BOUNDS and no projection breaks
+    the curvature pairs. Fitting stops once the projected, range-scaled
+    weight gradient is within grad_tol, the loss stops improving, or
+    max_evals evaluations are spent.
+'''
+
+def weight_bounds(params):
+    low, high = torch.tensor(type(params).WEIGHT_BOUNDS).T
+    return low, high
+
+
+def to_unbounded(weights, low, high, margin=0.01):
+    """
+    Inverse of from_unbounded; weights on or outside a bound start
+    `margin` of the range inside it, where the sigmoid isn't flat
+    """
+    return torch.logit(((weights - low) / (high - low)).clamp(margin, 1 - margin))
+
+
+def from_unbounded(z, low, high):
+    return low + (high - low) * torch.sigmoid(z)
+
+
+def projected_grad_norm(z, grad, pin=1e-3):
+    """
+    max |dloss/dweight| * (high - low), ignoring weights pinned at a bound
+    whose gradient points out of it (the sigmoid hides those in dloss/dz)
+    """
+    u = torch.sigmoid(z.detach())
+    scaled = grad / (u * (1 - u))
+    pinned = ((u < pin) & (scaled > 0)) | ((u > 1 - pin) & (scaled < 0))
+    return float(torch.where(pinned, 0.0, scaled).abs().max())
+
+
+def length_sorted_chunks(lengths, chunk_size):
+    order = np.argsort(np.asarray(lengths), kind="stable")
+    return [order[i:i + chunk_size].tolist() for i in range(0, len(order), chunk_size)]
+
+
+def fit_lbfgs(sequences, params=None, max_evals=100, grad_tol=1e-3, chunk_size=1024, backend="eager", verbose=True):
+    """
+    Full-batch bounded L-BFGS fit of one parameter set (updated in place).
+
+    grad_tol: stop once projected_grad_norm is at or below it
+    returns (params, info) with info: loss, n_evals, grad_norm and
+    stop_reason ("converged", "max_evals" or "no progress")
+    """
+    params = params if params is not None else FSRSParameters()
+    if params.is_batched:
+        raise ValueError("fit_lbfgs fits one parameter set at a time")
+
+    n = len(sequences)
+    chunks = length_sorted_chunks(sequence_lengths(sequences), chunk_size)
+    batches = [make_batch(sequences, idx) for idx in chunks]
+
+    low, high = weight_bounds(params)
+    z = to_unbounded(params.weights.detach(), low, high).requires_grad_()
+
+    # One iteration per step() so the bound-aware check runs after each;
+    # the curvature history carries over between calls
+    optimizer = torch.optim.LBFGS(
+        [z],
+        lr=1.0,
+        max_iter=1,
+        max_eval=max_evals,
+        tolerance_grad=0.0,
+        tolerance_change=0.0,
+        history_size=20,
+        line_search_fn="strong_wolfe"
+    )
+    n_evals = 0
+    last = {}
+
+    def closure():
+        nonlocal n_evals
+        # step() starts by re-evaluating the point the last check just did
+        if last and torch.equal(last["z"], z.detach()):
+            z.grad = last["grad"].clone()
+            return last["loss"]
+
+        n_evals += 1
+        optimizer.zero_grad()
+
+        total = 0.0
+        for idx, batch in zip(chunks, batches):
+            # the weights graph is rebuilt per chunk, so each backward frees its own
+            view = FSRSParameters.View(from_unbounded(z, low, high))
+            loss = batch_loss(batch, view, backend) * (len(idx) / n)
+            loss.backward()
+            total += loss.item()
+
+        last.update(z=z.detach().clone(), grad=z.grad.clone(), loss=torch.tensor(total))
+        return last["loss"]
+
+    loss = float(closure())
+    while True:
+        grad_norm = projected_grad_norm(z, last["grad"])
+        if grad_norm <= grad_tol:
+            stop_reason = "converged"
+            break
+        if n_evals >= max_evals:
+            stop_reason = "max_evals"
+            break
+
+        prev_loss = loss
+        optimizer.step(closure)
+        loss = float(closure())
+        if prev_loss - loss <= 1e-9 * abs(prev_loss):
+            stop_reason = "no progress"
+            break
+
+    with torch.no_grad():
+        params.weights.copy_(from_unbounded(z, low, high))
+
+    if verbose:
+        print(f"L-BFGS: loss = {loss:.4f} after {n_evals} evaluations "
+              f"| grad = {grad_norm:.2e} | {stop_reason}")
+
+    info = {"loss": loss, "n_evals": n_evals, "grad_norm": grad_norm, "stop_reason": stop_reason}
+    return params, info
+
+
 # =========================
 # INTERVAL PREDICTION
 # =========================
@@ -256,10 +1175,66 @@ def predict_interval(stability, target_retrievability=0.9):
     Solve R = exp(DECAY * t / S)
     """
     target_retrievability = torch.clamp(
-        torch.tensor(target_retrievability),
+        torch.as_tensor(target_retrievability, dtype=torch.float32),
         min=EPS,
         max=0.99
     )
 
     interval = stability * torch.log(target_retrievability) / DECAY
     return torch.clamp(interval, min=1.0)
+
+
+# =========================
+# FOUR-GRADE PREVIEW
+# =========================
+
+GRADES = ("again", "hard", "good", "easy")
+
+# Grade-specific target retrievability, mirrors SRS_TARGETS in lib/srs.server.ts
+SRS_TARGETS = {
+    "again": 0.5,
+    "hard": 0.95,
+    "good": 0.9,
+    "easy": 0.85,
+}
+
+
+@torch.no_grad()
+def preview_grades(stability, difficulty, elapsed_days, params, targets=SRS_TARGETS):
+    """
+    Next state for every card under each of again/hard/good/easy, in one pass.
+
+    stability, difficulty, elapsed_days: [N] card states (NaN stability = new card)
+    returns dict of [4, N] tensors (rows in GRADES order):
+        stability, difficulty, interval (days; "again" is 0, relearn now)
+    """
+    S = torch.as_tensor(stability, dtype=torch.float32)
+    D = torch.as_tensor(difficulty, dtype=torch.float32)
+    elapsed_days = torch.as_tensor(elapsed_days, dtype=torch.float32)
+
+    grades = torch.arange(1.0, 5.0).unsqueeze(1)                      # [4, 1]
+    target = torch.tensor([targets[g] for g in GRADES]).unsqueeze(1)  # [4, 1]
+
+    is_new = torch.isnan(S)
+    S = torch.where(is_new, 1.0, S)
+    D = torch.where(torch.isnan(D) | is_new, 5.0, D)
+
+    R = retrievability(elapsed_days, S)
+    D_next = update_difficulty(D, grades, params)
+    S_next = torch.where(
+        grades == 1,
+        stability_fail(S, D_next, R, params),
+        stability_success(S, D_next, R, params)
+    )
+
+    # New cards start from the first-rating stability, difficulty stays neutral
+    S_next = torch.where(is_new, initial_stability(grades, params), S_next)
+    D_next = torch.where(is_new, D, D_next)
+
+    interval = torch.where(grades == 1, 0.0, predict_interval(S_next, target))
+
+    return {
+        "stability": S_next,
+        "difficulty": D_next,
+        "interval": interval,
+    }
@@ -0,0 +1,227 @@
+import argparse
+import json
+
+import numpy as np
+
+import fsrs_numpy
+from fsrs_synthetic import FIRST_GRADE_PROBS, bernoulli_grades
+
+# =========================
+# WORKLOAD SIMULATOR
+# =========================
+'''Forecasts the daily review load of a deck under one parameter set and
+    per-grade target retention. All cards live in NumPy arrays and every
+    simulated day is a handful of vectorized ops over the cards due that day.
+
+    Each day:
+        reviews     cards with due_day <= today (oldest first, up to
+                    max_reviews_per_day; the rest stay due)
+                    recall ~ Bernoulli(retrievability(elapsed, S)), grades as
+                    in fsrs_synthetic; next_state updates S and D; the card is
+                    rescheduled ceil(predict_interval(S, targets[grade])) days out
+        relearns    as in the app, "again" sets interval 0 and the card is due
+                    a minute later: it is reviewed again the same day
+                    (elapsed 0), graded and updated the same way, and
+                    rescheduled from that result (repeated until recalled)
+        new cards   up to new_per_day unseen cards get their first rating;
+                    a first "again" relearns the same day too
+
+    Per-day output: reviews, new cards, lapses, relearns, recall rate of
+    the day's scheduled reviews, expected number of cards memorized (sum of
+    R over learned cards) and time cost in seconds.
+'''
+
+# Seconds per review by grade (again, hard, good, easy), first-learn and relearn
+REVIEW_SECONDS = (23.0, 12.0, 8.0, 5.0)
+LEARN_SECONDS = 30.0
+RELEARN_SECONDS = 15.0
+
+
+# =========================
+# SIMULATION
+# =========================
+
+def _schedule(S, grade, targets):
+    interval = fsrs_numpy.predict_interval(S, targets[grade.astype(np.int64)])
+    return np.ceil(interval).astype(np.int64)
+
+
+def _relearn(cards, day, S, D, due_day, target, model, w, rng):
+    """
+    Same-day relearn reviews for cards just rated "again", in place;
+    returns how many reviews it took
+    """
+    n_reviews = 0
+    while len(cards):
+        elapsed = np.zeros(len(cards))
+        grade = bernoulli_grades(model.retrievability(elapsed, S[cards]), rng)
+        S[cards], D[cards] = model.next_state(S[cards], D[cards], elapsed, grade, w)
+        n_reviews += len(cards)
+
+        recalled = grade > 1
+        due_day[cards[recalled]] = day + _schedule(S[cards[recalled]], grade[recalled], target)
+        cards = cards[~recalled]
+    return n_reviews
+
+
+def simulate_workload(
+    n_cards=100_000,
+    weights=None,
+    days=3650,
+    new_per_day=20,
+    targets=fsrs_numpy.SRS_TARGETS,
+    max_reviews_per_day=None,
+    review_seconds=REVIEW_SECONDS,
+    learn_seconds=LEARN_SECONDS,
+    relearn_seconds=RELEARN_SECONDS,
+    model=fsrs_numpy.FSRS_MODEL,
+    memory_every=1,
+    seed=0
+):
+    """
+    Simulate a deck of n_cards for `days` days.
+
+    weights:      anything fsrs_numpy.load_weights accepts (one parameter set)
+    targets:      {"again"/"hard"/"good"/"easy": target retrievability}
+    model:        fsrs_numpy.Model (e.g. fsrs_eval.TS_MODEL for the app's formulas)
+    memory_every: compute "memorized" every N days (it touches every learned
+                  card); other days carry the last value forward
+
+    returns dict of [days] arrays plus "summary" totals
+    """
+    rng = np.random.default_rng(seed)
+    w = fsrs_numpy.load_weights(weights if weights is not None else fsrs_numpy.FSRSWeights())
+    target = fsrs_numpy.target_array(targets)
+    cost = np.array((0.0,) + tuple(review_seconds))
+
+    S = np.zeros(n_cards)
+    D = np.zeros(n_cards)
+    last_day = np.zeros(n_cards, dtype=np.int64)
+    # Unseen cards are never due; they're introduced in index order
+    due_day = np.full(n_cards, np.iinfo(np.int64).max)
+    n_learned = 0
+
+    out = {
+        name: np.zeros(days, dtype=dtype)
+        for name, dtype in (
+            ("reviews", np.int64),
+            ("new_cards", np.int64),
+            ("lapses", np.int64),
+            ("relearns", np.int64),
+            ("recall_rate", np.float64),
+            ("memorized", np.float64),
+            ("seconds", np.float64),
+        )
+    }
+    memorized = 0.0
+
+    for day in range(days):
+        # Due reviews among learned cards (all learned cards are a prefix)
+        due = np.flatnonzero(due_day[:n_learned] <= day)
+        if max_reviews_per_day is not None and len(due) > max_reviews_per_day:
+            due = due[np.argsort(due_day[due], kind="stable")[:max_reviews_per_day]]
+
+        if len(due):
+            elapsed = day - last_day[due]
+            R = model.retrievability(elapsed, S[due])
+            grade = bernoulli_grades(R, rng)
+            S[due], D[due] = model.next_state(S[due], D[due], elapsed, grade, w)
+
+            last_day[due] = day
+            due_day[due] = day + _schedule(S[due], grade, target)
+            relearns = _relearn(due[grade == 1], day, S, D, due_day, target, model, w, rng)
+
+            lapses = int(np.count_nonzero(grade == 1))
+            out["reviews"][day] = len(due)
+            out["lapses"][day] = lapses
+            out["relearns"][day] = relearns
+            out["recall_rate"][day] = 1.0 - lapses / len(due)
+            out["seconds"][day] += cost[grade].sum() + relearns * relearn_seconds
+        else:
+            out["recall_rate"][day] = np.nan
+
+        # New cards
+        n_new = min(new_per_day, n_cards - n_learned)
+        if n_new:
+            new = slice(n_learned, n_learned + n_new)
+            first = rng.choice(np.arange(1, 5), size=n_new, p=FIRST_GRADE_PROBS)
+            S[new] = model.initial_stability(first, w)
+            D[new] = 5.0
+            last_day[new] = day
+            due_day[new] = day + _schedule(S[new], first, target)
+            relearns = _relearn(np.flatnonzero(first == 1) + n_learned, day, S, D, due_day, target, model, w, rng)
+            n_learned += n_new
+
+            out["new_cards"][day] = n_new
+            out["relearns"][day] += relearns
+            out["seconds"][day] += n_new * learn_seconds + relearns * relearn_seconds
+
+        if day % memory_every == 0:
+            memorized = float(model.retrievability(day - last_day[:n_learned], S[:n_learned]).sum())
+        out["memorized"][day] = memorized
+
+    total_reviews = int(out["reviews"].sum())
+    out["summary"] = {
+        "n_cards": n_cards,
+        "days": days,
+        "total_reviews": total_reviews,
+        "total_relearns": int(out["relearns"].sum()),
+        "total_hours": float(out["seconds"].sum() / 3600),
+        "mean_daily_minutes": float(out["seconds"].mean() / 60),
+        "peak_daily_reviews": int(out["reviews"].max()) if days else 0,
+        "recall_rate": 1.0 - float(out["lapses"].sum()) / max(total_reviews, 1),
+        "final_memorized": memorized,
+        "mean_memorized": float(out["memorized"].mean()) if days else 0.0,
+    }
+    return out
+
+
+def weekly(result, name, agg=np.sum):
+    """
+    Collapse a per-day series into 7-day buckets (for printing/plots)
+    """
+    series = result[name]
+    n = len(series) // 7 * 7
+    return agg(series[:n].reshape(-1, 7), axis=1)
+
+
+if __name__ == "__main__":
+    import time
+
+    parser = argparse.ArgumentParser(description="Forecast daily FSRS review load for a deck")
+    parser.add_argument("--weights", default=None, help="fsrs_weights.pt or srs_params JSON (default weights if unset)")
+    parser.add_argument("--cards", type=int, default=100_000)
+    parser.add_argument("--days", type=int, default=3650)
+    parser.add_argument("--new-per-day", type=int, default=20)
+    parser.add_argument("--max-reviews-per-day", type=int, default=None)
+    parser.add_argument("--targets", default=None,
+                        help='JSON like {"again": 0.5, "hard": 0.95, "good": 0.9, "easy": 0.85}')
+    parser.add_argument("--ts-formulas", action="store_true", help="simulate with lib/srs.server.ts formulas")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None, help="write per-day series + summary JSON here")
+    args = parser.parse_args()
+
+    model = fsrs_numpy.FSRS_MODEL
+    if args.ts_formulas:
+        from fsrs_eval import TS_MODEL as model
+
+    start = time.perf_counter()
+    result = simulate_workload(
+        n_cards=args.cards,
+        weights=args.weights,
+        days=args.days,
+        new_per_day=args.new_per_day,
+        targets=json.loads(args.targets) if args.targets else fsrs_numpy.SRS_TARGETS,
+        max_reviews_per_day=args.max_reviews_per_day,
+        model=model,
+        seed=args.seed
+    )
+    elapsed = time.perf_counter() - start
+
+    for key, value in result["summary"].items():
+        print(f"{key:>20}: {value:.3f}" if isinstance(value, float) else f"{key:>20}: {value}")
+    print(f"Simulated {args.days} days in {elapsed:.2f}s")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({k: v.tolist() if isinstance(v, np.ndarray) else v for k, v in result.items()}, f)
@@ -0,0 +1,217 @@
+import csv
+import gzip
+import json
+import os
+import tempfile
+import zlib
+from datetime import datetime, timezone
+
+# =========================
+# card_reviews -> SEQUENCES
+# =========================
+'''Turns a CSV / JSONL export of the card_reviews table
+    (card_id, user_id, rating, reviewed_at) into the trainer's input format:
+    one [(elapsed_days, grade), ...] list per card, grouped by user.
+
+    Memory stays bounded:
+    - sorted exports (ORDER BY user_id) only hold the current user's reviews
+    - unsorted exports are first hash-partitioned by user_id into temp files,
+      then each partition is grouped on its own
+'''
+
+SECONDS_PER_DAY = 86400.0
+REQUIRED_COLUMNS = ("card_id", "user_id", "rating", "reviewed_at")
+
+
+# =========================
+# ROW READING
+# =========================
+
+def _open_text(path, mode="rt"):
+    if str(path).endswith(".gz"):
+        return gzip.open(path, mode, encoding="utf-8", newline="")
+    return open(path, mode, encoding="utf-8", newline="")
+
+
+def _is_jsonl(path):
+    name = str(path)
+    if name.endswith(".gz"):
+        name = name[:-3]
+    return name.endswith(".jsonl") or name.endswith(".ndjson")
+
+
+def parse_timestamp(value):
+    """
+    ISO / Postgres timestamptz text -> unix seconds (naive = UTC)
+    """
+    if isinstance(value, (int, float)):
+        return float(value)
+
+    ts = datetime.fromisoformat(str(value).strip())
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts.timestamp()
+
+
+def iter_review_rows(path):
+    """
+    Stream (user_id, card_id, reviewed_at_seconds, rating) tuples.
+    Rows without a rating (ungraded reviews) are skipped.
+    """
+    with _open_text(path) as f:
+        if _is_jsonl(path):
+            records = (json.loads(line) for line in f if line.strip())
+        else:
+            records = csv.DictReader(f)
+            missing = [c for c in REQUIRED_COLUMNS if c not in (records.fieldnames or [])]
+            if missing:
+                raise ValueError(f"{path}: missing columns {missing}")
+
+        for rec in records:
+            rating = rec.get("rating")
+            if rating in (None, ""):
+                continue
+
+            yield (
+                str(rec["user_id"]),
+                str(rec["card_id"]),
+                parse_timestamp(rec["reviewed_at"]),
+                int(rating),
+            )
+
+
+# =========================
+# SEQUENCE BUILDING
+# =========================
+
+def build_card_sequence(reviews, whole_days=True):
+    """
+    reviews: [(reviewed_at_seconds, rating), ...] for one card, any order
+    returns: [(elapsed_days, grade), ...] with elapsed 0 for the first review
+    """
+    reviews = sorted(reviews)
+
+    sequence = []
+    prev_ts = None
+    for ts, rating in reviews:
+        elapsed = 0.0 if prev_ts is None else (ts - prev_ts) / SECONDS_PER_DAY
+        if whole_days:
+            elapsed = int(elapsed)
+        sequence.append((elapsed, rating))
+        prev_ts = ts
+
+    return sequence
+
+
+def _group_sorted_rows(rows):
+    """
+    rows must arrive grouped by user_id; yields one user at a time
+    """
+    current_user = None
+    card_reviews = {}
+
+    for user_id, card_id, ts, rating in rows:
+        if user_id != current_user:
+            if current_user is not None:
+                yield current_user, card_reviews
+            current_user = user_id
+            card_reviews = {}
+
+        card_reviews.setdefault(card_id, []).append((ts, rating))
+
+    if current_user is not None:
+        yield current_user, card_reviews
+
+
+def _partition_rows(rows, tmp_dir, n_partitions, chunk_size):
+    """
+    Spill rows into n_partitions CSV files keyed by hash(user_id),
+    buffering at most chunk_size rows in memory.
+    """
+    paths = [os.path.join(tmp_dir, f"part-{i:04d}.csv") for i in range(n_partitions)]
+    files = [open(p, "w", encoding="utf-8", newline="") for p in paths]
+    writers = [csv.writer(f) for f in files]
+    buffers = [[] for _ in range(n_partitions)]
+    buffered = 0
+
+    def flush():
+        for writer, buf in zip(writers, buffers):
+            writer.writerows(buf)
+            buf.clear()
+
+    try:
+        for row in rows:
+            part = zlib.crc32(row[0].encode("utf-8")) % n_partitions
+            buffers[part].append(row)
+            buffered += 1
+            if buffered >= chunk_size:
+                flush()
+                buffered = 0
+        flush()
+    finally:
+        for f in files:
+            f.close()
+
+    return paths
+
+
+def _read_partition(path):
+    with open(path, encoding="utf-8", newline="") as f:
+        for user_id, card_id, ts, rating in csv.reader(f):
+            yield user_id, card_id, float(ts), int(rating)
+
+
+def iter_user_card_reviews(
+    path,
+    assume_sorted=False,
+    n_partitions=64,
+    chunk_size=100_000,
+    tmp_dir=None
+):
+    """
+    Yield (user_id, {card_id: [(reviewed_at_seconds, rating), ...]}) per user.
+
+    assume_sorted: export is ordered by user_id, so no spill pass is needed
+    n_partitions:  spill files for unsorted exports (peak memory ~ rows / n_partitions)
+    chunk_size:    rows buffered before each spill write
+    """
+    rows = iter_review_rows(path)
+
+    if assume_sorted:
+        yield from _group_sorted_rows(rows)
+        return
+
+    with tempfile.TemporaryDirectory(dir=tmp_dir) as spill_dir:
+        for part_path in _partition_rows(rows, spill_dir, n_partitions, chunk_size):
+            card_reviews_by_user = {}
+            for user_id, card_id, ts, rating in _read_partition(part_path):
+                card_reviews_by_user.setdefault(user_id, {}) \
+                    .setdefault(card_id, []).append((ts, rating))
+            os.remove(part_path)
+
+            yield from card_reviews_by_user.items()
+
+
+def iter_user_sequences(path, whole_days=True, **kwargs):
+    """
+    Yield (user_id, [(card_id, [(elapsed_days, grade), ...]), ...]) per user.
+
+    whole_days: floor elapsed days to integers like the hand-written sequences
+    kwargs:     see iter_user_card_reviews
+    """
+    for user_id, card_reviews in iter_user_card_reviews(path, **kwargs):
+        yield user_id, [
+            (card_id, build_card_sequence(reviews, whole_days))
+            for card_id, reviews in card_reviews.items()
+        ]
+
+
+def iter_sequences(path, min_length=2, **kwargs):
+    """
+    Flat stream of per-card sequences, ready for train_fsrs.
+    Sequences shorter than min_length carry no training signal and are dropped.
+    """
+    for _, cards in iter_user_sequences(path, **kwargs):
+        for _, sequence in cards:
+            if len(sequence) >= min_length:
+                yield sequence
@@ -0,0 +1,254 @@
+import argparse
+import json
+import os
+
+import numpy as np
+
+# =========================
+# COLUMNAR SEQUENCE CACHE
+# =========================
+'''On-disk review-sequence dataset, memory-mapped on load.
+
+    cache_dir/
+        meta.json         counts + user ids
+        elapsed.f32       all elapsed_days, concatenated        [n_reviews]
+        grade.u8          all grades, concatenated              [n_reviews]
+        offsets.i64       sequence i is reviews[offsets[i]:offsets[i+1]]
+        user_offsets.i64  user u owns sequences[user_offsets[u]:user_offsets[u+1]]
+
+    Opening a cache reads only meta.json; batches are gathered straight
+    from the mapped arrays into padded tensors for fsrs_padded_loss.
+'''
+
+CACHE_VERSION = 1
+
+
+# =========================
+# WRITING
+# =========================
+
+def write_sequence_cache(cache_dir, user_sequences, min_length=1):
+    """
+    user_sequences: iterable of (user_id, [(card_id, [(elapsed, grade), ...]), ...]),
+                    e.g. review_sequences.iter_user_sequences(...)
+    Streams to disk one user at a time.
+    """
+    def user_chunks():
+        for user_id, cards in user_sequences:
+            sequences = [seq for _, seq in cards if len(seq) >= min_length]
+            if not sequences:
+                continue
+
+            flat = [review for seq in sequences for review in seq]
+            yield (
+                [user_id],
+                np.array([e for e, _ in flat], dtype=np.float32),
+                np.array([g for _, g in flat], dtype=np.uint8),
+                np.array([len(seq) for seq in sequences], dtype=np.int64),
+                [len(sequences)],
+            )
+
+    return write_array_cache(cache_dir, user_chunks())
+
+
+def write_array_cache(cache_dir, chunks):
+    """
+    chunks: iterable of (user_ids, elapsed, grades, seq_lengths, user_n_sequences)
+            flat numpy blocks in cache order, for producers that already have
+            arrays (synthetic data) and shouldn't round-trip through lists.
+            user_n_sequences[u] is how many of the chunk's sequences user_ids[u] owns.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+
+    users = []
+    n_reviews = 0
+    n_sequences = 0
+
+    with open(os.path.join(cache_dir, "elapsed.f32"), "wb") as f_elapsed, \
+         open(os.path.join(cache_dir, "grade.u8"), "wb") as f_grade, \
+         open(os.path.join(cache_dir, "offsets.i64"), "wb") as f_offsets, \
+         open(os.path.join(cache_dir, "user_offsets.i64"), "wb") as f_users:
+
+        np.zeros(1, dtype=np.int64).tofile(f_offsets)
+        np.zeros(1, dtype=np.int64).tofile(f_users)
+
+        for user_ids, elapsed, grades, seq_lengths, user_n_sequences in chunks:
+            np.asarray(elapsed, dtype=np.float32).tofile(f_elapsed)
+            np.asarray(grades, dtype=np.uint8).tofile(f_grade)
+            (n_reviews + np.cumsum(seq_lengths, dtype=np.int64)).tofile(f_offsets)
+            (n_sequences + np.cumsum(user_n_sequences, dtype=np.int64)).tofile(f_users)
+
+            n_reviews += int(np.sum(seq_lengths))
+            n_sequences += len(seq_lengths)
+            users.extend(str(u) for u in user_ids)
+
+    with open(os.path.join(cache_dir, "meta.json"), "w") as f:
+        json.dump({
+            "version": CACHE_VERSION,
+            "n_reviews": n_reviews,
+            "n_sequences": n_sequences,
+            "users": users,
+        }, f)
+
+    return SequenceCache(cache_dir)
+
+
+def write_sequences(cache_dir, sequences, user_id=""):
+    """
+    Cache a plain list of sequences (all under one user id)
+    """
+    return write_sequence_cache(
+        cache_dir, [(user_id, [(None, seq) for seq in sequences])]
+    )
+
+
+# =========================
+# READING
+# =========================
+
+class SequenceCache:
+    def __init__(self, cache_dir):
+        with open(os.path.join(cache_dir, "meta.json")) as f:
+            meta = json.load(f)
+
+        if meta.get("version") != CACHE_VERSION:
+            raise ValueError(f"{cache_dir}: unsupported cache version {meta.get('version')}")
+
+        self.cache_dir = cache_dir
+        self.users = meta["users"]
+        self.n_reviews = meta["n_reviews"]
+
+        self.elapsed = self._map("elapsed.f32", np.float32, self.n_reviews)
+        self.grade = self._map("grade.u8", np.uint8, self.n_reviews)
+        self.offsets = self._map("offsets.i64", np.int64, meta["n_sequences"] + 1)
+        self.user_offsets = self._map("user_offsets.i64", np.int64, len(self.users) + 1)
+
+        self._user_index = {user_id: u for u, user_id in enumerate(self.users)}
+
+    def _map(self, name, dtype, count):
+        if count == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(
+            os.path.join(self.cache_dir, name), dtype=dtype, mode="r", shape=(count,)
+        )
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    @property
+    def lengths(self):
+        return np.diff(self.offsets)
+
+    def __getitem__(self, i):
+        """
+        Sequence i as [(elapsed_days, grade), ...] for the scalar trainer
+        """
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return list(zip(
+            self.elapsed[start:end].tolist(),
+            self.grade[start:end].tolist()
+        ))
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def user_range(self, user_id):
+        """
+        Sequence indices owned by user_id
+        """
+        u = self._user_index[user_id]
+        return range(int(self.user_offsets[u]), int(self.user_offsets[u + 1]))
+
+    def subset(self, indices):
+        return SequenceSubset(self, indices)
+
+    def user_sequences(self, user_id):
+        return self.subset(self.user_range(user_id))
+
+    def padded_arrays(self, indices):
+        """
+        Gather sequences into padded numpy arrays (elapsed, grades, lengths).
+        Padding matches fsrs_trained_batch.pad_sequences (elapsed=0, grade=3).
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        starts = self.offsets[indices]
+        lengths = self.offsets[indices + 1] - starts
+
+        T = int(lengths.max())
+        steps = np.arange(T)
+        mask = steps < lengths[:, None]
+        positions = np.where(mask, starts[:, None] + steps, 0)
+
+        elapsed = np.where(mask, self.elapsed[positions], 0.0).astype(np.float32)
+        grades = np.where(mask, self.grade[positions], 3).astype(np.float32)
+
+        return elapsed, grades, lengths
+
+    def padded_batch(self, indices):
+        """
+        Same as padded_arrays, as torch tensors ready for fsrs_padded_loss
+        """
+        import torch  # only the trainers need torch; NumPy readers stay torch-free
+
+        elapsed, grades, lengths = self.padded_arrays(indices)
+        return (
+            torch.from_numpy(elapsed),
+            torch.from_numpy(grades),
+            torch.from_numpy(lengths)
+        )
+
+
+class SequenceSubset:
+    """
+    Index view over some of a cache's sequences (one user, a split, ...)
+    """
+
+    def __init__(self, cache, indices):
+        self.cache = cache
+        self.indices = np.asarray(indices, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.indices)
+
+    @property
+    def lengths(self):
+        return self.cache.lengths[self.indices]
+
+    def __getitem__(self, i):
+        return self.cache[int(self.indices[i])]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def padded_arrays(self, indices):
+        return self.cache.padded_arrays(self.indices[np.asarray(indices, dtype=np.int64)])
+
+    def padded_batch(self, indices):
+        return self.cache.padded_batch(self.indices[np.asarray(indices, dtype=np.int64)])
+
+
+# =========================
+# CLI
+# =========================
+
+if __name__ == "__main__":
+    from review_sequences import iter_user_sequences
+
+    parser = argparse.ArgumentParser(
+        description="Build a memory-mapped sequence cache from a card_reviews export"
+    )
+    parser.add_argument("export", help="card_reviews CSV / JSONL export")
+    parser.add_argument("cache_dir")
+    parser.add_argument("--sorted", action="store_true", help="export is ordered by user_id")
+    parser.add_argument("--min-length", type=int, default=2)
+    args = parser.parse_args()
+
+    cache = write_sequence_cache(
+        args.cache_dir,
+        iter_user_sequences(args.export, assume_sorted=args.sorted),
+        min_length=args.min_length
+    )
+    print(f"Cached {len(cache)} sequences / {cache.n_reviews} reviews "
+          f"for {len(cache.users)} users in {args.cache_dir}")
@@ -1,3 +1,6 @@
+import os
+import tempfile
+
 import torch
 from fsrs_trained_batch import (
     train_fsrs,
@@ -8,6 +11,20 @@ from fsrs_trained_batch import (
     stability_fail,
     update_difficulty,
     predict_interval,
+    fsrs_sequence_loss,
+    fsrs_batch_loss,
+    pad_sequences,
+    preview_grades,
+    GRADES,
+    SRS_TARGETS,
+    split_sequences,
+    evaluate_loss,
+    FSRSDataset,
+    batch_loss,
+    make_batch,
+    fsrs_padded_loss,
+    recall_targets,
+    LeanScan,
 )
 
 ideal_sequences = [
@@ -306,6 +323,324 @@ def test_full_scheduling():
     #assert interval > 3
 
 
+# ---------------------------------------
+# padded engine matches per-sequence loss
+# ---------------------------------------
+def test_padded_loss_matches_sequence_loss():
+    params = FSRSParameters()
+    sequences = ALL_SEQUENCES + [[(0, 3)]]
+
+    reference = sum(
+        fsrs_sequence_loss(seq, params) for seq in sequences
+    ) / len(sequences)
+    padded = fsrs_batch_loss(sequences, params)
+
+    print("Per-sequence loss:", reference.item())
+    print("Padded loss      :", padded.item())
+
+    assert torch.isclose(reference, padded, atol=1e-5)
+
+    ref_grads = torch.autograd.grad(reference, params.parameters(), allow_unused=True)
+    pad_grads = torch.autograd.grad(padded, params.parameters(), allow_unused=True)
+
+    for g_ref, g_pad in zip(ref_grads, pad_grads):
+        if g_ref is None:
+            assert g_pad is None
+        else:
+            assert torch.allclose(g_ref, g_pad, atol=1e-5)
+
+
+def test_pad_sequences_shapes():
+    elapsed, grades, lengths = pad_sequences([[(0, 3), (2, 4)], [(0, 1)]])
+
+    assert elapsed.shape == (2, 2)
+    assert grades.shape == (2, 2)
+    assert lengths.tolist() == [2, 1]
+    assert grades[1, 1] == 3.0
+
+
+# ---------------------------------------
+# packed parameters: legacy state_dict + batched form
+# ---------------------------------------
+def test_legacy_state_dict_roundtrip():
+    params = FSRSParameters()
+    with torch.no_grad():
+        params.weights[4] = 1.5
+
+    legacy = params.legacy_state_dict()
+    assert set(legacy) == set(FSRSParameters.WEIGHT_NAMES)
+
+    restored = FSRSParameters()
+    restored.load_state_dict(legacy)
+
+    assert torch.allclose(restored.weights, params.weights)
+    assert restored.to_params_json()["w4"] == 1.5
+
+
+def test_batched_params_match_single_sets():
+    slow = FSRSParameters()
+    fast = FSRSParameters()
+    with torch.no_grad():
+        fast.weights[4] = 1.1
+
+    stacked = FSRSParameters.stack([slow, fast])
+    losses = fsrs_batch_loss(ALL_SEQUENCES, stacked)
+
+    print("Batched losses:", losses.tolist())
+
+    assert losses.shape == (2,)
+    assert torch.isclose(losses[0], fsrs_batch_loss(ALL_SEQUENCES, slow), atol=1e-6)
+    assert torch.isclose(losses[1], fsrs_batch_loss(ALL_SEQUENCES, fast), atol=1e-6)
+
+
+# ---------------------------------------
+# batched four-grade preview vs scalar functions
+# ---------------------------------------
+def test_preview_grades_matches_scalar_path():
+    params = FSRSParameters()
+
+    S = torch.tensor([3.0, 12.0, float("nan")])
+    D = torch.tensor([5.0, 7.5, float("nan")])
+    elapsed = torch.tensor([2.0, 20.0, 0.0])
+
+    preview = preview_grades(S, D, elapsed, params)
+
+    assert preview["stability"].shape == (4, 3)
+
+    for row, name in enumerate(GRADES):
+        grade = torch.tensor(float(row + 1))
+        for card in range(2):
+            R = retrievability(elapsed[card], S[card])
+            D_new = update_difficulty(D[card], grade, params)
+            if row == 0:
+                S_new = stability_fail(S[card], D_new, R, params)
+                expected_interval = 0.0
+            else:
+                S_new = stability_success(S[card], D_new, R, params)
+                expected_interval = predict_interval(S_new, SRS_TARGETS[name]).item()
+
+            assert torch.isclose(preview["stability"][row, card], S_new, atol=1e-4)
+            assert torch.isclose(preview["difficulty"][row, card], D_new, atol=1e-6)
+            assert abs(preview["interval"][row, card].item() - expected_interval) < 1e-3
+
+        # new card: first-rating stability, neutral difficulty
+        assert torch.isclose(preview["stability"][row, 2], initial_stability(grade, params))
+        assert preview["difficulty"][row, 2] == 5.0
+
+    print("Preview intervals:", preview["interval"].tolist())
+
+
+# ---------------------------------------
+# checkpoint + resume reproduces an uninterrupted run
+# ---------------------------------------
+def test_checkpoint_resume_is_exact():
+    with tempfile.TemporaryDirectory() as tmp:
+        checkpoint = os.path.join(tmp, "ckpt.pt")
+
+        torch.manual_seed(0)
+        straight = train_fsrs(ALL_SEQUENCES, epochs=4, batch_size=4, save_path=None)
+
+        torch.manual_seed(0)
+        train_fsrs(
+            ALL_SEQUENCES, epochs=2, batch_size=4, save_path=None,
+            checkpoint_path=checkpoint
+        )
+
+        torch.manual_seed(123)  # resume must restore the RNG itself
+        resumed = train_fsrs(
+            ALL_SEQUENCES, epochs=4, batch_size=4, save_path=None,
+            checkpoint_path=checkpoint, resume=True
+        )
+
+    assert torch.equal(straight.weights, resumed.weights)
+
+
+# ---------------------------------------
+# validation split + early stopping + time budget
+# ---------------------------------------
+def test_validation_early_stopping_returns_best():
+    train_set, val_set = split_sequences(ALL_SEQUENCES, 0.25)
+    assert len(train_set) + len(val_set) == len(ALL_SEQUENCES)
+    assert not set(train_set.indices) & set(val_set.indices)
+
+    params = train_fsrs(
+        ALL_SEQUENCES, epochs=30, lr=0.2, batch_size=4, save_path=None,
+        val_fraction=0.25, patience=2
+    )
+
+    best_val = evaluate_loss(val_set, params)
+    print("Best validation loss:", best_val)
+    assert best_val <= evaluate_loss(val_set, FSRSParameters()) + 1e-6
+
+
+def test_time_budget_stops_early():
+    from fsrs_callbacks import Callback, MetricsHistory
+
+    params = FSRSParameters()
+    snapshots = []
+
+    class Snapshots(Callback):
+        def on_epoch_end(self, epoch, stats):
+            snapshots.append((stats["val_loss"], params.weights.detach().clone()))
+
+    history = MetricsHistory()
+    train_fsrs(
+        ALL_SEQUENCES * 4, epochs=1000, lr=0.2, batch_size=2, save_path=None,
+        params=params, val_fraction=0.25, time_budget=0.5, verbose=False,
+        callbacks=[history, Snapshots()]
+    )
+    print("Epochs before the budget ran out:", len(history.epochs))
+    assert history.summary["stop_reason"] == "time budget reached"
+    assert history.summary["epochs_run"] < 1000
+
+    # The returned weights are the best-validation snapshot (the starting
+    # weights if no epoch beat them)
+    best_val, best_weights = min(snapshots, key=lambda s: s[0])
+    if history.summary["best_val"] < best_val:
+        best_weights = FSRSParameters().weights
+    assert torch.equal(params.weights, best_weights)
+
+
+# ---------------------------------------
+# pre-tensorized dataset + DataLoader workers
+# ---------------------------------------
+def test_pretensorized_dataset_matches_plain_batches():
+    dataset = FSRSDataset(ALL_SEQUENCES)
+    params = FSRSParameters()
+    idx = [3, 0, 5]
+
+    elapsed, grades, lengths, loss_start, targets, mask = dataset[idx]
+    plain = pad_sequences([ALL_SEQUENCES[j] for j in idx])
+    assert torch.equal(elapsed, plain[0]) and torch.equal(grades, plain[1])
+    assert torch.equal(lengths, plain[2]) and loss_start is None
+    assert torch.equal(batch_loss(dataset[idx], params), batch_loss(plain, params))
+
+    train_set, _ = split_sequences(ALL_SEQUENCES, 0.25)
+    view = FSRSDataset(train_set)
+    assert torch.equal(view[[0, 1]][0], make_batch(train_set, [0, 1])[0])
+
+
+def test_dataloader_training_matches_plain_loop():
+    runs = []
+    for kwargs in ({"pretensorize": False}, {}, {"num_workers": 2}):
+        torch.manual_seed(0)
+        params = train_fsrs(
+            ALL_SEQUENCES * 4, epochs=3, batch_size=4, save_path=None,
+            val_fraction=0.25, verbose=False, **kwargs
+        )
+        runs.append(params.weights)
+
+    assert torch.equal(runs[0], runs[1])
+    assert torch.equal(runs[0], runs[2])
+
+
+# ---------------------------------------
+# compiled scan backend
+# ---------------------------------------
+def test_compiled_backend_matches_eager():
+    params = FSRSParameters()
+    batch = pad_sequences(ALL_SEQUENCES * 3)
+    loss_start = torch.tensor([1, 3, 2] * (len(ALL_SEQUENCES)))
+
+    for extra in ((), (loss_start,)):
+        grads = []
+        for backend in ("eager", "compile"):
+            params.weights.grad = None
+            loss = fsrs_padded_loss(*batch, params, *extra, backend=backend)
+            loss.backward()
+            grads.append((loss.detach(), params.weights.grad.clone()))
+
+        (eager_loss, eager_grad), (compiled_loss, compiled_grad) = grads
+        print("eager vs compiled:", eager_loss.item(), compiled_loss.item())
+        assert torch.allclose(eager_loss, compiled_loss, rtol=1e-5)
+        assert torch.allclose(eager_grad, compiled_grad, rtol=1e-4, atol=1e-6)
+
+    torch.manual_seed(0)
+    eager = train_fsrs(ALL_SEQUENCES * 4, epochs=3, batch_size=4, save_path=None, verbose=False)
+    torch.manual_seed(0)
+    compiled = train_fsrs(
+        ALL_SEQUENCES * 4, epochs=3, batch_size=4, save_path=None, verbose=False, backend="compile"
+    )
+    assert torch.allclose(eager.weights, compiled.weights, atol=1e-4)
+
+
+# ---------------------------------------
+# memory-lean custom-autograd scan
+# ---------------------------------------
+def test_lean_scan_gradients_match_autograd():
+    torch.manual_seed(0)
+    batch = pad_sequences(ALL_SEQUENCES * 3)
+    loss_start = torch.tensor([1, 3, 2] * (len(ALL_SEQUENCES)))
+    noisy = FSRSParameters().weights.detach() + 0.1 * torch.randn(3, 12)
+
+    for params in (FSRSParameters(), FSRSParameters(noisy)):
+        for extra in ((), (loss_start,)):
+            results = []
+            for backend in ("eager", "lean"):
+                params.weights.grad = None
+                loss = fsrs_padded_loss(*batch, params, *extra, backend=backend)
+                loss.sum().backward()
+                results.append((loss.detach(), params.weights.grad.clone()))
+
+            (eager_loss, eager_grad), (lean_loss, lean_grad) = results
+            assert torch.allclose(eager_loss, lean_loss)
+            assert torch.allclose(eager_grad, lean_grad, rtol=1e-4, atol=1e-7)
+
+    # float64 finite differences, including an inactive (padded) tail
+    B, T = 4, 6
+    grades = torch.randint(1, 5, (B, T)).double()
+    elapsed = torch.rand(B, T).double() * 5
+    active = torch.ones(B, T, dtype=torch.bool)
+    active[0, 3:] = False
+    S0 = (torch.rand(B) * 3 + 0.5).double().requires_grad_()
+    weights = FSRSParameters().weights.detach().double().requires_grad_()
+
+    assert torch.autograd.gradcheck(
+        LeanScan.apply, (S0, weights, elapsed, grades, recall_targets(grades), active, active)
+    )
+
+
+# ---------------------------------------
+# training instrumentation
+# ---------------------------------------
+def test_metrics_sink_and_profiler():
+    import contextlib
+    import io
+    import json
+
+    from fsrs_callbacks import JSONLSink, MetricsHistory, TorchProfiler, read_jsonl
+
+    with tempfile.TemporaryDirectory() as tmp:
+        log_path = os.path.join(tmp, "metrics.jsonl")
+        trace_path = os.path.join(tmp, "trace.json")
+        history = MetricsHistory()
+
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            train_fsrs(
+                ALL_SEQUENCES * 4, epochs=3, batch_size=4, save_path=None, verbose=False,
+                val_fraction=0.25,
+                callbacks=[JSONLSink(log_path, batches=True), history, TorchProfiler(trace_path, epoch=1)]
+            )
+        assert out.getvalue() == ""
+
+        epochs = read_jsonl(log_path, "epoch")
+        batches = read_jsonl(log_path, "batch")
+        print(epochs[-1])
+
+        assert [e["epoch"] for e in epochs] == [0, 1, 2]
+        assert [e["loss"] for e in epochs] == [e["loss"] for e in history.epochs]
+        assert len(batches) == sum(e["batches"] for e in epochs)
+        for e in epochs:
+            assert e["reviews_per_sec"] > 0 and e["grad_norm_max"] >= e["grad_norm_mean"] > 0
+            assert e["forward_s"] + e["backward_s"] + e["optimizer_s"] <= e["seconds"]
+            assert "val_loss" in e
+        assert read_jsonl(log_path, "train_end")[0]["epochs_run"] == 3
+
+        with open(trace_path) as f:
+            assert json.load(f)["traceEvents"]
+
+
 # ---------------------------------------
 # manual run
 # ---------------------------------------
@@ -321,3 +656,16 @@ if __name__ == "__main__":
     test_target_recall_effect()
     test_batch_training_consistency()
     test_full_scheduling()
+    test_padded_loss_matches_sequence_loss()
+    test_pad_sequences_shapes()
+    test_legacy_state_dict_roundtrip()
+    test_batched_params_match_single_sets()
+    test_preview_grades_matches_scalar_path()
+    test_checkpoint_resume_is_exact()
+    test_validation_early_stopping_returns_best()
+    test_time_budget_stops_early()
+    test_pretensorized_dataset_matches_plain_batches()
+    test_dataloader_training_matches_plain_loop()
+    test_compiled_backend_matches_eager()
+    test_lean_scan_gradients_match_autograd()
+    test_metrics_sink_and_profiler()
@@ -0,0 +1,254 @@
+import json
+import os
+import tempfile
+
+import torch
+
+from fit_users import fit_users
+from fsrs_finetune import finetune, collect_new_reviews, load_params
+from batch_sampler import LengthBucketSampler, padding_efficiency
+from fsrs_trained_batch import (
+    FSRSParameters,
+    fsrs_batch_loss,
+    fsrs_padded_loss,
+    make_batch,
+    pad_sequences,
+)
+from review_sequences import parse_timestamp
+from review_sequences import (
+    build_card_sequence,
+    iter_user_sequences,
+    iter_sequences,
+)
+from sequence_cache import SequenceCache, write_sequence_cache, write_sequences
+
+DAY = 86400
+
+# card_reviews export rows: (card_id, user_id, rating, reviewed_at)
+REVIEW_ROWS = [
+    ("c1", "u1", 3, "2026-01-01 09:00:00+00"),
+    ("c2", "u2", 4, "2026-01-01 10:00:00+00"),
+    ("c1", "u1", 3, "2026-01-02 09:00:00+00"),
+    ("c1", "u1", 1, "2026-01-05 09:00:00+00"),
+    ("c1", "u1", 3, "2026-01-05 09:10:00+00"),
+    ("c2", "u2", 3, "2026-01-03 11:00:00+00"),
+    ("c3", "u1", 2, "2026-01-04 08:00:00+00"),
+]
+
+
+def write_csv_export(path, rows):
+    with open(path, "w") as f:
+        f.write("card_id,user_id,rating,reviewed_at\n")
+        for card_id, user_id, rating, reviewed_at in rows:
+            f.write(f"{card_id},{user_id},{rating},{reviewed_at}\n")
+
+
+def write_jsonl_export(path, rows):
+    with open(path, "w") as f:
+        for card_id, user_id, rating, reviewed_at in rows:
+            f.write(json.dumps({
+                "card_id": card_id,
+                "user_id": user_id,
+                "rating": rating,
+                "reviewed_at": reviewed_at,
+            }) + "\n")
+
+
+# ---------------------------------------
+# elapsed days per card
+# ---------------------------------------
+def test_build_card_sequence():
+    reviews = [(3 * DAY, 3), (0, 3), (DAY, 3), (3 * DAY + 600, 1)]
+
+    assert build_card_sequence(reviews) == [(0, 3), (1, 3), (2, 3), (0, 1)]
+
+    fractional = build_card_sequence([(0, 3), (DAY // 2, 2)], whole_days=False)
+    assert fractional == [(0.0, 3), (0.5, 2)]
+
+
+# ---------------------------------------
+# unsorted CSV export, spilled to partitions
+# ---------------------------------------
+def test_user_sequences_from_unsorted_csv():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "card_reviews.csv")
+        write_csv_export(path, REVIEW_ROWS)
+
+        users = dict(iter_user_sequences(path, n_partitions=3, chunk_size=2))
+
+    print("Users:", users)
+
+    assert set(users) == {"u1", "u2"}
+    assert dict(users["u1"])["c1"] == [(0, 3), (1, 3), (3, 1), (0, 3)]
+    assert dict(users["u1"])["c3"] == [(0, 2)]
+    assert dict(users["u2"])["c2"] == [(0, 4), (2, 3)]
+
+
+# ---------------------------------------
+# sorted JSONL export, single streaming pass
+# ---------------------------------------
+def test_sequences_from_sorted_jsonl():
+    rows = sorted(REVIEW_ROWS, key=lambda r: r[1])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "card_reviews.jsonl")
+        write_jsonl_export(path, rows)
+
+        sequences = sorted(iter_sequences(path, assume_sorted=True))
+
+    assert sequences == [
+        [(0, 3), (1, 3), (3, 1), (0, 3)],
+        [(0, 4), (2, 3)],
+    ]
+
+
+# ---------------------------------------
+# memory-mapped cache round trip
+# ---------------------------------------
+def test_sequence_cache_roundtrip():
+    sequences = [
+        [(0, 3), (1, 3), (4, 2)],
+        [(0, 1), (0, 3)],
+        [(0, 4), (2, 4), (6, 3), (15, 3)],
+    ]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        write_sequences(tmp, sequences)
+        cache = SequenceCache(tmp)
+
+        assert len(cache) == 3
+        assert cache.lengths.tolist() == [3, 2, 4]
+        assert [cache[i] for i in range(3)] == [
+            [(float(e), g) for e, g in seq] for seq in sequences
+        ]
+
+        params = FSRSParameters()
+        cached_loss = fsrs_padded_loss(*make_batch(cache, [2, 0, 1]), params)
+        list_loss = fsrs_batch_loss([sequences[2], sequences[0], sequences[1]], params)
+
+        print("Cached loss:", cached_loss.item(), "List loss:", list_loss.item())
+        assert torch.isclose(cached_loss, list_loss)
+
+
+def test_sequence_cache_user_index():
+    with tempfile.TemporaryDirectory() as tmp:
+        export = os.path.join(tmp, "card_reviews.csv")
+        write_csv_export(export, REVIEW_ROWS)
+
+        cache = write_sequence_cache(
+            os.path.join(tmp, "cache"),
+            iter_user_sequences(export, n_partitions=2),
+            min_length=2
+        )
+
+        assert sorted(cache.users) == ["u1", "u2"]
+        assert len(cache) == 2
+        assert cache[cache.user_range("u2")[0]] == [(0.0, 4), (2.0, 3)]
+
+
+# ---------------------------------------
+# length buckets: full coverage, little padding
+# ---------------------------------------
+def test_length_bucket_sampler():
+    lengths = [2, 3, 500, 2, 40, 41, 3, 480, 2, 45] * 10
+    sampler = LengthBucketSampler(lengths, batch_size=4)
+
+    batches = list(sampler)
+    seen = sorted(i for batch in batches for i in batch)
+
+    print("Bucketed efficiency:", sampler.last_efficiency)
+
+    assert seen == list(range(len(lengths)))
+    assert len(batches) == len(sampler)
+    assert sampler.last_efficiency > 0.8
+
+    naive = [list(range(i, i + 4)) for i in range(0, len(lengths), 4)]
+    assert sampler.last_efficiency > padding_efficiency(lengths, naive)
+
+
+# ---------------------------------------
+# per-user fitting in a process pool
+# ---------------------------------------
+def test_fit_users_writes_params_json():
+    user_sequences = [
+        ("u1", [(None, [(0, 3), (1, 3), (3, 4), (8, 3)]), (None, [(0, 2), (1, 1), (0, 3)])]),
+        ("u2", [(None, [(0, 4), (3, 4), (9, 3)])]),
+        ("u3", [(None, [(0, 3), (2, 3)])]),
+    ]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_dir = os.path.join(tmp, "cache")
+        out_dir = os.path.join(tmp, "params")
+        write_sequence_cache(cache_dir, user_sequences)
+
+        summary = fit_users(cache_dir, out_dir, workers=2, min_reviews=3, epochs=2, batch_size=4)
+
+        assert set(summary) == {"u1", "u2"}
+        assert summary["u1"]["n_reviews"] == 7
+
+        with open(os.path.join(out_dir, "u1.json")) as f:
+            params = json.load(f)
+
+    print("u1 params:", params)
+
+    assert set(params) == set(FSRSParameters.WEIGHT_NAMES)
+    assert all(isinstance(v, float) for v in params.values())
+
+
+# ---------------------------------------
+# loss_start only scores the tail of each sequence
+# ---------------------------------------
+def test_loss_start_masks_old_reviews():
+    params = FSRSParameters()
+    sequences = [[(0, 3), (1, 3), (4, 2), (9, 3)], [(0, 2), (1, 1)]]
+    elapsed, grades, lengths = pad_sequences(sequences)
+
+    full = fsrs_padded_loss(elapsed, grades, lengths, params)
+    same = fsrs_padded_loss(elapsed, grades, lengths, params, torch.tensor([1, 1]))
+    tail = fsrs_padded_loss(elapsed, grades, lengths, params, torch.tensor([3, 1]))
+
+    assert torch.isclose(full, same)
+    assert not torch.isclose(full, tail)
+
+
+# ---------------------------------------
+# warm-start fine-tuning past a watermark
+# ---------------------------------------
+def test_finetune_advances_watermark():
+    watermark = parse_timestamp("2026-01-02 12:00:00+00")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        export = os.path.join(tmp, "card_reviews.csv")
+        write_csv_export(export, REVIEW_ROWS)
+
+        dataset, newest, n_new = collect_new_reviews(export, watermark)
+        assert n_new == 4
+        assert newest == parse_timestamp("2026-01-05 09:10:00+00")
+        # c1 is scored from its 3rd review, c2 from its 2nd; c3 has one review
+        assert sorted(dataset.loss_start) == [1, 2]
+
+        weights = os.path.join(tmp, "params.json")
+        with open(weights, "w") as f:
+            json.dump(FSRSParameters().to_params_json(), f)
+
+        _, manifest = finetune(weights, export, watermark=watermark, epochs=3)
+        assert manifest["watermark"] == newest
+        assert manifest["n_reviews_seen"] == 4
+
+        _, manifest = finetune(weights, export, epochs=3)
+        assert manifest["runs"][-1]["n_new_reviews"] == 0
+        assert len(manifest["runs"]) == 2
+
+        print("Fine-tuned w4:", load_params(weights).w4.item())
+
+
+if __name__ == "__main__":
+    test_build_card_sequence()
+    test_user_sequences_from_unsorted_csv()
+    test_sequences_from_sorted_jsonl()
+    test_sequence_cache_roundtrip()
+    test_sequence_cache_user_index()
+    test_length_bucket_sampler()
+    test_fit_users_writes_params_json()
+    test_loss_start_masks_old_reviews()
+    test_finetune_advances_watermark()
@@ -0,0 +1,85 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+import torch
+
+import fsrs_numpy
+from fsrs_trained_batch import (
+    FSRSParameters,
+    retrievability,
+    initial_stability,
+    stability_success,
+    stability_fail,
+    update_difficulty,
+    predict_interval,
+)
+from test_fsrs_batch import ALL_SEQUENCES
+
+
+def torch_replay(seq, params):
+    S = initial_stability(torch.tensor(float(seq[0][1])), params)
+    D = torch.tensor(5.0)
+    for elapsed, grade in seq[1:]:
+        R = retrievability(torch.tensor(float(elapsed)), S)
+        D = update_difficulty(D, torch.tensor(float(grade)), params)
+        if grade == 1:
+            S = stability_fail(S, D, R, params)
+        else:
+            S = stability_success(S, D, R, params)
+    return S.item(), D.item()
+
+
+# ---------------------------------------
+# NumPy replay matches the torch recurrence
+# ---------------------------------------
+def test_numpy_replay_matches_torch():
+    params = FSRSParameters()
+    with torch.no_grad():
+        params.weights[4] = 1.0
+
+    weights = fsrs_numpy.load_weights(params.to_params_json())
+    out = fsrs_numpy.replay_sequences(ALL_SEQUENCES, weights, days_since_last=3.0)
+
+    for i, seq in enumerate(ALL_SEQUENCES):
+        S, D = torch_replay(seq, params)
+        assert np.isclose(out["stability"][i], S, rtol=1e-5)
+        assert np.isclose(out["difficulty"][i], D, rtol=1e-5)
+
+    S = torch.tensor(out["stability"], dtype=torch.float32)
+    assert np.allclose(out["interval"], predict_interval(S).numpy(), rtol=1e-5)
+    assert np.allclose(out["retrievability"], retrievability(3.0, S).numpy(), rtol=1e-5)
+
+
+# ---------------------------------------
+# per-card weights and empty histories
+# ---------------------------------------
+def test_numpy_replay_per_card_weights():
+    sequences = [[(0, 3), (2, 3)], [], [(0, 3), (2, 3)]]
+
+    fast = fsrs_numpy.FSRSWeights()
+    fast_weights = fast.weights.copy()
+    fast_weights[4] = 2.0
+    per_card = np.stack([fsrs_numpy.FSRSWeights().weights, fast_weights, fast_weights])
+
+    out = fsrs_numpy.replay_sequences(sequences, per_card)
+
+    assert np.isnan(out["stability"][1])
+    assert out["stability"][2] > out["stability"][0]
+
+
+def test_numpy_engine_is_torch_free():
+    code = (
+        "import sys, fsrs_numpy, sequence_cache; "
+        "fsrs_numpy.replay_sequences([[(0, 3), (1, 3)]]); "
+        "sys.exit('torch' in sys.modules)"
+    )
+    result = subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(__file__) or ".")
+    assert result.returncode == 0
+
+
+if __name__ == "__main__":
+    test_numpy_replay_matches_torch()
+    test_numpy_replay_per_card_weights()
+    test_numpy_engine_is_torch_free()
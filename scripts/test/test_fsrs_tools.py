@@ -0,0 +1,575 @@
+import asyncio
+import os
+import tempfile
+
+import numpy as np
+import torch
+
+import bench_fsrs
+import fsrs_eval
+import fsrs_numpy
+import fsrs_param_store
+import fsrs_recompute
+import fsrs_report
+import fsrs_service
+import fsrs_synthetic
+import fsrs_tables
+import fsrs_retention
+import fsrs_workload
+from fsrs_trained_batch import (
+    FSRSParameters,
+    train_fsrs,
+    evaluate_loss,
+    fit_lbfgs,
+    initial_stability,
+    predict_interval,
+    retrievability,
+    stability_fail,
+    stability_success,
+    update_difficulty,
+)
+from review_sequences import iter_sequences, iter_user_sequences
+from sequence_cache import SequenceCache, write_array_cache
+
+
+# ---------------------------------------
+# benchmark suite
+# ---------------------------------------
+def test_synthetic_arrays_layout():
+    elapsed, grades, offsets = bench_fsrs.synthetic_arrays(500, "heavy", seed=1)
+
+    assert len(offsets) == 501
+    assert offsets[-1] == len(elapsed) == len(grades)
+    assert np.all(np.diff(offsets) >= 2)
+    assert np.all(elapsed[offsets[:-1]] == 0)
+
+
+def test_benchmark_case_and_baseline():
+    report = bench_fsrs.run_suite(
+        engines=["batch", "numpy_replay"],
+        sizes=[200],
+        dists=["uniform"],
+        isolate=False,
+        warmup=0
+    )
+    results = report["results"]
+    print(results)
+
+    assert [r["engine"] for r in results] == ["batch", "numpy_replay"]
+    assert all(r["reviews_per_sec"] > 0 and r["peak_rss_mb"] > 0 for r in results)
+
+    assert bench_fsrs.compare_to_baseline(report, report) == []
+
+    slower = {"results": [dict(r, reviews_per_sec=r["reviews_per_sec"] / 2) for r in results]}
+    regressions = bench_fsrs.compare_to_baseline(slower, report)
+    assert [r["metric"] for r in regressions] == ["reviews_per_sec", "reviews_per_sec"]
+
+
+# ---------------------------------------
+# synthetic review logs
+# ---------------------------------------
+TRUE_PARAMS = {"w4": 1.2, "init_s_good": 4.0}
+
+
+def test_synthetic_export_matches_cache():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = fsrs_synthetic.write_synthetic_log(
+            os.path.join(tmp, "cache"), 30, cards_per_learner=5, chunk_learners=8, params=TRUE_PARAMS
+        )
+        export = fsrs_synthetic.write_synthetic_log(
+            os.path.join(tmp, "reviews.csv"), 30, fmt="csv", cards_per_learner=5, chunk_learners=8, params=TRUE_PARAMS
+        )
+
+        cached = sorted(map(tuple, SequenceCache(cache)))
+        exported = sorted(map(tuple, iter_sequences(export)))
+        print(len(cached), "sequences")
+
+        assert cached == exported
+        with open(os.path.join(tmp, "reviews.csv.truth.json")) as f:
+            assert f.read().count('"w4": 1.2') == 1
+
+
+def test_fitting_recovers_true_weights():
+    sim = fsrs_synthetic.simulate_learners(
+        300, cards_per_learner=20, params=TRUE_PARAMS, grading="calibrated", seed=1
+    )
+    offsets = np.concatenate([[0], np.cumsum(sim["lengths"])])
+    sequences = [
+        list(zip(sim["elapsed"][a:b].tolist(), sim["grade"][a:b].tolist()))
+        for a, b in zip(offsets[:-1], offsets[1:])
+    ]
+
+    truth = FSRSParameters.from_params_json(TRUE_PARAMS)
+    start = FSRSParameters()
+    assert evaluate_loss(sequences, truth) < evaluate_loss(sequences, start)
+
+    fitted = train_fsrs(
+        sequences, epochs=4, lr=0.05, batch_size=256, save_path=None,
+        bucket_by_length=True, verbose=False, params=FSRSParameters()
+    )
+    report = fsrs_synthetic.weight_recovery(TRUE_PARAMS, fitted, start)
+    print({name: round(report[name]["abs_error"], 3) for name in TRUE_PARAMS})
+
+    for name in TRUE_PARAMS:
+        assert report[name]["abs_error"] < report[name]["start_error"]
+
+
+def test_lbfgs_full_batch_fit():
+    sim = fsrs_synthetic.simulate_learners(
+        150, cards_per_learner=20, params=TRUE_PARAMS, grading="calibrated", seed=4
+    )
+    offsets = np.concatenate([[0], np.cumsum(sim["lengths"])])
+    sequences = [
+        list(zip(sim["elapsed"][a:b].tolist(), sim["grade"][a:b].tolist()))
+        for a, b in zip(offsets[:-1], offsets[1:])
+    ]
+
+    fitted, info = fit_lbfgs(sequences, FSRSParameters(), max_evals=60, verbose=False)
+    print(info)
+
+    assert info["stop_reason"] == "converged" and info["n_evals"] <= 60
+    assert info["loss"] < evaluate_loss(sequences, FSRSParameters.from_params_json(TRUE_PARAMS))
+
+    via_train = train_fsrs(sequences, method="lbfgs", save_path=None, verbose=False)
+    assert torch.allclose(via_train.weights, fitted.weights)
+
+    # a start outside the bounds is pulled inside and stays there
+    outside, _ = fit_lbfgs(sequences, FSRSParameters.from_params_json({"w1": 5.0}), max_evals=10, verbose=False)
+    low, high = np.array(FSRSParameters.WEIGHT_BOUNDS).T
+    weights = outside.weights.detach().numpy()
+    assert np.all(weights >= low) and np.all(weights <= high)
+
+
+# ---------------------------------------
+# evaluation harness
+# ---------------------------------------
+def test_metrics_match_definitions():
+    rng = np.random.default_rng(0)
+    p = np.round(rng.random(500), 1)  # plenty of ties
+    y = (rng.random(500) < p).astype(np.float64)
+
+    pos, neg = p[y == 1], p[y == 0]
+    pairwise = (pos[:, None] > neg).mean() + 0.5 * (pos[:, None] == neg).mean()
+    assert np.isclose(fsrs_eval.auc(p, y), pairwise)
+
+    table = fsrs_eval.calibration_table(p, y, n_bins=10)
+    assert sum(table["count"]) == 500
+    assert fsrs_eval.rmse_bins(dict(table, recall_rate=table["mean_predicted"])) == 0.0
+
+
+def test_evaluation_prefers_generating_weights():
+    sim = fsrs_synthetic.simulate_learners(200, cards_per_learner=20, params=TRUE_PARAMS, seed=2)
+    offsets = np.concatenate([[0], np.cumsum(sim["lengths"])])
+
+    recall = fsrs_numpy.predict_recall(sim["elapsed"], sim["grade"], offsets)
+    assert np.isnan(recall[offsets[:-1]]).all()
+    assert not np.isnan(np.delete(recall, offsets[:-1])).any()
+
+    param_sets = fsrs_eval.default_param_sets()
+    param_sets["truth"] = (fsrs_numpy.FSRS_MODEL, fsrs_numpy.load_weights(TRUE_PARAMS))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = write_array_cache(tmp, [(["u"], sim["elapsed"], sim["grade"], sim["lengths"], [len(sim["lengths"])])])
+        results = fsrs_eval.compare(cache, param_sets)
+        held_out = fsrs_eval.compare(cache.subset(range(0, len(cache), 2)), param_sets)
+    print(fsrs_eval.format_comparison(results))
+
+    assert results["truth"]["log_loss"] < results["default"]["log_loss"]
+    assert results["truth"]["n_reviews"] == len(sim["grade"]) - len(sim["lengths"])
+    assert sum(g["count"] for g in results["truth"]["per_grade"].values()) == results["truth"]["n_reviews"]
+    assert 0 < held_out["truth"]["n_reviews"] < results["truth"]["n_reviews"]
+
+
+# ---------------------------------------
+# interval lookup tables
+# ---------------------------------------
+def test_lookup_tables_within_exported_bound():
+    params = FSRSParameters.from_params_json(TRUE_PARAMS)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "tables.json")
+        # a coarse starting grid forces at least one refinement round
+        doc = fsrs_tables.export_tables(params, path, max_rel_error=0.005, n_s=17, n_r=17)
+        axes, tables = fsrs_tables.load_tables(path)
+
+    print(doc["axes"], {k: b["stability_rel"] for k, b in doc["error_bounds"].items()})
+    assert doc["axes"]["log_s"][2] > 17
+
+    # the bound is analytic, so it must hold on any sample, however dense
+    rng = np.random.default_rng(5)
+    n = 1_000_000
+    S = np.exp(rng.uniform(np.log(fsrs_tables.S_MIN), np.log(fsrs_tables.S_MAX), n))
+    D = rng.uniform(1, 10, n)
+    R = rng.uniform(0, 1, n)
+
+    for kind in fsrs_tables.TABLE_KINDS:
+        bound = doc["error_bounds"][kind]
+        exact = fsrs_tables.next_stability(kind, S, D, R, params).double().numpy()
+        approx = fsrs_tables.lookup(kind, tables[kind], axes, S, D, R)
+        assert np.max(np.abs(approx - exact) / exact) <= bound["stability_rel"]
+        for name, factor in doc["interval_factor"].items():
+            error = np.abs(np.maximum(approx * factor, 1.0) - np.maximum(exact * factor, 1.0))
+            assert np.max(error) <= bound["interval_abs_days"][name], (kind, name)
+
+
+# ---------------------------------------
+# workload simulator
+# ---------------------------------------
+def test_workload_simulation_accounting():
+    result = fsrs_workload.simulate_workload(n_cards=500, days=120, new_per_day=10, max_reviews_per_day=40, seed=3)
+    summary = result["summary"]
+    print(summary)
+
+    assert result["new_cards"].sum() == 500
+    assert result["new_cards"][:50].tolist() == [10] * 50
+    assert result["reviews"].max() <= 40
+    assert summary["total_reviews"] == result["reviews"].sum()
+    assert np.all(result["lapses"] <= result["reviews"])
+    # every "again" is relearned the same day, as the app schedules it
+    assert np.all(result["relearns"] >= result["lapses"])
+    assert summary["total_relearns"] == result["relearns"].sum() > 0
+    assert 0 < result["memorized"][-1] <= 500
+
+    again = fsrs_workload.simulate_workload(n_cards=500, days=120, new_per_day=10, max_reviews_per_day=40, seed=3)
+    assert np.array_equal(again["reviews"], result["reviews"])
+
+
+def test_higher_targets_keep_more_memorized():
+    easy_going = {"again": 0.5, "hard": 0.7, "good": 0.7, "easy": 0.7}
+    strict = {"again": 0.5, "hard": 0.97, "good": 0.97, "easy": 0.97}
+
+    loads = [
+        fsrs_workload.simulate_workload(n_cards=2000, days=365, new_per_day=20, targets=t, seed=0)["summary"]
+        for t in (easy_going, strict)
+    ]
+    print([(s["total_reviews"], s["mean_memorized"]) for s in loads])
+    assert loads[1]["mean_memorized"] > loads[0]["mean_memorized"]
+    assert loads[1]["recall_rate"] > loads[0]["recall_rate"]
+
+    ts = fsrs_workload.simulate_workload(
+        n_cards=200, days=60, weights=fsrs_eval.TS_DEFAULT_FSRS_PARAMS, model=fsrs_eval.TS_MODEL
+    )
+    assert ts["summary"]["total_reviews"] > 0
+
+
+# ---------------------------------------
+# optimal-retention search
+# ---------------------------------------
+def test_pareto_frontier_and_recommendation():
+    points = [
+        {"targets": "a", "total_hours": 10, "mean_memorized": 100},
+        {"targets": "b", "total_hours": 12, "mean_memorized": 90},   # dominated by a
+        {"targets": "c", "total_hours": 20, "mean_memorized": 150},
+        {"targets": "d", "total_hours": 40, "mean_memorized": 160},
+    ]
+    frontier = fsrs_retention.pareto_frontier(points)
+
+    assert [p["targets"] for p in frontier] == ["a", "c", "d"]
+    assert fsrs_retention.recommend(frontier)["targets"] == "a"
+    assert fsrs_retention.recommend(frontier, min_memorized=120)["targets"] == "c"
+    assert fsrs_retention.recommend(frontier, min_memorized=500)["targets"] == "d"
+
+    grid = fsrs_retention.target_grid()
+    assert all(t["hard"] >= t["good"] >= t["easy"] for t in grid)
+    assert len(grid) < len(fsrs_retention.target_grid(monotone=False))
+
+
+def test_retention_search_runs_in_parallel():
+    grid = {"again": (0.5,), "hard": (0.95,), "good": (0.8, 0.9), "easy": (0.8, 0.9)}
+    report = fsrs_retention.search_user_targets(
+        {"defaults": None, "truth": TRUE_PARAMS}, grid=grid, workers=2, n_cards=200, days=60
+    )
+
+    for user_report in report.values():
+        print(user_report["recommended"], len(user_report["frontier"]))
+        assert len(user_report["results"]) == 3
+        assert user_report["recommended"] in [r["targets"] for r in user_report["frontier"]]
+
+
+# ---------------------------------------
+# parameter reports
+# ---------------------------------------
+def test_report_curves_match_pointwise():
+    sets = [FSRSParameters(), FSRSParameters.from_params_json(TRUE_PARAMS)]
+    curves = fsrs_report.report_curves(FSRSParameters.stack(sets))
+
+    for i, params in enumerate(sets):
+        with torch.no_grad():
+            for g in range(4):
+                S0 = initial_stability(torch.tensor(g + 1.0), params)
+                R = [retrievability(torch.tensor(d), S0).item() for d in curves["days"]]
+                assert np.allclose(curves["first_review"][i, g], R, atol=1e-6)
+
+            # the old analysis_fsrs.plot_stability_growth loop
+            S, D = initial_stability(torch.tensor(3), params), torch.tensor(5.0)
+            S_values = [S.item()]
+            for elapsed, grade in fsrs_report.SCHEDULE[1:]:
+                R = retrievability(torch.tensor(elapsed), S)
+                S = (stability_fail if grade == 1 else stability_success)(S, D, R, params)
+                D = update_difficulty(D, grade, params)
+                S_values.append(S.item())
+            assert np.allclose(curves["stability"][i], S_values, rtol=1e-6)
+
+            S = torch.tensor(5.0)
+            S_fail = stability_fail(S, torch.tensor(5.0), retrievability(torch.tensor(3.0), S), params)
+            assert np.allclose(curves["failure"][i], [5.0, S_fail.item()])
+
+    intervals = [predict_interval(S, 0.9).item() for S in curves["stabilities"]]
+    assert np.allclose(curves["intervals"][2], intervals)
+
+    # a single parameter set gives the same rows as its batched form
+    single = fsrs_report.report_curves(sets[1])
+    assert np.allclose(single["stability"][0], curves["stability"][1])
+
+
+def test_render_reports_in_parallel():
+    try:
+        import matplotlib  # noqa: F401
+    except ImportError:
+        print("matplotlib not installed, skipping render")
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        users = {f"user{i}": {"w4": 0.5 + 0.1 * i} for i in range(5)}
+        index = fsrs_report.render_reports(users, tmp, fmt="png", workers=2, chunk_size=2)
+
+        assert list(index) == list(users)
+        for user_id, row in index.items():
+            with open(os.path.join(tmp, row["file"]), "rb") as f:
+                assert f.read(8) == b"\x89PNG\r\n\x1a\n"
+        assert os.path.exists(os.path.join(tmp, "index.json"))
+
+
+# ---------------------------------------
+# parameter store
+# ---------------------------------------
+def test_param_store_batched_lookup_and_upsert():
+    rng = np.random.default_rng(0)
+    user_ids = [f"user-{i}" for i in rng.permutation(500)]
+    weights = rng.uniform(0.1, 2.0, (500, len(fsrs_numpy.WEIGHT_NAMES)))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "params.fsrsp")
+        fsrs_param_store.write_param_store(path, user_ids, weights, versions=np.arange(500))
+        store = fsrs_param_store.ParamStore(path)
+
+        query = user_ids[::-3] + ["unknown"]
+        w, versions, found = store.lookup(query)
+        assert found[:-1].all() and not found[-1]
+        assert np.allclose(w[:-1], weights[::-3].astype(np.float32))
+        assert np.allclose(w[-1], fsrs_numpy.DEFAULT_WEIGHTS) and versions[-1] == -1
+
+        cards = store.card_weights([user_ids[1], user_ids[0], user_ids[1]])
+        assert np.allclose(cards.w4, weights[[1, 0, 1], 4].astype(np.float32))
+
+        # older versions don't overwrite newer rows
+        store = fsrs_param_store.upsert_param_store(
+            path, [user_ids[0], user_ids[1], "new"], np.ones((3, len(fsrs_numpy.WEIGHT_NAMES))), [-5, 10_000, 1]
+        )
+        assert len(store) == 501
+        assert np.allclose(store.get(user_ids[0]).weights, weights[0].astype(np.float32))
+        assert np.allclose(store.get(user_ids[1]).weights, 1.0)
+        assert store.get("missing") is None
+
+
+def test_cached_param_store_and_export():
+    with tempfile.TemporaryDirectory() as tmp:
+        export = os.path.join(tmp, "srs_params.csv")
+        with open(export, "w") as f:
+            f.write("user_id,params,updated_at\n")
+            f.write('a,"{""w4"": 1.0}",2026-01-01T00:00:00Z\n')
+            f.write('a,"{""w4"": 1.5}",2026-02-01T00:00:00Z\n')
+            f.write('b,"{}",2026-01-01T00:00:00Z\n')
+
+        path = os.path.join(tmp, "params.fsrsp")
+        store = fsrs_param_store.store_from_export(path, export)
+        assert store.users == ["a", "b"]
+        assert np.isclose(store.get("a").w4, 1.5)
+
+        cache = fsrs_param_store.CachedParamStore(path, maxsize=2, check_interval=None)
+        cache.lookup(["a", "b", "c"])
+        weights, version = cache.get("c")
+        print(cache.cache_info())
+        assert version == -1 and np.allclose(weights.weights, fsrs_numpy.DEFAULT_WEIGHTS)
+        assert cache.cache_info() == {"hits": 1, "misses": 3, "size": 2, "maxsize": 2}
+
+        # a replaced store file is picked up and the cache starts over
+        fsrs_param_store.upsert_param_store(path, ["c"], np.full((1, len(fsrs_numpy.WEIGHT_NAMES)), 0.5), [1])
+        assert cache.refresh()
+        assert cache.cache_info()["size"] == 0
+        assert np.allclose(cache.get("c")[0].weights, 0.5)
+
+        # found comes from the store, not the version: a stored -1 is still found
+        fsrs_param_store.upsert_param_store(path, ["d"], np.full((1, len(fsrs_numpy.WEIGHT_NAMES)), 0.5), [-1])
+        assert cache.refresh()
+        for _ in range(2):
+            _, versions, found = cache.lookup(["d", "e"])
+            assert versions.tolist() == [-1, -1] and found.tolist() == [True, False]
+
+
+# ---------------------------------------
+# scheduling service
+# ---------------------------------------
+def test_numpy_preview_matches_torch():
+    from fsrs_trained_batch import preview_grades
+
+    S = np.array([np.nan, 3.0, 40.0, 0.5])
+    D = np.array([np.nan, 4.0, 7.0, 9.0])
+    elapsed = np.array([0.0, 2.0, 30.0, 1.0])
+    params = FSRSParameters.from_params_json(TRUE_PARAMS)
+
+    preview = fsrs_numpy.preview_grades(S, D, elapsed, params.weights.detach().numpy())
+    expected = preview_grades(*(torch.tensor(x, dtype=torch.float32) for x in (S, D, elapsed)), params)
+    for key, value in expected.items():
+        assert np.allclose(preview[key], value.numpy(), rtol=1e-4), key
+
+    # review_cards with grade g is preview row g, interval rounded up
+    for g in range(1, 5):
+        reviewed = fsrs_numpy.review_cards(S, D, elapsed, np.full(4, g), params.weights.detach().numpy())
+        assert np.allclose(reviewed["stability"], preview["stability"][g - 1])
+        assert np.allclose(reviewed["interval"], np.ceil(preview["interval"][g - 1]))
+
+
+def test_scheduling_service_batches_requests():
+    weights = fsrs_numpy.FSRSWeights.from_params_json(TRUE_PARAMS).weights
+    params = fsrs_param_store.ParamStore.from_arrays(["alice"], weights[None], versions=[7])
+    cards = [
+        {"grade": "good"},
+        {"stability": 4.0, "difficulty": 6.0, "elapsed_days": 3, "grade": "again"},
+        {"stability": 10.0, "difficulty": 5.0, "lastReviewed": 0, "grade": 4},
+    ]
+    now = 5 * fsrs_service.DAY_MS
+
+    async def run():
+        service = await fsrs_service.SchedulingService(params).start(port=0)
+        client = fsrs_service.Client("127.0.0.1", service.port)
+        try:
+            status, calculated = await client.request("POST", "/calculate", {"user_id": "alice", "cards": cards, "now": now})
+            assert status == 200
+
+            status, error = await client.request("POST", "/calculate", {"user_id": "alice", "cards": [{"grade": "meh"}]})
+            assert status == 400 and "grade" in error["error"]
+
+            bad_cards = [
+                ({"stability": "NaN", "difficulty": 5.0, "grade": 3}, "stability"),
+                ({"stability": 0.0, "difficulty": 5.0, "grade": 3}, "stability"),
+                ({"stability": 3.0, "difficulty": 11.0, "grade": 3}, "difficulty"),
+            ]
+            for card, field in bad_cards:
+                status, error = await client.request("POST", "/calculate", {"user_id": "alice", "cards": [card]})
+                assert status == 400 and field in error["error"], error
+            status, error = await client.request("POST", "/calculate", {"user_id": "alice", "cards": [{"grade": 3}], "now": "soon"})
+            assert status == 400 and "now" in error["error"], error
+
+            # concurrent requests from different users share passes
+            passes = service.scheduler.passes
+            clients = [fsrs_service.Client("127.0.0.1", service.port) for _ in range(8)]
+            answers = await asyncio.gather(*(
+                c.request("POST", "/simulate", {"user_id": "alice" if i % 2 else "bob", "cards": cards})
+                for i, c in enumerate(clients)
+            ))
+            for c in clients:
+                await c.close()
+            batched_passes = service.scheduler.passes - passes
+
+            status, stats = await client.request("GET", "/stats")
+            return calculated, answers, batched_passes, stats
+        finally:
+            await client.close()
+            await service.close()
+
+    calculated, answers, batched_passes, stats = asyncio.run(run())
+    print(calculated, batched_passes, stats)
+
+    expected = fsrs_numpy.review_cards(
+        np.array([np.nan, 4.0, 10.0]), np.array([np.nan, 6.0, 5.0]), np.array([0.0, 3.0, 5.0]),
+        np.array([3, 1, 4]), weights
+    )
+    assert calculated["params_version"] == 7
+    assert np.allclose([c["stability"] for c in calculated["cards"]], expected["stability"])
+    assert [c["interval"] for c in calculated["cards"]] == expected["interval"].astype(int).tolist()
+    assert calculated["cards"][1]["due"] == now + fsrs_service.RELEARN_MS
+
+    assert batched_passes < len(answers)
+    for i, (status, answer) in enumerate(answers):
+        assert status == 200
+        assert answer["params_version"] == (7 if i % 2 else -1)
+        assert answer["cards"][0]["again"]["days"] == 0
+    # unknown users get the default weights
+    assert np.isclose(answers[0][1]["cards"][0]["good"]["stability"], fsrs_numpy.FSRSWeights().init_s_good)
+    assert np.isclose(answers[1][1]["cards"][0]["good"]["stability"], TRUE_PARAMS["init_s_good"])
+
+    assert stats["latency"]["/simulate"]["requests"] == 8
+    assert stats["latency"]["/calculate"]["p99_ms"] >= stats["latency"]["/calculate"]["p50_ms"]
+
+
+# ---------------------------------------
+# bulk card-state recompute
+# ---------------------------------------
+def test_recompute_cards_resumes_and_matches_replay():
+    with tempfile.TemporaryDirectory() as tmp:
+        reviews = fsrs_synthetic.write_synthetic_log(
+            os.path.join(tmp, "reviews.csv"), 12, fmt="csv", cards_per_learner=5, chunk_learners=4
+        )
+        user_ids = sorted({user_id for user_id, _ in iter_user_sequences(reviews, whole_days=False)})
+        weights = fsrs_numpy.FSRSWeights.from_params_json(TRUE_PARAMS).weights
+        store = fsrs_param_store.ParamStore.from_arrays(user_ids[:3], np.tile(weights, (3, 1)))
+
+        # one run stopped after a chunk and resumed == one uninterrupted run
+        resumed = os.path.join(tmp, "resumed")
+        progress = fsrs_recompute.recompute_cards(reviews, resumed, store, chunk_cards=20, max_chunks=1, verbose=False)
+        assert not progress["finished"] and progress["parts"] == 1
+        progress = fsrs_recompute.recompute_cards(reviews, resumed, store, chunk_cards=20, verbose=False)
+        assert progress["finished"] and progress["users_done"] == 12
+
+        whole = os.path.join(tmp, "whole")
+        fsrs_recompute.recompute_cards(reviews, whole, store, chunk_cards=20, fmt="ndjson", verbose=False)
+        rows = fsrs_recompute.read_parts(resumed)
+        assert len(rows) == progress["cards"] == 60
+        assert [(r["id"], float(r["stability"])) for r in rows] == \
+            [(r["id"], r["stability"]) for r in fsrs_recompute.read_parts(whole)]
+
+        # each card matches a plain replay under its user's weights
+        by_card = {r["id"]: r for r in rows}
+        for user_id, cards in iter_user_sequences(reviews, whole_days=False):
+            w = weights if user_id in user_ids[:3] else None
+            card_ids = [card_id for card_id, _ in cards]
+            expected = fsrs_numpy.replay_sequences([seq for _, seq in cards], w)
+            got = np.array([float(by_card[c]["stability"]) for c in card_ids])
+            assert np.allclose(got, expected["stability"])
+            for card_id, seq in cards:
+                interval = int(by_card[card_id]["interval"])
+                assert interval == 0 if seq[-1][1] == 1 else interval >= 1
+
+        # only the listed users, and a changed setting refuses to resume
+        only = fsrs_recompute.recompute_cards(reviews, os.path.join(tmp, "only"), store, users=user_ids[:2], verbose=False)
+        assert only["users_replayed"] == 2 and only["users_done"] == 12
+        changed = [{"chunk_cards": 50}, {"chunk_cards": 20, "targets": {**fsrs_numpy.SRS_TARGETS, "good": 0.8}}]
+        for kwargs in changed:
+            try:
+                fsrs_recompute.recompute_cards(reviews, resumed, store, verbose=False, **kwargs)
+                assert False, f"expected a fingerprint mismatch for {kwargs}"
+            except ValueError as e:
+                print(e)
+
+
+if __name__ == "__main__":
+    test_synthetic_arrays_layout()
+    test_benchmark_case_and_baseline()
+    test_synthetic_export_matches_cache()
+    test_fitting_recovers_true_weights()
+    test_lbfgs_full_batch_fit()
+    test_metrics_match_definitions()
+    test_evaluation_prefers_generating_weights()
+    test_lookup_tables_within_exported_bound()
+    test_workload_simulation_accounting()
+    test_higher_targets_keep_more_memorized()
+    test_pareto_frontier_and_recommendation()
+    test_retention_search_runs_in_parallel()
+    test_report_curves_match_pointwise()
+    test_render_reports_in_parallel()
+    test_param_store_batched_lookup_and_upsert()
+    test_cached_param_store_and_export()
+    test_numpy_preview_matches_torch()
+    test_scheduling_service_batches_requests()
+    test_recompute_cards_resumes_and_matches_replay()
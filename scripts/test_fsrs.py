@@ -9,6 +9,7 @@ from fsrs_trained import (
     stability_fail,
     update_difficulty,
     predict_interval,
+    fsrs_sequence_loss,
 )
 
 #verifies that training actually updates parameters
@@ -200,6 +201,18 @@ def test_full_scheduling():
 
     assert interval > 10
 
+#the loss is called once per sequence per epoch, so it must not print
+def test_sequence_loss_is_silent():
+    import contextlib
+    import io
+
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        loss = fsrs_sequence_loss([(0, 3), (1, 3), (3, 4), (8, 3)], FSRSParameters())
+
+    assert out.getvalue() == ""
+    assert torch.isfinite(loss)
+
 if __name__ == "__main__":
     test_weights_change()
     test_retrievability_decay()
@@ -210,4 +223,5 @@ if __name__ == "__main__":
     test_weight_loading()
     test_interval_increases_with_stability()
     test_target_recall_effect()
-    test_full_scheduling()
\ No newline at end of file
+    test_full_scheduling()
+    test_sequence_loss_is_silent()
\ No newline at end of file